@@ -1,33 +1,46 @@
+import argparse
+import contextlib
+import os
+import sys
+
 import numpy as np
-import matplotlib.pyplot as plt
-import sympy as sp
-from scipy.integrate import odeint
-import control
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'scripts'))
+from figure_cache import default_cache, run_cached
+from import_profile import profile_script
+from instrumentation import measure, phase, print_report, write_report
+
+# matplotlib, sympy, scipy and control are imported by the sections that use
+# them, so running only the basic examples stays cheap
 
 # Set random seed for reproducibility
 np.random.seed(42)
 
-# Set default figure size and style
-plt.style.use('default')  # Use default clean style
-plt.rcParams.update({
-    'figure.figsize': [10, 6],
-    'savefig.dpi': 300,
-    'savefig.bbox': 'tight',
-    'font.size': 12,
-    'axes.labelsize': 12,
-    'axes.titlesize': 14,
-    'xtick.labelsize': 10,
-    'ytick.labelsize': 10,
-    'legend.fontsize': 10,
-    'lines.linewidth': 2,
-    'grid.linestyle': '--',
-    'grid.alpha': 0.7,
-    'axes.grid': True,
-    'axes.axisbelow': True,
-    'axes.labelpad': 10,
-    'axes.spines.top': False,
-    'axes.spines.right': False
-})
+def use_default_style():
+    """Set default figure size and style for the plotting sections"""
+    import rendering  # selects the Agg backend before pyplot loads
+    import matplotlib.pyplot as plt
+
+    plt.style.use('default')  # Use default clean style
+    plt.rcParams.update({
+        'figure.figsize': [10, 6],
+        'savefig.dpi': 300,
+        'savefig.bbox': 'tight',
+        'font.size': 12,
+        'axes.labelsize': 12,
+        'axes.titlesize': 14,
+        'xtick.labelsize': 10,
+        'ytick.labelsize': 10,
+        'legend.fontsize': 10,
+        'lines.linewidth': 2,
+        'grid.linestyle': '--',
+        'grid.alpha': 0.7,
+        'axes.grid': True,
+        'axes.axisbelow': True,
+        'axes.labelpad': 10,
+        'axes.spines.top': False,
+        'axes.spines.right': False
+    })
 
 def save_basic_examples():
     """Generate and save outputs for basic Python examples"""
@@ -62,6 +75,9 @@ def save_basic_examples():
 
 def save_symbolic_math():
     """Generate and save outputs for symbolic mathematics examples"""
+    import sympy as sp
+    from symbolic_tf import laplace_transfer_function
+
     print("\n=== Symbolic Mathematics with SymPy ===")
     # Define symbolic variables
     t = sp.Symbol('t')
@@ -82,9 +98,10 @@ def save_symbolic_math():
 
     # Laplace transforms
     f_t = t**2 * sp.exp(-t)
-    F_s = sp.laplace_transform(f_t, t, s)
+    # Memoized: transforms are slow and the same ones recur across runs of a sweep
+    F_s = laplace_transfer_function(f_t, t, s)
     print("\nLaplace transform of t^2 * e^(-t):")
-    print("F(s) =", F_s[0])
+    print("F(s) =", F_s)
 
     # Matrix operations
     M = sp.Matrix([[1, 2], [3, 4]])
@@ -95,6 +112,10 @@ def save_symbolic_math():
 
 def save_differential_equations():
     """Generate and save outputs for differential equations examples"""
+    import matplotlib.pyplot as plt
+    from linear_ode import integrate
+    from rendering import savefig
+
     print("\n=== Solving Differential Equations ===")
     
     # Define the differential equation dy/dt = -y
@@ -105,8 +126,10 @@ def save_differential_equations():
     t = np.linspace(0, 5, 100)
     y0 = 1  # Initial condition
     
-    # Solve ODE
-    solution = odeint(model, y0, t)
+    # Solve ODE; the model is linear, so integrate propagates it exactly with
+    # a matrix exponential instead of calling model at every step like odeint
+    with phase('simulate'):
+        solution = integrate(model, y0, t, linear=True)
     
     # Plot results
     plt.figure()
@@ -116,7 +139,7 @@ def save_differential_equations():
     plt.ylabel('y(t)')
     plt.title('Solution of dy/dt = -y')
     plt.legend()
-    plt.savefig('docs/images/examples/differential_equation.png')
+    savefig('docs/images/examples/differential_equation.png')
     plt.close()
 
     # Print solution values
@@ -128,6 +151,10 @@ def save_differential_equations():
 
 def save_advanced_plotting():
     """Generate and save outputs for advanced plotting examples"""
+    import matplotlib.pyplot as plt
+    from decimate import plot_decimated, scatter_dense
+    from rendering import savefig
+
     print("\n=== Advanced Plotting Examples ===")
     
     # Multiple plots and subplots
@@ -139,23 +166,24 @@ def save_advanced_plotting():
     # Create figure with subplots
     fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 8))
 
-    # First subplot: Multiple functions
-    ax1.plot(t, f1, '-', label='sin(t)', color='#1f77b4')
-    ax1.plot(t, f2, '--', label='cos(t)', color='#d62728')
+    # First subplot: Multiple functions (long series are decimated to the
+    # pixel width, so logged signals of any length render equally fast)
+    plot_decimated(ax1, t, f1, '-', label='sin(t)', color='#1f77b4')
+    plot_decimated(ax1, t, f2, '--', label='cos(t)', color='#d62728')
     ax1.set_xlabel('Time')
     ax1.set_ylabel('Amplitude')
     ax1.set_title('Trigonometric Functions')
     ax1.legend()
 
     # Second subplot: Damped oscillation with two y-axes
-    ax2.plot(t, f3, '-', label='Damped oscillation', color='#2ca02c')
+    plot_decimated(ax2, t, f3, '-', label='Damped oscillation', color='#2ca02c')
     ax2.set_xlabel('Time')
     ax2.set_ylabel('Amplitude', color='#2ca02c')
     ax2.tick_params(axis='y', labelcolor='#2ca02c')
 
     # Add second y-axis
     ax3 = ax2.twinx()
-    ax3.plot(t, np.exp(-0.1*t), '--', label='Envelope', color='#1f77b4')
+    plot_decimated(ax3, t, np.exp(-0.1*t), '--', label='Envelope', color='#1f77b4')
     ax3.set_ylabel('Envelope', color='#1f77b4')
     ax3.tick_params(axis='y', labelcolor='#1f77b4')
     ax3.spines['right'].set_visible(True)
@@ -168,7 +196,7 @@ def save_advanced_plotting():
     ax3.legend(lines1 + lines2, labels1 + labels2, loc='upper right')
 
     plt.tight_layout()
-    plt.savefig('docs/images/examples/multiple_plots.png')
+    savefig('docs/images/examples/multiple_plots.png')
     plt.close()
 
     # Print some data points
@@ -187,13 +215,14 @@ def save_advanced_plotting():
     y = np.random.normal(0, 1, 1000)
     z = np.sqrt(x**2 + y**2)
 
-    scatter = plt.scatter(x, y, c=z, cmap='viridis', s=50, alpha=0.6)
+    # Dense clouds are thinned to one marker per pixel and rasterized
+    scatter = scatter_dense(plt.gca(), x, y, c=z, cmap='viridis', s=50, alpha=0.6)
     plt.colorbar(scatter, label='Distance from origin')
     plt.xlabel('X')
     plt.ylabel('Y')
     plt.title('Scatter Plot with Color Mapping')
     plt.axis('equal')
-    plt.savefig('docs/images/examples/scatter_plot.png')
+    savefig('docs/images/examples/scatter_plot.png')
     plt.close()
 
     # Print statistics
@@ -205,6 +234,11 @@ def save_advanced_plotting():
 
 def save_control_examples():
     """Generate and save outputs for control systems examples"""
+    import control
+    import matplotlib.pyplot as plt
+    from batch_response import first_order_batch, step_response_batch
+    from rendering import savefig
+
     print("\n=== Control Systems Examples ===")
     
     # Single step response
@@ -213,13 +247,14 @@ def save_control_examples():
     print("Transfer function G(s):")
     print(G)
 
-    t, y = control.step_response(G)
+    with phase('simulate'):
+        t, y = control.step_response(G)
     plt.figure()
     plt.plot(t, y, '-', color='#1f77b4')
     plt.title('Step Response')
     plt.xlabel('Time (s)')
     plt.ylabel('Amplitude')
-    plt.savefig('docs/images/examples/step_response.png')
+    savefig('docs/images/examples/step_response.png')
     plt.close()
 
     # Multiple step responses
@@ -227,25 +262,86 @@ def save_control_examples():
     t = np.linspace(0, 5, 500)
     
     colors = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd']
-    for i, a in enumerate(range(1, 6)):
+    # Simulate every G(s) = a/(s + a) in one vectorized pass
+    gains = np.arange(1, 6)
+    with phase('simulate'):
+        t, Y = step_response_batch(*first_order_batch(gains, gains), t)
+    for i, a in enumerate(gains):
         G = control.TransferFunction([a], [1, a])
         print(f"\nTransfer function for a={a}:")
         print(G)
-        
-        t, y = control.step_response(G, t)
-        plt.plot(t, y, '-', label=f'a={a}', color=colors[i])
+
+        plt.plot(t, Y[i], '-', label=f'a={a}', color=colors[i])
 
     plt.xlabel('Time (s)')
     plt.ylabel('Amplitude')
     plt.title('Step Responses for Different Systems')
     plt.legend(loc='lower right')
-    plt.savefig('docs/images/examples/multiple_step_responses.png')
+    savefig('docs/images/examples/multiple_step_responses.png')
     plt.close()
 
+# (name, function, images written, needs the plot style); sections that
+# write images are restored from the figure cache when their inputs are unchanged
+SECTIONS = [
+    ('basic', save_basic_examples, [], False),
+    ('symbolic', save_symbolic_math, [], False),
+    ('differential_equations', save_differential_equations,
+     ['docs/images/examples/differential_equation.png'], True),
+    ('plotting', save_advanced_plotting,
+     ['docs/images/examples/multiple_plots.png',
+      'docs/images/examples/scatter_plot.png'], True),
+    ('control', save_control_examples,
+     ['docs/images/examples/step_response.png',
+      'docs/images/examples/multiple_step_responses.png'], True),
+]
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    names = [name for name, _, _, _ in SECTIONS]
+    parser = argparse.ArgumentParser(description='Regenerate the outputs of the introduction examples.')
+    parser.add_argument('sections', nargs='*', metavar='SECTION',
+                        help=f"sections to run (default: all): {', '.join(names)}")
+    parser.add_argument('--import-profile', action='store_true',
+                        help='run under -X importtime and summarize import time per package')
+    parser.add_argument('--report', metavar='FILE',
+                        help='write per-section timings, figures and peak RSS to FILE (.json or .csv) '
+                             'and print a summary')
+    parser.add_argument('--profile-dir', metavar='DIR',
+                        help='write a cProfile dump per section to DIR/<section>.prof')
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.sections if name not in names]
+    if unknown:
+        parser.error(f"unknown section(s): {', '.join(unknown)}")
+    if args.import_profile:
+        return profile_script(os.path.abspath(__file__), [arg for arg in argv if arg != '--import-profile'])
+
+    cache = default_cache()
+    selected = [section for section in SECTIONS if not args.sections or section[0] in args.sections]
+    records = []
+    # Figures are compressed and written in the background while the next
+    # section runs; sections without figures never load matplotlib
+    with contextlib.ExitStack() as stack:
+        writer = None
+        if any(outputs for _, _, outputs, _ in selected):
+            from image_writer import background_writes
+            writer = stack.enter_context(background_writes())
+        for name, func, outputs, styled in selected:
+            if styled:
+                # Style first, so the cache key sees the rcParams the figures use
+                use_default_style()
+            with measure(name, args.profile_dir) as record:
+                if outputs:
+                    record['cached'] = run_cached(func, outputs, cache)
+                else:
+                    func()
+            records.append(record)
+        errors = writer.flush() if writer is not None else []
+    for path, error in errors:
+        print(f"Failed to write {path}: {error}")
+    if args.report:
+        write_report(records, args.report)
+        print_report(records)
+    return 1 if errors else 0
+
 if __name__ == "__main__":
-    # Run all examples and save outputs
-    save_basic_examples()
-    save_symbolic_math()
-    save_differential_equations()
-    save_advanced_plotting()
-    save_control_examples() 
\ No newline at end of file
+    sys.exit(main())
@@ -0,0 +1,137 @@
+"""Vectorized time responses for stacks of low-order transfer functions.
+
+Instead of building one ``control.TransferFunction`` per parameter value and
+simulating it on its own, the systems of a sweep are given as coefficient
+arrays and simulated together: every system is put in controllable canonical
+form, the whole stack is discretized with a single batched matrix
+exponential, and the resulting recurrence advances all systems at once.
+
+Coefficient arrays follow the ``control``/``numpy.polyval`` convention
+(highest power first). ``num`` and ``den`` are 2-D with one row per system;
+1-D arrays are shared by every system of the batch.
+"""
+import numpy as np
+from scipy.linalg import expm
+
+def _as_batch(num, den):
+    """Broadcast num/den to 2-D arrays with num padded to the length of den"""
+    num = np.atleast_2d(np.asarray(num, dtype=float))
+    den = np.atleast_2d(np.asarray(den, dtype=float))
+    if num.shape[1] > den.shape[1]:
+        raise ValueError("transfer functions must be proper (numerator order <= denominator order)")
+    if np.any(den[:, 0] == 0):
+        raise ValueError("leading denominator coefficient must be non-zero")
+    count = max(num.shape[0], den.shape[0])
+    num = np.broadcast_to(num, (count, num.shape[1]))
+    den = np.broadcast_to(den, (count, den.shape[1]))
+    padded = np.zeros((count, den.shape[1]))
+    padded[:, den.shape[1] - num.shape[1]:] = num
+    return padded, den
+
+def tf_to_ss_batch(num, den):
+    """Controllable canonical state-space form of a stack of transfer functions.
+
+    Returns (A, B, C, D) with shapes (n, k, k), (n, k), (n, k) and (n,) for
+    n systems of order k.
+    """
+    num, den = _as_batch(num, den)
+    count, order = den.shape[0], den.shape[1] - 1
+    num = num / den[:, :1]
+    den = den / den[:, :1]
+
+    D = num[:, 0].copy()
+    A = np.zeros((count, order, order))
+    if order > 1:
+        A[:, 1:, :-1] = np.eye(order - 1)
+    B = np.zeros((count, order))
+    if order:
+        A[:, 0, :] = -den[:, 1:]
+        B[:, 0] = 1.0
+    # Strictly proper part: num - D * den
+    C = num[:, 1:] - D[:, None] * den[:, 1:]
+    return A, B, C, D
+
+def zoh_discretize_batch(A, B, dt):
+    """Zero-order-hold discretization of stacked (A, B) pairs with one expm call"""
+    count, order = B.shape
+    block = np.zeros((count, order + 1, order + 1))
+    block[:, :order, :order] = A * dt
+    block[:, :order, order] = B * dt
+    # scipy's expm works on stacks of square matrices
+    phi = expm(block)
+    return phi[:, :order, :order], phi[:, :order, order]
+
+def _uniform_step(T):
+    T = np.asarray(T, dtype=float)
+    if T.ndim != 1 or len(T) < 2:
+        raise ValueError("T must be a 1-D time grid with at least two points")
+    dt = T[1] - T[0]
+    if not np.allclose(np.diff(T), dt, rtol=1e-9, atol=1e-12 * max(1.0, abs(T[-1]))):
+        raise ValueError("T must be uniformly spaced")
+    return T, dt
+
+def forced_response_batch(num, den, T, U):
+    """Responses of a stack of systems to inputs held constant between samples.
+
+    U is either shared by every system (shape (len(T),)) or given per system
+    (shape (n, len(T))). Returns (T, Y) with Y of shape (n, len(T)).
+    """
+    T, dt = _uniform_step(T)
+    A, B, C, D = tf_to_ss_batch(num, den)
+    U = np.broadcast_to(np.asarray(U, dtype=float), (len(D), len(T)))
+    Ad, Bd = zoh_discretize_batch(A, B, dt)
+
+    x = np.zeros_like(B)
+    Y = np.empty((len(D), len(T)))
+    for k in range(len(T)):
+        Y[:, k] = np.einsum('ij,ij->i', C, x) + D * U[:, k]
+        x = np.einsum('ijk,ik->ij', Ad, x) + Bd * U[:, k:k + 1]
+    return T, Y
+
+def step_response_batch(num, den, T):
+    """Unit step responses of a stack of systems on a shared uniform time grid.
+
+    The zero-order hold is exact for a step input, so the result matches
+    ``control.step_response`` on the same grid. Returns (T, Y) with Y of
+    shape (n, len(T)).
+    """
+    T, dt = _uniform_step(T)
+    A, B, C, D = tf_to_ss_batch(num, den)
+    Ad, Bd = zoh_discretize_batch(A, B, dt)
+
+    # With a unit step from rest, y[k] = D + sum_{i<k} C Ad^i Bd. The Markov
+    # parameters C Ad^i Bd are built in blocks of about sqrt(len(T)) samples:
+    # Ad^j Bd for one block, then C Ad^(block start) advanced once per block,
+    # so the Python loop runs ~2 sqrt(len(T)) times instead of len(T).
+    steps = int(np.ceil(np.sqrt(len(T))))
+    powers = np.empty(Bd.shape + (steps,))
+    powers[:, :, 0] = Bd
+    for j in range(1, steps):
+        powers[:, :, j] = np.einsum('ijk,ik->ij', Ad, powers[:, :, j - 1])
+    advance = np.linalg.matrix_power(Ad, steps)
+
+    row = C
+    markov = np.empty((len(D), len(T)))
+    for start in range(0, len(T), steps):
+        stop = min(start + steps, len(T))
+        markov[:, start:stop] = np.einsum('ij,ijk->ik', row, powers[:, :, :stop - start])
+        row = np.einsum('ij,ijk->ik', row, advance)
+    Y = np.empty_like(markov)
+    Y[:, 0] = D
+    Y[:, 1:] = D[:, None] + np.cumsum(markov[:, :-1], axis=1)
+    return T, Y
+
+def first_order_batch(gain, pole):
+    """Coefficient arrays for gain / (s + pole), one system per element"""
+    gain, pole = np.broadcast_arrays(np.asarray(gain, dtype=float), np.asarray(pole, dtype=float))
+    num = gain.reshape(-1, 1)
+    den = np.column_stack([np.ones(pole.size), pole.ravel()])
+    return num, den
+
+def second_order_batch(wn, zeta):
+    """Coefficient arrays for wn^2 / (s^2 + 2 zeta wn s + wn^2), one system per element"""
+    wn, zeta = np.broadcast_arrays(np.asarray(wn, dtype=float), np.asarray(zeta, dtype=float))
+    wn, zeta = wn.ravel(), zeta.ravel()
+    num = (wn**2).reshape(-1, 1)
+    den = np.column_stack([np.ones(wn.size), 2 * zeta * wn, wn**2])
+    return num, den
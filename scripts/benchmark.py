@@ -0,0 +1,249 @@
+"""Benchmarks for the simulation and plotting hot paths.
+
+Two groups of measurements are taken:
+
+* sections: every example section of ``run_examples.py``,
+  ``generate_plots.py`` and ``docs/scripts/01_intro_examples.py``, run
+  in-process with the figure cache disabled. Each run is split into
+  simulate (everything outside ``savefig``: numerics and figure set-up),
+  render (drawing and PNG encoding) and write (putting the bytes on disk).
+* scaling: synthetic workloads over random stable systems whose size is set
+  by the scale knobs (number of systems, system order, time/frequency grid
+  length and DPI): batched step and frequency responses, step metrics and
+  rendering a family of responses.
+
+Results are written as JSON and can be compared with an earlier run:
+
+    python scripts/benchmark.py -o bench.json
+    python scripts/benchmark.py --compare bench.json --systems 100 1000
+
+Sections write their images into a temporary directory, so the
+repository's images are never touched.
+"""
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from figure_cache import REPO_ROOT, library_versions
+
+SCRIPTS = {
+    'run_examples': os.path.join(REPO_ROOT, 'scripts', 'run_examples.py'),
+    'generate_plots': os.path.join(REPO_ROOT, 'scripts', 'generate_plots.py'),
+    'intro_examples': os.path.join(REPO_ROOT, 'docs', 'scripts', '01_intro_examples.py'),
+}
+METRICS = ('total', 'simulate', 'render', 'write')
+REGRESSION_THRESHOLD = 0.2
+# Differences below this many seconds are timer noise, not regressions
+NOISE_FLOOR = 0.002
+
+def _load(name, path):
+    """Import a script as a module without running its __main__ block"""
+    spec = importlib.util.spec_from_file_location(f'benchmark_{name}', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def _sections():
+    """(script, section, function, setup) for every example section"""
+    sections = []
+    run_examples = _load('run_examples', SCRIPTS['run_examples'])
+    for name, func in run_examples.SECTION_FUNCTIONS.items():
+        sections.append(('run_examples', name, func, None))
+    generate_plots = _load('generate_plots', SCRIPTS['generate_plots'])
+    for func in (generate_plots.generate_single_step_response, generate_plots.generate_multiple_step_responses):
+        sections.append(('generate_plots', func.__name__, func, None))
+    intro = _load('intro_examples', SCRIPTS['intro_examples'])
+    for name, func, _, styled in intro.SECTIONS:
+        sections.append(('intro_examples', name, func, intro.use_default_style if styled else None))
+    return sections
+
+def time_call(func, repeat=3):
+    """Time func repeat times; returns a dict of metrics from the fastest run.
+
+    render and write come from the counters of ``rendering.savefig``,
+    simulate is the remaining time of the call.
+    """
+    import rendering
+
+    runs = []
+    for _ in range(repeat):
+        rendering.reset_timings()
+        start = time.perf_counter()
+        func()
+        total = time.perf_counter() - start
+        spent = rendering.timings()
+        runs.append({
+            'total': total,
+            'simulate': total - spent['render'] - spent['write'],
+            'render': spent['render'],
+            'write': spent['write'],
+            'figures': spent['saved'],
+            'bytes': spent['bytes'],
+        })
+    best = min(runs, key=lambda run: run['total'])
+    best['median_total'] = statistics.median(run['total'] for run in runs)
+    best['repeat'] = repeat
+    return best
+
+def bench_sections(repeat=3, only=None):
+    """Time every example section (or those named in only) in a scratch directory"""
+    import matplotlib
+
+    results = {}
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as scratch:
+        os.chdir(scratch)
+        try:
+            for directory in ('docs/images/examples', 'docs/static/images'):
+                os.makedirs(directory, exist_ok=True)
+            for script, name, func, setup in _sections():
+                key = f'{script}/{name}'
+                if only and key not in only and script not in only:
+                    continue
+                with matplotlib.rc_context(), contextlib.redirect_stdout(io.StringIO()), \
+                        contextlib.redirect_stderr(io.StringIO()):
+                    if setup is not None:
+                        setup()
+                    results[key] = time_call(func, repeat)
+                import rendering
+                rendering.close_all()
+        finally:
+            os.chdir(cwd)
+    return results
+
+def random_systems(count, order, seed=0):
+    """count random stable systems of the given order with unit DC gain, as (num, den) rows"""
+    rng = np.random.default_rng(seed)
+    den = np.empty((count, order + 1))
+    for i in range(count):
+        pairs = order // 2
+        real = -rng.uniform(0.2, 2.0, pairs)
+        imag = rng.uniform(0.5, 5.0, pairs)
+        poles = np.concatenate([real + 1j * imag, real - 1j * imag, -rng.uniform(0.5, 5.0, order % 2)])
+        den[i] = np.real(np.poly(poles))
+    num = den[:, -1:].copy()
+    return num, den
+
+def bench_scaling(systems=(100,), orders=(4,), points=(1000,), dpis=(100,), repeat=3):
+    """Time the batched engines and rendering for every combination of the knobs"""
+    from batch_response import step_response_batch
+    from freq_response import bode_batch
+    from rendering import get_template
+    from step_metrics import step_metrics
+
+    results = {}
+    with tempfile.TemporaryDirectory() as scratch:
+        for count in systems:
+            for order in orders:
+                num, den = random_systems(count, order)
+                for length in points:
+                    T = np.linspace(0, 20, length)
+                    omega = np.logspace(-2, 2, length)
+                    case = f'systems={count},order={order},points={length}'
+                    results[f'step_batch[{case}]'] = time_call(lambda: step_response_batch(num, den, T), repeat)
+                    results[f'bode_batch[{case}]'] = time_call(lambda: bode_batch(num, den, omega), repeat)
+                    results[f'step_metrics[{case}]'] = time_call(lambda: step_metrics(num, den, T), repeat)
+
+                    _, Y = step_response_batch(num, den, T)
+                    for dpi in dpis:
+                        template = get_template('benchmark_family', lambda fig: {'ax': fig.subplots()})
+                        path = os.path.join(scratch, 'family.png')
+
+                        def render():
+                            def update(fig, artists):
+                                ax = artists['ax']
+                                ax.clear()
+                                ax.plot(T, Y.T, linewidth=1)
+                            template.render(update, path, dpi=dpi)
+                        results[f'render_family[{case},dpi={dpi}]'] = time_call(render, repeat)
+    return results
+
+def metadata():
+    return {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'libraries': library_versions(),
+    }
+
+def compare(baseline, current, threshold=REGRESSION_THRESHOLD):
+    """Print old/new timings side by side; return the names of regressed benchmarks"""
+    regressions = []
+    print(f"{'benchmark':<56}{'metric':<10}{'before':>10}{'after':>10}{'ratio':>8}")
+    for group in ('sections', 'scaling'):
+        old_results = baseline.get(group, {})
+        for name, new in current.get(group, {}).items():
+            old = old_results.get(name)
+            if old is None:
+                continue
+            for metric in METRICS:
+                before, after = old[metric], new[metric]
+                if not before and not after:
+                    continue
+                ratio = after / before if before > 0 else float('inf')
+                regressed = ratio > 1 + threshold and after - before > NOISE_FLOOR
+                flag = '  <- slower' if regressed else ''
+                print(f"{name:<56}{metric:<10}{before:>10.4f}{after:>10.4f}{ratio:>8.2f}{flag}")
+                if regressed and name not in regressions:
+                    regressions.append(name)
+    return regressions
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the example sections and the simulation engines.')
+    parser.add_argument('-o', '--output', default='benchmark.json',
+                        help='JSON file to write the results to (default: %(default)s)')
+    parser.add_argument('--compare', metavar='BASELINE',
+                        help='compare against an earlier JSON result and exit 1 on regressions')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help='relative slowdown reported as a regression (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='runs per benchmark; the fastest is kept (default: %(default)s)')
+    parser.add_argument('--sections', nargs='*', metavar='NAME',
+                        help='only time these sections (script or script/section names)')
+    parser.add_argument('--no-sections', action='store_true', help='skip the example sections')
+    parser.add_argument('--no-scaling', action='store_true', help='skip the synthetic scaling workloads')
+    parser.add_argument('--systems', type=int, nargs='+', default=[100], help='numbers of systems per batch')
+    parser.add_argument('--order', type=int, nargs='+', default=[4], help='system orders')
+    parser.add_argument('--points', type=int, nargs='+', default=[1000], help='time/frequency grid lengths')
+    parser.add_argument('--dpi', type=int, nargs='+', default=[100], help='resolutions for the render benchmark')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = {'meta': metadata(), 'sections': {}, 'scaling': {}}
+    results['meta']['knobs'] = {'systems': args.systems, 'order': args.order,
+                                'points': args.points, 'dpi': args.dpi, 'repeat': args.repeat}
+    if not args.no_sections:
+        results['sections'] = bench_sections(args.repeat, args.sections)
+    if not args.no_scaling:
+        results['scaling'] = bench_scaling(args.systems, args.order, args.points, args.dpi, args.repeat)
+
+    for group in ('sections', 'scaling'):
+        for name, result in results[group].items():
+            print(f"{name:<56}" + ''.join(f"{metric} {result[metric]:.4f}s  " for metric in METRICS))
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, results, args.threshold)
+        if regressions:
+            print(f"Regressions: {', '.join(regressions)}")
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
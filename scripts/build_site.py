@@ -0,0 +1,316 @@
+"""Incremental documentation build: regenerate stale images, rebuild affected pages.
+
+Every markdown page in ``docs/control-design`` is mapped to the PNGs it
+references, and every PNG to the example section that writes it: the
+sections of ``run_examples.py`` and of ``docs/scripts/01_intro_examples.py``.
+When two sections write the same file, the later one owns it, since that
+is the version a full regeneration leaves behind (the 300 dpi
+``step_response.png`` of the introduction, for instance).
+
+A section is stale when any of these holds:
+
+* its inputs changed, i.e. its ``watch.section_digest`` (own source, helpers
+  and the repo modules it imports), the library versions or the render
+  settings;
+* one of its images is missing;
+* the content hash of one of its images differs from the one recorded after
+  its last run (the file was edited or overwritten).
+
+Only stale sections run. A page is rebuilt when its markdown or the
+content of one of its images changed since the last build. The hashes live
+in ``.cache/site/state.json``. Images are written atomically (see
+``rendering.write_atomic``), so a build interrupted halfway never leaves a
+truncated PNG for the site to pick up.
+
+With mkdocs installed the site is updated by ``mkdocs build --dirty``,
+which rebuilds only the pages whose sources are newer than their output.
+Without it, the changed images are copied into the site directory and the
+pages whose markdown changed are reported as still needing a build.
+"""
+import argparse
+import contextlib
+import hashlib
+import importlib.util
+import io
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+import traceback
+
+from figure_cache import REPO_ROOT, library_versions
+from rendering import close_all, rc_context, render_settings, write_atomic
+from watch import section_digest
+
+DOCS_DIR = 'docs'
+PAGES_DIR = os.path.join(DOCS_DIR, 'control-design')
+SITE_DIR = 'site'
+STATE_PATH = os.path.join('.cache', 'site', 'state.json')
+STATE_VERSION = 1
+INTRO_SCRIPT = os.path.join(DOCS_DIR, 'scripts', '01_intro_examples.py')
+# Markdown image links to PNGs, e.g. ![Step Response](../images/examples/step_response.png)
+IMAGE_PATTERN = re.compile(r'!\[[^\]]*\]\(([^)\s]+\.png)\)')
+
+def file_hash(path):
+    """sha256 of a file's content, or None if it does not exist"""
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except FileNotFoundError:
+        return None
+
+def page_images(page):
+    """Repo-relative paths of the local PNGs a markdown page references"""
+    with open(page, encoding='utf-8') as f:
+        text = f.read()
+    images = set()
+    for link in IMAGE_PATTERN.findall(text):
+        if '://' not in link:
+            images.add(os.path.normpath(os.path.join(os.path.dirname(page), link)))
+    return sorted(images)
+
+def list_pages(pages_dir=PAGES_DIR):
+    return sorted(os.path.join(pages_dir, name) for name in os.listdir(pages_dir) if name.endswith('.md'))
+
+def _load(name, path):
+    """Import a script as a module without running its __main__ block"""
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def producers():
+    """(key, function, images written, style setup) for every section, in regeneration order"""
+    import run_examples
+    sections = [(f'run_examples:{name}', func, [os.path.normpath(path) for path in run_examples.SECTION_OUTPUTS[name]],
+                 None)
+                for name, func in run_examples.SECTION_FUNCTIONS.items()]
+    intro = _load('intro_examples', INTRO_SCRIPT)
+    for name, func, outputs, styled in intro.SECTIONS:
+        if outputs:
+            sections.append((f'intro:{name}', func, [os.path.normpath(path) for path in outputs],
+                             intro.use_default_style if styled else None))
+    return sections
+
+def image_owners(sections):
+    """{image: key of the section that writes it last}"""
+    owners = {}
+    for key, _, outputs, _ in sections:
+        for path in outputs:
+            owners[path] = key
+    return owners
+
+def producer_digest(func, setup=None):
+    """Hash of everything besides the image files that decides a section's output"""
+    digest = hashlib.sha256(section_digest(func).encode())
+    if setup is not None:
+        digest.update(section_digest(setup).encode())
+    digest.update(json.dumps([library_versions(), render_settings()], sort_keys=True).encode())
+    return digest.hexdigest()
+
+def load_state(path=STATE_PATH):
+    try:
+        with open(path, encoding='utf-8') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        state = {}
+    if state.get('version') != STATE_VERSION:
+        state = {'version': STATE_VERSION, 'sections': {}, 'pages': {}}
+    return state
+
+def save_state(state, path=STATE_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    write_atomic(path, json.dumps(state, indent=2, sort_keys=True).encode())
+
+def stale_sections(sections, state, digests, force=False):
+    """[(key, reason)] of the sections to run, in order, given their current digests.
+
+    Sections whose images are all owned by later sections are never run.
+    A stale section that overwrites an image owned by a later section makes
+    that section stale too, so the owner's version is restored.
+    """
+    owners = image_owners(sections)
+    stale = {}
+    for key, _, outputs, _ in sections:
+        owned = [path for path in outputs if owners[path] == key]
+        if not owned:
+            continue
+        record = state['sections'].get(key)
+        if key in stale:
+            reason = stale[key]
+        elif force:
+            reason = 'forced'
+        elif record is None:
+            reason = 'never built'
+        elif record['digest'] != digests[key]:
+            reason = 'inputs changed'
+        elif any(file_hash(path) is None for path in owned):
+            reason = 'image missing'
+        elif any(file_hash(path) != record['outputs'].get(path) for path in owned):
+            reason = 'image modified'
+        else:
+            continue
+        stale[key] = reason
+        for path in outputs:
+            if owners[path] != key:
+                stale.setdefault(owners[path], f'{os.path.basename(path)} overwritten by {key}')
+    return [(key, stale[key]) for key, _, _, _ in sections if key in stale]
+
+def run_producer(func, setup=None):
+    """Run a section with its output captured; returns (ok, output)"""
+    buffer = io.StringIO()
+    ok = True
+    # rc_context keeps a section's style from leaking into the next one
+    with contextlib.redirect_stdout(buffer), contextlib.redirect_stderr(buffer), rc_context():
+        try:
+            if setup is not None:
+                setup()
+            func()
+        except Exception:
+            ok = False
+            traceback.print_exc(file=buffer)
+        finally:
+            close_all()
+    return ok, buffer.getvalue()
+
+def affected_pages(pages, state):
+    """{page: reasons} for the pages whose markdown or images changed since the last build"""
+    affected = {}
+    for page in pages:
+        record = state['pages'].get(page)
+        reasons = []
+        if record is None:
+            reasons.append('never built')
+        else:
+            if file_hash(page) != record['source']:
+                reasons.append('page changed')
+            images = {path: file_hash(path) for path in page_images(page)}
+            reasons += [f'{os.path.basename(path)} changed' for path, digest in images.items()
+                        if digest != record['images'].get(path)]
+        if reasons:
+            affected[page] = reasons
+    return affected
+
+def page_record(page):
+    return {'source': file_hash(page), 'images': {path: file_hash(path) for path in page_images(page)}}
+
+def update_site(pages, state, site_dir=SITE_DIR):
+    """Bring site_dir up to date for the affected pages; returns the pages still needing a build"""
+    if importlib.util.find_spec('mkdocs') is not None:
+        command = [sys.executable, '-m', 'mkdocs', 'build', '--site-dir', site_dir]
+        # mkdocs before 1.6 has no --dirty for build; fall back to a full build
+        if subprocess.run(command + ['--dirty']).returncode and subprocess.run(command).returncode:
+            return list(pages)
+        return []
+    # Without mkdocs the images can still be refreshed; the HTML cannot
+    pending = []
+    for page in pages:
+        record = state['pages'].get(page)
+        for image in page_images(page):
+            if record is None or file_hash(image) != record['images'].get(image):
+                if file_hash(image) is None:
+                    continue
+                target = os.path.join(site_dir, os.path.relpath(image, DOCS_DIR))
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                with open(image, 'rb') as f:
+                    write_atomic(target, f.read())
+        if record is None or file_hash(page) != record['source']:
+            pending.append(page)
+    return pending
+
+def print_page_map(pages, owners):
+    for page in pages:
+        print(os.path.relpath(page, DOCS_DIR))
+        for image in page_images(page):
+            print(f"    {os.path.basename(image):<48} {owners.get(image, '(static)')}")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Regenerate stale example images and rebuild the affected pages.')
+    parser.add_argument('-n', '--dry-run', action='store_true',
+                        help='show the page/image/section map and what would be rebuilt, without running anything')
+    parser.add_argument('--force', action='store_true',
+                        help='regenerate every image and rebuild every page')
+    parser.add_argument('--site-dir', default=SITE_DIR,
+                        help='mkdocs output directory (default: %(default)s)')
+    parser.add_argument('--no-site', action='store_true',
+                        help='only regenerate the images, leave the site alone')
+    parser.add_argument('--state', default=STATE_PATH,
+                        help='file holding the hashes of the last build (default: %(default)s)')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    # Sections and pages use paths relative to the repository root
+    os.chdir(REPO_ROOT)
+    state = load_state(args.state)
+    if args.force:
+        state['pages'] = {}
+    sections = producers()
+    pages = list_pages()
+    # Taken before anything runs: sections may change the module state they depend on
+    digests = {key: producer_digest(func, setup) for key, func, _, setup in sections}
+    stale = stale_sections(sections, state, digests, args.force)
+
+    if args.dry_run:
+        print_page_map(pages, image_owners(sections))
+        print()
+        print(f"Stale sections: {len(stale)} of {len(sections)}")
+        for key, reason in stale:
+            print(f"    {key} ({reason})")
+        keys = {key for key, _ in stale}
+        regenerated = {path for key, _, outputs, _ in sections if key in keys for path in outputs}
+        affected = affected_pages(pages, state)
+        for page in pages:
+            if page not in affected and regenerated & set(page_images(page)):
+                affected[page] = ['images may change']
+        print(f"Pages to rebuild: {len(affected)} of {len(pages)}")
+        for page, reasons in affected.items():
+            print(f"    {os.path.relpath(page, DOCS_DIR)} ({', '.join(reasons)})")
+        return 0
+
+    failed = []
+    start = time.perf_counter()
+    functions = {key: (func, outputs, setup) for key, func, outputs, setup in sections}
+    for key, reason in stale:
+        func, outputs, setup = functions[key]
+        before = {path: file_hash(path) for path in outputs}
+        ok, output = run_producer(func, setup)
+        if not ok:
+            sys.stdout.write(output)
+            print(f"{key} failed")
+            failed.append(key)
+            state['sections'].pop(key, None)
+            continue
+        after = {path: file_hash(path) for path in outputs}
+        changed = [path for path in outputs if after[path] != before[path]]
+        print(f"Regenerated {key} ({reason}): {len(changed)} of {len(outputs)} image(s) changed")
+        state['sections'][key] = {'digest': digests[key], 'outputs': after}
+    if stale:
+        print(f"Ran {len(stale)} of {len(sections)} section(s) in {time.perf_counter() - start:.2f} s")
+    else:
+        print("All images are up to date")
+
+    affected = affected_pages(pages, state)
+    for page, reasons in affected.items():
+        print(f"Page {os.path.relpath(page, DOCS_DIR)}: {', '.join(reasons)}")
+    if args.no_site or not affected:
+        if not affected:
+            print("No pages to rebuild")
+        save_state(state, args.state)
+        return 1 if failed else 0
+
+    pending = update_site(affected, state, args.site_dir)
+    for page in affected:
+        if page not in pending:
+            state['pages'][page] = page_record(page)
+    save_state(state, args.state)
+    print(f"Updated {len(affected) - len(pending)} of {len(affected)} affected page(s) in {args.site_dir}")
+    if pending:
+        print("Still need `mkdocs build`: " + ', '.join(os.path.relpath(page, DOCS_DIR) for page in pending))
+        return 1
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
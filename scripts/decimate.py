@@ -0,0 +1,175 @@
+"""Data reduction for plotting long responses without losing their features.
+
+A line plot cannot show more than one vertical stroke per pixel column, so a
+multi-million-sample logged response only has to be drawn with about two
+points per column: the lowest and the highest sample that fall into it.
+``decimate`` keeps exactly those (plus the first and last sample), so every
+peak, dip and step that would be visible in the full plot is still drawn,
+and rendering time and PNG size stop depending on the raw sample count.
+
+LTTB (Largest-Triangle-Three-Buckets) is available as ``method='lttb'``. It
+picks one sample per bucket, the one that best preserves the visual shape,
+which gives smoother-looking curves at the same point count but does not
+guarantee the extremes.
+
+Points of interest can always be kept with ``keep``. The second-order
+figure keeps its overshoot peak and the samples on either side of each
+crossing of the settling band (``band_crossings``), so its annotations
+point at samples that are actually drawn.
+
+Dense scatters are thinned to one marker per pixel (the one drawn on top)
+and rasterized, so vector outputs do not carry one path per point.
+"""
+import numpy as np
+
+POINTS_PER_PIXEL = 2
+# Series shorter than this many times the target length are drawn as they are
+MIN_REDUCTION = 2
+# Scatters with more points than this become a raster image in vector outputs
+RASTERIZE_ABOVE = 5000
+# Scatters with more points than this are thinned to one marker per pixel
+SCATTER_MAX_POINTS = 50000
+
+def axes_pixels(ax, dpi=None):
+    """(width, height) of ax in pixels when saved at dpi (default: rcParams['savefig.dpi'])"""
+    import matplotlib
+
+    fig = ax.figure
+    if dpi is None:
+        dpi = matplotlib.rcParams['savefig.dpi']
+    if dpi == 'figure':
+        dpi = fig.dpi
+    position = ax.get_position()
+    return (max(int(position.width * fig.get_figwidth() * dpi), 1),
+            max(int(position.height * fig.get_figheight() * dpi), 1))
+
+def minmax_indices(x, y, buckets):
+    """Sorted indices of the first, last, lowest and highest sample of each bucket.
+
+    Buckets have equal widths in x, so non-uniform time grids still map
+    onto pixel columns; when x is not increasing, they hold equal numbers
+    of samples instead. NaN samples are dropped.
+    """
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    count = len(y)
+    if count <= 2 * buckets:
+        return np.arange(count)
+    if np.all(np.diff(x) >= 0):
+        edges = np.searchsorted(x, np.linspace(x[0], x[-1], buckets + 1)[:-1])
+    else:
+        edges = np.linspace(0, count, buckets + 1)[:-1].astype(int)
+    starts = np.unique(edges)
+    bucket = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, count)))
+    index = np.arange(count)
+    with np.errstate(invalid='ignore'):
+        lows = np.fmin.reduceat(y, starts)
+        highs = np.fmax.reduceat(y, starts)
+    first_low = np.minimum.reduceat(np.where(y == lows[bucket], index, count), starts)
+    first_high = np.minimum.reduceat(np.where(y == highs[bucket], index, count), starts)
+    selected = np.unique(np.concatenate([[0, count - 1], first_low, first_high]))
+    return selected[selected < count]
+
+def lttb_indices(x, y, points):
+    """Indices of a Largest-Triangle-Three-Buckets reduction of (x, y) to points samples"""
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    count = len(y)
+    if points >= count or points < 3:
+        return np.arange(count)
+    # points - 2 buckets between the first and the last sample, which are always kept
+    edges = np.linspace(1, count - 1, points - 1).astype(int)
+    selected = np.empty(points, dtype=int)
+    selected[0], selected[-1] = 0, count - 1
+    previous = 0
+    for i in range(points - 2):
+        start, stop = edges[i], edges[i + 1]
+        following = slice(stop, edges[i + 2]) if i + 2 < len(edges) else slice(count - 1, count)
+        mean_x, mean_y = x[following].mean(), y[following].mean()
+        # Twice the area of the triangle (previous, candidate, next bucket mean)
+        area = np.abs((x[previous] - mean_x) * (y[start:stop] - y[previous])
+                      - (x[previous] - x[start:stop]) * (mean_y - y[previous]))
+        previous = start + int(np.argmax(area))
+        selected[i + 1] = previous
+    return selected
+
+def band_crossings(y, center, tolerance):
+    """Indices of the samples on both sides of every entry into or exit from center ± tolerance"""
+    inside = np.abs(np.asarray(y, dtype=float) - center) <= tolerance
+    change = np.flatnonzero(inside[1:] != inside[:-1])
+    return np.union1d(change, change + 1)
+
+def decimate(x, y, pixels, method='minmax', keep=()):
+    """(x, y) reduced to about POINTS_PER_PIXEL * pixels samples, plus the indices in keep.
+
+    method is 'minmax' (keeps every bucket's extremes) or 'lttb'. Short
+    series are returned unchanged.
+    """
+    x, y = np.asarray(x), np.asarray(y)
+    target = POINTS_PER_PIXEL * int(pixels)
+    if len(y) <= MIN_REDUCTION * target:
+        return x, y
+    if method == 'minmax':
+        index = minmax_indices(x, y, target // 2)
+    elif method == 'lttb':
+        index = lttb_indices(x, y, target)
+    else:
+        raise ValueError(f"unknown decimation method {method!r} (expected 'minmax' or 'lttb')")
+    if len(keep):
+        index = np.union1d(index, np.asarray(keep, dtype=int))
+    return x[index], y[index]
+
+def plot_decimated(ax, x, y, *args, method='minmax', keep=(), dpi=None, **kwargs):
+    """ax.plot(x, y, ...) with the data decimated to the pixel width of ax"""
+    return ax.plot(*decimate(x, y, axes_pixels(ax, dpi)[0], method, keep), *args, **kwargs)
+
+def thin_scatter_indices(x, y, width, height, xlim=None, ylim=None):
+    """Indices of the last point in every occupied cell of a width x height grid.
+
+    The grid spans xlim x ylim, the view limits of the axes (default: the
+    extent of the finite points). Points outside the limits are thinned on
+    a one-cell border around the grid, since they are not visible anyway.
+    Non-finite points are dropped.
+    """
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    finite = np.flatnonzero(np.isfinite(x) & np.isfinite(y))
+    if not finite.size:
+        return finite
+    cells = np.zeros(len(finite), dtype=np.int64)
+    for values, size, limits in ((x[finite], width, xlim), (y[finite], height, ylim)):
+        low, high = (values.min(), values.max()) if limits is None else sorted(limits)
+        scale = size / (high - low) if high > low else 0.0
+        cell = np.clip(np.floor((values - low) * scale), -1, size).astype(np.int64)
+        # Cells -1 .. size, shifted to 0 .. size + 1
+        cells = cells * (size + 2) + cell + 1
+    # The last point of a cell is drawn on top of the others
+    _, last = np.unique(cells[::-1], return_index=True)
+    return finite[np.sort(len(finite) - 1 - last)]
+
+def scatter_dense(ax, x, y, c=None, s=None, dpi=None, **kwargs):
+    """ax.scatter that thins and rasterizes dense point clouds.
+
+    Above SCATTER_MAX_POINTS, only the top marker of every pixel is kept;
+    per-point c and s arrays are thinned along with the points. The pixels
+    are those of the view limits the axes get once the points are added,
+    in the axes' scales (log axes included). Above RASTERIZE_ABOVE the
+    collection is rasterized unless kwargs say otherwise.
+    """
+    x, y = np.asarray(x), np.asarray(y)
+    count = len(x)
+    if count > SCATTER_MAX_POINTS:
+        # Autoscale to the full data first, as ax.scatter would, so the
+        # limits are final before the points are binned
+        points = np.column_stack([x, y]).astype(float)
+        ax.update_datalim(points[np.isfinite(points).all(axis=1)])
+        ax.autoscale_view()
+        scale_x, scale_y = ax.xaxis.get_transform(), ax.yaxis.get_transform()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            index = thin_scatter_indices(scale_x.transform(points[:, 0]), scale_y.transform(points[:, 1]),
+                                         *axes_pixels(ax, dpi),
+                                         scale_x.transform(ax.get_xlim()), scale_y.transform(ax.get_ylim()))
+        x, y = x[index], y[index]
+        if c is not None and np.ndim(c) and len(c) == count:
+            c = np.asarray(c)[index]
+        if s is not None and np.ndim(s) and len(s) == count:
+            s = np.asarray(s)[index]
+    kwargs.setdefault('rasterized', count > RASTERIZE_ABOVE)
+    return ax.scatter(x, y, c=c, s=s, **kwargs)
@@ -0,0 +1,173 @@
+"""Time responses from cached discretizations of a transfer function.
+
+``control.step_response``, ``impulse_response`` and ``forced_response``
+each discretize the system again for the time grid they are given. Here a
+transfer function is sampled once per (num, den, dt, hold) and the result
+is kept in an LRU cache. Step, impulse, ramp and arbitrary inputs on the
+same grid then share one matrix exponential.
+
+Each ``DiscreteSystem`` holds the sampled state-space matrices and the
+equivalent difference equation. Responses run through
+``scipy.signal.lfilter``. Above ``MAX_FILTER_ORDER`` the polynomial form
+becomes ill-conditioned, so the state recurrence is iterated instead.
+
+The default first-order hold interpolates the input linearly between
+samples, as ``control.forced_response`` does, so the results match
+``control``:
+
+* a step is constant, and FOH is exact for it;
+* a ramp is linear, and FOH is exact for it too;
+* the impulse response is the free response from x(0) = B.
+
+The zero-order hold ('zoh') is the other option. It keeps the input
+constant over each sample period, like ``batch_response``.
+"""
+import functools
+
+import numpy as np
+from scipy.linalg import expm
+from scipy.signal import lfilter, ss2tf
+
+from batch_response import _uniform_step, tf_to_ss_batch
+
+CACHE_SIZE = 128
+# Difference equations of higher order lose accuracy to coefficient rounding
+MAX_FILTER_ORDER = 3
+
+def _discrete_state_space(num, den, dt, hold):
+    """(Ad, Bd, C, Dd, B1): the sampled system plus the FOH input feed-through B1"""
+    A, B, C, D = (value[0] for value in tf_to_ss_batch(num, den))
+    order = len(B)
+    if hold == 'zoh':
+        block = np.zeros((order + 1, order + 1))
+        block[:order, :order] = A * dt
+        block[:order, order] = B * dt
+        phi = expm(block)
+        return phi[:order, :order], phi[:order, order], C, D, np.zeros(order)
+    if hold == 'foh':
+        # x[k+1] = Ad x[k] + B0 u[k] + B1 u[k+1]; the state xi = x - B1 u
+        # removes the u[k+1] term, leaving an ordinary state-space system
+        block = np.zeros((order + 2, order + 2))
+        block[:order, :order] = A * dt
+        block[:order, order] = B * dt
+        block[order, order + 1] = 1.0
+        phi = expm(block)
+        Ad = phi[:order, :order]
+        B1 = phi[:order, order + 1]
+        B0 = phi[:order, order] - B1
+        return Ad, Ad @ B1 + B0, C, D + C @ B1, B1
+    raise ValueError(f"unknown hold {hold!r} (expected 'zoh' or 'foh')")
+
+def _filter_state(b, a, Ad, C, x0):
+    """lfilter state whose free response equals C Ad^k x0.
+
+    The free response of the filter is linear in its state, so the state
+    is found by matching the first len(x0) output samples.
+    """
+    order = len(x0)
+    zeros = np.zeros(order)
+    basis = np.column_stack([lfilter(b, a, zeros, zi=unit)[0] for unit in np.eye(order)])
+    target = np.empty(order)
+    x = np.array(x0, dtype=float)
+    for k in range(order):
+        target[k] = C @ x
+        x = Ad @ x
+    return np.linalg.lstsq(basis, target, rcond=None)[0]
+
+class DiscreteSystem:
+    """num/den sampled every dt with the given hold.
+
+    Instances come from ``discretized`` and are shared through its cache,
+    so their arrays are read-only. The internal state passed to and
+    returned by ``filter`` is opaque: lfilter's zi for low orders, the
+    sampled state otherwise.
+    """
+
+    def __init__(self, num, den, dt, hold='foh'):
+        self.dt = float(dt)
+        self.hold = hold
+        self.B = tf_to_ss_batch(num, den)[1][0]
+        self.Ad, self.Bd, self.C, self.Dd, self.B1 = _discrete_state_space(num, den, self.dt, hold)
+        self.order = len(self.B)
+        if not self.order:
+            self.b, self.a = np.array([self.Dd]), np.array([1.0])
+        else:
+            b, a = ss2tf(self.Ad, self.Bd[:, None], self.C[None, :], np.array([[self.Dd]]))
+            self.b, self.a = b[0], a
+        self.uses_filter = self.order <= MAX_FILTER_ORDER
+        for array in (self.B, self.Ad, self.Bd, self.C, self.B1, self.b, self.a):
+            array.setflags(write=False)
+
+    def state(self, x0=None, u0=0.0):
+        """Internal state for continuous state x0 (default: rest) when the first input is u0"""
+        xi = -self.B1 * u0 if x0 is None else np.asarray(x0, dtype=float) - self.B1 * u0
+        if not self.uses_filter:
+            return xi
+        if not np.any(xi):
+            return np.zeros(max(len(self.a), len(self.b)) - 1)
+        return _filter_state(self.b, self.a, self.Ad, self.C, xi)
+
+    def filter(self, U, state):
+        """Outputs for the input samples U starting from state; returns (y, next state)"""
+        U = np.asarray(U, dtype=float)
+        if self.uses_filter:
+            return lfilter(self.b, self.a, U, zi=state)
+        y = np.empty(len(U))
+        xi = np.array(state, dtype=float)
+        for k, u in enumerate(U):
+            y[k] = self.C @ xi + self.Dd * u
+            xi = self.Ad @ xi + self.Bd * u
+        return y, xi
+
+    def forced(self, U, x0=None):
+        """Response to the input samples U from x0 (default: rest)"""
+        U = np.asarray(U, dtype=float)
+        if not U.size:
+            return np.empty(0)
+        return self.filter(U, self.state(x0, U[0]))[0]
+
+    def free(self, x0, count):
+        """Zero-input response from continuous state x0 over count samples"""
+        return self.filter(np.zeros(count), self.state(x0))[0]
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def _discretized(num, den, dt, hold):
+    return DiscreteSystem(num, den, dt, hold)
+
+def discretized(num, den, dt, hold='foh'):
+    """Cached DiscreteSystem for num/den sampled every dt"""
+    key = tuple(tuple(np.atleast_1d(np.asarray(value, dtype=float)).tolist()) for value in (num, den))
+    return _discretized(*key, float(dt), hold)
+
+def discretize(num, den, dt, hold='foh'):
+    """Difference-equation coefficients (b, a) of num/den sampled every dt"""
+    system = discretized(num, den, dt, hold)
+    return system.b, system.a
+
+def forced_response(num, den, T, U, hold='foh'):
+    """(T, y) for the input U sampled on the uniform grid T, starting at rest"""
+    T, dt = _uniform_step(T)
+    U = np.broadcast_to(np.asarray(U, dtype=float), T.shape)
+    return T, discretized(num, den, dt, hold).forced(U)
+
+def step_response(num, den, T):
+    """(T, y) of the unit step response, as ``control.step_response``"""
+    return forced_response(num, den, T, np.ones(len(T)))
+
+def ramp_response(num, den, T):
+    """(T, y) of the response to u(t) = t, as ``control.forced_response(sys, T, T)``"""
+    return forced_response(num, den, T, T)
+
+def impulse_response(num, den, T):
+    """(T, y) of the impulse response, as ``control.impulse_response``.
+
+    Like control, the impulse a direct feed-through would pass at t = 0 is
+    left out.
+    """
+    T, dt = _uniform_step(T)
+    system = discretized(num, den, dt)
+    return T, system.free(system.B, len(T))
+
+def cache_info():
+    """Hit/miss statistics of the discretization cache"""
+    return _discretized.cache_info()
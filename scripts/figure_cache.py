@@ -0,0 +1,380 @@
+"""Content-addressed cache for the generated example figures.
+
+A cache entry is keyed on a hash of everything that determines a figure:
+the source of the function that draws it (which holds the transfer-function
+coefficients, time grid and plotting parameters), the module-level values
+and helpers it references, the content of every repo module it imports or
+calls into, the active matplotlib rcParams (DPI, style), the draft mode of
+``rendering`` and the versions of the numerical libraries. On a hit the
+stored PNGs are copied back into place and the console output of the
+original run is replayed, so neither the simulation nor ``savefig`` runs
+again.
+
+Each entry lives in its own directory with a ``manifest.json``; the
+manifest's modification time is its last-use stamp and entries are evicted
+least-recently-used first once the cache grows past ``max_bytes``.
+"""
+import dis
+import functools
+import hashlib
+import importlib.metadata
+import importlib.util
+import inspect
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import types
+from contextlib import redirect_stdout
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CACHE_DIR = os.path.join(REPO_ROOT, '.cache', 'figures')
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+CACHE_VERSION = 1
+
+# Libraries whose version changes can change a rendered figure
+TRACKED_LIBRARIES = ('numpy', 'scipy', 'matplotlib', 'control', 'seaborn', 'sympy')
+
+@functools.lru_cache(maxsize=None)
+def _installed_versions():
+    versions = {}
+    for name in TRACKED_LIBRARIES:
+        try:
+            versions[name] = importlib.metadata.version(name)
+        except importlib.metadata.PackageNotFoundError:
+            pass
+    return versions
+
+def library_versions():
+    """Installed versions of the tracked libraries.
+
+    Read from package metadata rather than the imported modules, so the key
+    does not depend on which libraries earlier, lazily importing sections
+    happened to load.
+    """
+    return dict(_installed_versions())
+
+def _rc_params_digest():
+    matplotlib = sys.modules.get('matplotlib')
+    if matplotlib is None:
+        return ''
+    items = sorted((key, repr(value)) for key, value in matplotlib.rcParams.items())
+    return hashlib.sha256(repr(items).encode()).hexdigest()
+
+def _render_settings():
+    rendering = sys.modules.get('rendering')
+    return rendering.render_settings() if rendering is not None else {}
+
+def _is_local(value, func):
+    """Whether value is defined in func's module or in one of the repo's scripts"""
+    if value.__module__ == func.__module__:
+        return True
+    source_file = inspect.getsourcefile(value) or ''
+    return os.path.abspath(source_file).startswith(REPO_ROOT + os.sep)
+
+def _repo_file(path):
+    """Absolute path of path if it is one of the repo's own files, else None"""
+    if not path:
+        return None
+    path = os.path.abspath(path)
+    if not path.startswith(REPO_ROOT + os.sep) or 'site-packages' in path.split(os.sep):
+        return None
+    if not os.path.isfile(path):
+        return None
+    return path
+
+def _code_objects(code):
+    """code and every function, lambda and comprehension nested in it"""
+    yield code
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            yield from _code_objects(const)
+
+def _imported_files(code):
+    """Repo files named by the import statements in code and its nested code objects"""
+    files = set()
+    for nested in _code_objects(code):
+        for instruction in dis.get_instructions(nested):
+            if instruction.opname != 'IMPORT_NAME':
+                continue
+            try:
+                spec = importlib.util.find_spec(instruction.argval)
+            except (ImportError, ValueError):
+                continue
+            if spec is not None:
+                files.add(_repo_file(spec.origin))
+    files.discard(None)
+    return files
+
+@functools.lru_cache(maxsize=None)
+def _module_imports(path, mtime_ns):
+    with open(path, 'rb') as f:
+        return _imported_files(compile(f.read(), path, 'exec'))
+
+def _referenced_names(func):
+    return sorted({name for code in _code_objects(func.__code__) for name in code.co_names})
+
+def local_functions(func, _seen=None):
+    """func and the repo helpers it references, including from nested lambdas and closures"""
+    seen = {} if _seen is None else _seen
+    if func in seen:
+        return seen
+    seen[func] = None
+    for name in _referenced_names(func):
+        value = func.__globals__.get(name)
+        if isinstance(value, types.FunctionType) and _is_local(value, func):
+            local_functions(value, seen)
+    return seen
+
+def imported_repo_modules(func):
+    """Files of the repo modules func and its helpers depend on, other than func's own.
+
+    Covers imports inside function bodies, module globals such as
+    ``rendering``, the modules that define helpers imported by name, and
+    everything those modules import in turn.
+    """
+    own = _repo_file(func.__globals__.get('__file__'))
+    pending = set()
+    for function in local_functions(func):
+        pending.add(_repo_file(inspect.getsourcefile(function)))
+        pending |= _imported_files(function.__code__)
+        for name in _referenced_names(function):
+            value = function.__globals__.get(name)
+            if isinstance(value, types.ModuleType):
+                pending.add(_repo_file(getattr(value, '__file__', None)))
+    pending.discard(None)
+    pending.discard(own)
+    files = set()
+    while pending:
+        path = pending.pop()
+        files.add(path)
+        pending |= _module_imports(path, os.stat(path).st_mtime_ns) - files - {own}
+    return files
+
+def _file_digest(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def _function_sources(func, _seen=None):
+    """Source of func plus the module-level values and helpers it references"""
+    seen = set() if _seen is None else _seen
+    if func in seen:
+        return ''
+    seen.add(func)
+
+    parts = [inspect.getsource(func)]
+    for name in _referenced_names(func):
+        if name not in func.__globals__:
+            continue
+        value = func.__globals__[name]
+        if isinstance(value, types.ModuleType) or name in func.__globals__.get('_RUNTIME_STATE', ()):
+            # Registries a module fills at run time (rendering._templates)
+            # are state, not inputs, and their repr holds object addresses
+            continue
+        if isinstance(value, types.FunctionType) and _is_local(value, func):
+            parts.append(_function_sources(value, seen))
+        elif isinstance(value, (int, float, complex, str, bytes, bool, tuple, list, dict)):
+            parts.append(f'{name}={value!r}')
+    return '\n'.join(parts)
+
+def source_fingerprint(func):
+    """Everything in the repo's code that can change what func draws.
+
+    The source of func and of the helpers it references (nested lambdas
+    and closures included), the module-level values they use, and the
+    content of every other repo module they import or call into. Editing an
+    engine such as ``step_metrics`` or a render helper such as ``decimate``
+    therefore changes the fingerprint of every section that uses it.
+    """
+    parts = [_function_sources(func)]
+    for path in sorted(imported_repo_modules(func)):
+        parts.append(f'{os.path.relpath(path, REPO_ROOT)} {_file_digest(path)}')
+    return '\n'.join(parts)
+
+def _update_hash(digest, value):
+    if hasattr(value, 'tobytes') and hasattr(value, 'dtype'):
+        digest.update(f'{value.dtype}{value.shape}'.encode())
+        digest.update(value.tobytes())
+    elif isinstance(value, (list, tuple)):
+        digest.update(b'[')
+        for item in value:
+            _update_hash(digest, item)
+        digest.update(b']')
+    elif isinstance(value, dict):
+        for key in sorted(value):
+            digest.update(repr(key).encode())
+            _update_hash(digest, value[key])
+    elif isinstance(value, bytes):
+        digest.update(value)
+    else:
+        digest.update(repr(value).encode())
+    digest.update(b'\0')
+
+def cache_key(*parts):
+    """Hash the given parts together with rcParams and library versions"""
+    digest = hashlib.sha256()
+    _update_hash(digest, CACHE_VERSION)
+    for part in parts:
+        _update_hash(digest, part)
+    _update_hash(digest, _rc_params_digest())
+    _update_hash(digest, _render_settings())
+    _update_hash(digest, library_versions())
+    return digest.hexdigest()
+
+class _Tee(io.TextIOBase):
+    """Write to a stream while keeping a copy of everything written"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.copy = io.StringIO()
+
+    def write(self, text):
+        self.copy.write(text)
+        return self.stream.write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+class FigureCache:
+    """On-disk cache of rendered figures with size-bounded LRU eviction"""
+
+    def __init__(self, root=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+
+    def _entry_dir(self, key):
+        return os.path.join(self.root, key)
+
+    def restore(self, key, outputs):
+        """Copy a cached entry's files to outputs; return its stdout or None on a miss"""
+        from rendering import write_atomic
+
+        entry = self._entry_dir(key)
+        manifest_path = os.path.join(entry, 'manifest.json')
+        try:
+            with open(manifest_path, encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if sorted(manifest['files']) != sorted(os.path.basename(path) for path in outputs):
+            return None
+        try:
+            for path in outputs:
+                os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+                # Atomic, so an interrupted restore never leaves a truncated image
+                with open(os.path.join(entry, os.path.basename(path)), 'rb') as f:
+                    write_atomic(path, f.read())
+            # Touch the manifest so it counts as recently used
+            os.utime(manifest_path)
+        except OSError:
+            return None
+        return manifest['stdout']
+
+    def store(self, key, outputs, stdout=''):
+        """Store outputs under key, then evict old entries if over budget"""
+        os.makedirs(self.root, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix='.tmp-', dir=self.root)
+        try:
+            size = 0
+            for path in outputs:
+                target = os.path.join(staging, os.path.basename(path))
+                shutil.copyfile(path, target)
+                size += os.path.getsize(target)
+            manifest = {
+                'files': [os.path.basename(path) for path in outputs],
+                'size': size,
+                'stdout': stdout,
+                'created': time.time(),
+                'libraries': library_versions(),
+            }
+            with open(os.path.join(staging, 'manifest.json'), 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, indent=2)
+            # Renaming the staged directory publishes the entry atomically;
+            # if another process got there first its copy is just as good
+            try:
+                os.rename(staging, self._entry_dir(key))
+            except OSError:
+                pass
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        self.evict()
+
+    def entries(self):
+        """(last used, size, key) for every complete entry, oldest first"""
+        found = []
+        try:
+            names = os.listdir(self.root)
+        except FileNotFoundError:
+            return found
+        for name in names:
+            manifest_path = os.path.join(self.root, name, 'manifest.json')
+            if name.startswith('.tmp-'):
+                continue
+            try:
+                with open(manifest_path, encoding='utf-8') as f:
+                    size = json.load(f)['size']
+                found.append((os.path.getmtime(manifest_path), size, name))
+            except (OSError, ValueError, KeyError):
+                continue
+        return sorted(found)
+
+    def evict(self):
+        """Remove least-recently-used entries until the cache fits in max_bytes"""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, key in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+            total -= size
+
+    def clear(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+def run_cached(func, outputs, cache=None, extra=()):
+    """Call func unless the figures it writes to outputs are cached.
+
+    The key combines the fingerprint of func with any extra parts. On a miss
+    func runs normally and its outputs and console output are stored; on a
+    hit they are restored instead. Returns True on a cache hit.
+    """
+    if cache is None:
+        func()
+        return False
+
+    key = cache_key(source_fingerprint(func), list(extra))
+    stdout = cache.restore(key, outputs)
+    if stdout is not None:
+        sys.stdout.write(stdout)
+        return True
+
+    tee = _Tee(sys.stdout)
+    with redirect_stdout(tee):
+        func()
+    stdout = tee.copy.getvalue()
+
+    def store():
+        if all(os.path.exists(path) for path in outputs):
+            cache.store(key, outputs, stdout)
+    # The images may still be queued in a background writer (rendering is
+    # only loaded if func saved something through it)
+    rendering = sys.modules.get('rendering')
+    if rendering is not None:
+        rendering.when_written(outputs, store)
+    else:
+        store()
+    return False
+
+def default_cache():
+    """Cache configured by the FIGURE_CACHE environment variable.
+
+    Unset uses the default directory, "0"/"off" disables caching and any
+    other value is taken as the cache directory.
+    """
+    setting = os.environ.get('FIGURE_CACHE', '')
+    if setting.lower() in ('0', 'off', 'false', 'no'):
+        return None
+    return FigureCache(setting or DEFAULT_CACHE_DIR)
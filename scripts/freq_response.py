@@ -0,0 +1,404 @@
+"""Vectorized frequency responses for batches of transfer functions.
+
+The numerator and denominator of every system in a batch are evaluated at
+s = j*omega with one broadcast Horner recurrence, so a Bode family for
+hundreds of filters costs a handful of array operations. The magnitude and
+phase it returns are meant to be computed once and then reused both for
+plotting (``plot_bode``) and for stability margins
+(``margins_from_response``) instead of asking ``control`` to evaluate the
+same response again for each. When no response is needed, ``margins_batch``
+solves for the crossover frequencies of a whole batch directly from the
+polynomials, with no grid to resolve.
+
+Coefficient arrays follow the ``control``/``numpy.polyval`` convention
+(highest power first), one row per system; 1-D arrays describe one system.
+"""
+import numpy as np
+
+FEATURE_PERIPHERY_DECADES = 1
+DEFAULT_POINTS = 1000
+# Relative step in omega^2 on either side of a gain crossing found by
+# margins_batch, to tell a crossing from a touch
+TOUCH_STEP = 1e-6
+
+def polyval_batch(coefficients, s):
+    """Evaluate each row of coefficients at every point of s (Horner's rule).
+
+    coefficients has shape (n, k + 1); returns shape (n, len(s)).
+    """
+    coefficients = np.atleast_2d(np.asarray(coefficients))
+    s = np.asarray(s)
+    result = np.zeros((coefficients.shape[0], s.size), dtype=np.result_type(coefficients, s, complex))
+    for column in coefficients.T:
+        result *= s
+        result += column[:, None]
+    return result
+
+def frequency_response_batch(num, den, omega):
+    """Complex response G(j*omega) of every system, shape (n, len(omega))"""
+    num = np.atleast_2d(np.asarray(num, dtype=float))
+    den = np.atleast_2d(np.asarray(den, dtype=float))
+    s = 1j * np.asarray(omega, dtype=float)
+    return polyval_batch(num, s) / polyval_batch(den, s)
+
+def default_frequency_grid(num, den, points=DEFAULT_POINTS):
+    """Log grid reaching a decade beyond the batch's poles and zeros.
+
+    Uses the same rule as ``control``'s default Bode range, so plots cover
+    the same frequencies as ``control.bode_plot`` would.
+    """
+    features = []
+    for row in (*np.atleast_2d(num), *np.atleast_2d(den)):
+        roots = np.roots(np.trim_zeros(np.asarray(row, dtype=float), 'f'))
+        features.extend(np.abs(roots[~np.isclose(roots, 0.0)]))
+    features = np.log10(features) if features else np.zeros(1)
+    low = np.rint(features.min() - FEATURE_PERIPHERY_DECADES)
+    high = np.rint(features.max() + FEATURE_PERIPHERY_DECADES)
+    return np.logspace(low, high, points)
+
+def bode_batch(num, den, omega=None):
+    """Magnitude (absolute), unwrapped phase (degrees) and omega for a batch.
+
+    mag and phase have shape (n, len(omega)).
+    """
+    if omega is None:
+        omega = default_frequency_grid(num, den)
+    omega = np.asarray(omega, dtype=float)
+    response = frequency_response_batch(num, den, omega)
+    mag = np.abs(response)
+    phase = np.degrees(np.unwrap(np.angle(response), axis=-1))
+    return mag, phase, omega
+
+def adaptive_bode(num, den, omega_min=None, omega_max=None, tolerance=0.05,
+                  initial_points=33, max_points=DEFAULT_POINTS):
+    """Bode data on a log grid refined only where the response bends.
+
+    Starts from initial_points log-spaced frequencies and bisects (in log
+    frequency) every interval whose midpoint differs from the straight
+    line between its ends by more than tolerance, in dB for the magnitude
+    or degrees for the phase, for any system of the batch. Every evaluated
+    frequency is kept, so resonances with low damping or high Q end up
+    densely sampled while flat stretches stay coarse. max_points bounds the
+    total number of frequencies; when it is reached, the intervals with
+    the largest errors are refined first. Returns (mag, phase, omega) like
+    ``bode_batch``.
+    """
+    if omega_min is None or omega_max is None:
+        default = default_frequency_grid(num, den, points=2)
+        omega_min = default[0] if omega_min is None else omega_min
+        omega_max = default[-1] if omega_max is None else omega_max
+
+    log_omega = np.linspace(np.log10(omega_min), np.log10(omega_max), initial_points)
+    response = frequency_response_batch(num, den, 10 ** log_omega)
+    # Error estimate per interval; inf means "not checked yet"
+    error = np.full(len(log_omega) - 1, np.inf)
+
+    while len(log_omega) < max_points:
+        candidates = np.flatnonzero(error > tolerance)
+        if not candidates.size:
+            break
+        budget = max_points - len(log_omega)
+        if candidates.size > budget:
+            candidates = candidates[np.argsort(error[candidates])[::-1][:budget]]
+            candidates.sort()
+
+        mid = 0.5 * (log_omega[candidates] + log_omega[candidates + 1])
+        mid_response = frequency_response_batch(num, den, 10 ** mid)
+        left, right = response[:, candidates], response[:, candidates + 1]
+        # Compare against linear interpolation; phases are taken relative to
+        # the left end so no unwrapping is needed
+        mag_error = np.abs(20 * np.log10(np.abs(mid_response))
+                           - 10 * np.log10(np.abs(left) * np.abs(right)))
+        phase_error = np.degrees(np.abs(np.angle(mid_response / left) - 0.5 * np.angle(right / left)))
+        child_error = np.max(np.maximum(mag_error, phase_error), axis=0)
+
+        # Both halves inherit the error of the interval they came from
+        error[candidates] = child_error
+        error = np.insert(error, candidates + 1, child_error)
+        log_omega = np.insert(log_omega, candidates + 1, mid)
+        response = np.insert(response, candidates + 1, mid_response, axis=1)
+
+    mag = np.abs(response)
+    phase = np.degrees(np.unwrap(np.angle(response), axis=-1))
+    return mag, phase, 10 ** log_omega
+
+def refine_peak(num, den, mag, omega, iterations=60):
+    """Locate the magnitude peak of each system between its grid neighbours.
+
+    Golden-section search in log frequency around the sampled maximum,
+    vectorized over the batch. Returns (peak magnitude, peak frequency).
+    """
+    mag = np.atleast_2d(mag)
+    log_omega = np.log10(np.asarray(omega, dtype=float))
+    index = np.argmax(mag, axis=1)
+    lo = log_omega[np.maximum(index - 1, 0)]
+    hi = log_omega[np.minimum(index + 1, len(log_omega) - 1)]
+    num = np.atleast_2d(num)
+    den = np.atleast_2d(den)
+
+    def magnitude(x):
+        # One frequency per system: row i is evaluated at its own x[i]
+        s = 1j * 10 ** x
+        count = max(num.shape[0], den.shape[0], s.size)
+        numerator = np.zeros(count, dtype=complex)
+        for column in num.T:
+            numerator = numerator * s + column
+        denominator = np.zeros(count, dtype=complex)
+        for column in den.T:
+            denominator = denominator * s + column
+        return np.abs(numerator / denominator)
+
+    ratio = (np.sqrt(5) - 1) / 2
+    a = hi - ratio * (hi - lo)
+    b = lo + ratio * (hi - lo)
+    fa, fb = magnitude(a), magnitude(b)
+    for _ in range(iterations):
+        left = fa >= fb
+        hi = np.where(left, b, hi)
+        lo = np.where(left, lo, a)
+        new_a = hi - ratio * (hi - lo)
+        new_b = lo + ratio * (hi - lo)
+        a, b = np.where(left, new_a, b), np.where(left, a, new_b)
+        fa, fb = np.where(left, magnitude(a), fb), np.where(left, fa, magnitude(b))
+    peak = 0.5 * (lo + hi)
+    return magnitude(peak), 10 ** peak
+
+def _interpolate_crossings(x, omega, level):
+    """Where each row of x crosses level between grid points.
+
+    Returns (mask, fraction, log omega at the crossing), each of shape
+    (n, len(omega) - 1); fraction is the position inside the interval.
+    A row that lands exactly on level at a grid point counts only if it
+    goes on to the other side: touching level is not crossing it.
+    """
+    below = x[:, :-1] - level
+    above = x[:, 1:] - level
+    # Sample after the interval's end; the last interval ending on level counts
+    after = np.concatenate([above[:, 1:], -below[:, -1:]], axis=1)
+    mask = (below * above < 0) | ((below != 0) & (above == 0) & (below * after < 0))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fraction = np.where(mask, below / (below - above), 0.0)
+    log_omega = np.log10(omega)
+    crossing = log_omega[:-1] + fraction * np.diff(log_omega)
+    return mask, fraction, crossing
+
+def margins_from_response(mag, phase, omega):
+    """Gain/phase margins of a batch from an already computed response.
+
+    Follows ``control.margin``: gm is the smallest gain margin (absolute
+    ratio) at a -180 deg phase crossing, pm the phase margin of smallest
+    magnitude at a unity-gain crossing, and wg/wp the corresponding
+    frequencies. Crossings are interpolated linearly in log frequency;
+    systems without a crossing get inf for the margin and nan for the
+    frequency. Returns four arrays of length n.
+    """
+    mag = np.atleast_2d(mag)
+    phase = np.atleast_2d(phase)
+    omega = np.asarray(omega, dtype=float)
+    rows = np.arange(mag.shape[0])
+
+    # Phase crossings: the phase passes an odd multiple of 180 degrees
+    turns = np.floor((phase + 180) / 360)
+    level = np.maximum(turns[:, 1:], turns[:, :-1]) * 360 - 180
+    start = phase[:, :-1] - level
+    end = phase[:, 1:] - level
+    crossed = (turns[:, 1:] != turns[:, :-1]) & (start != end)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fraction = np.where(crossed, start / (start - end), 0.0)
+    log_mag = np.log10(np.maximum(mag, np.finfo(float).tiny))
+    mag_at = 10 ** (log_mag[:, :-1] + fraction * np.diff(log_mag, axis=1))
+    log_omega = np.log10(omega)
+    gm_all = np.where(crossed, 1 / mag_at, np.inf)
+    gm_index = np.argmin(gm_all, axis=1)
+    gm = gm_all[rows, gm_index]
+    wg = np.where(np.isfinite(gm),
+                  10 ** (log_omega[gm_index] + fraction[rows, gm_index] * np.diff(log_omega)[gm_index]),
+                  np.nan)
+
+    # Gain crossings: |G| passes through 1
+    mask, fraction, crossing = _interpolate_crossings(log_mag, omega, 0.0)
+    phase_at = phase[:, :-1] + fraction * np.diff(phase, axis=1)
+    pm_all = np.where(mask, (phase_at + 180 + 180) % 360 - 180, np.inf)
+    pm_index = np.argmin(np.abs(pm_all), axis=1)
+    pm = pm_all[rows, pm_index]
+    wp = np.where(np.isfinite(pm), 10 ** crossing[rows, pm_index], np.nan)
+    return gm, pm, wg, wp
+
+def _iw_parts(coefficients):
+    """Real polynomials A, B in u = omega^2 with p(j omega) = A(u) + j omega B(u).
+
+    coefficients has one row per system, highest power of s first; A and B
+    are returned in ascending powers of u.
+    """
+    ascending = np.atleast_2d(np.asarray(coefficients, dtype=float))[:, ::-1]
+    # (j omega)^(2m) = (-1)^m u^m and (j omega)^(2m+1) = j omega (-1)^m u^m
+    even, odd = ascending[:, 0::2], ascending[:, 1::2]
+    A = even * (-1.0) ** np.arange(even.shape[1])
+    B = odd * (-1.0) ** np.arange(odd.shape[1]) if odd.shape[1] else np.zeros((len(ascending), 1))
+    return A, B
+
+def _polymul_rows(a, b):
+    """Row-wise product of polynomials in ascending powers"""
+    result = np.zeros((max(len(a), len(b)), a.shape[1] + b.shape[1] - 1))
+    for i in range(b.shape[1]):
+        result[:, i:i + a.shape[1]] += a * b[:, i:i + 1]
+    return result
+
+def _polysub_rows(a, b):
+    width = max(a.shape[1], b.shape[1])
+    return np.pad(a, ((0, 0), (0, width - a.shape[1]))) - np.pad(b, ((0, 0), (0, width - b.shape[1])))
+
+def _positive_real_roots(polynomials, tolerance=1e-12):
+    """Positive real roots of each row (ascending powers), nan-padded to shape (n, degree).
+
+    Rows are grouped by their actual degree and the roots of each group come
+    from one batched eigenvalue call on the companion matrices. Coefficients
+    below tolerance times the row's largest one count as zero, so leading
+    terms that cancel do not produce spurious huge roots.
+    """
+    polynomials = np.atleast_2d(polynomials)
+    count, width = polynomials.shape
+    roots = np.full((count, max(width - 1, 0)), np.nan)
+    scale = np.max(np.abs(polynomials), axis=1, keepdims=True)
+    significant = np.abs(polynomials) > tolerance * scale
+    degree = np.where(significant.any(axis=1), width - 1 - np.argmax(significant[:, ::-1], axis=1), 0)
+    for d in np.unique(degree):
+        if d == 0:
+            continue
+        rows = np.flatnonzero(degree == d)
+        coefficients = polynomials[rows, :d + 1]
+        companion = np.zeros((len(rows), d, d))
+        companion[:, 0, :] = -coefficients[:, d - 1::-1] / coefficients[:, d:d + 1]
+        if d > 1:
+            companion[:, 1:, :-1] = np.eye(d - 1)
+        eigenvalues = np.linalg.eigvals(companion)
+        real = (np.imag(eigenvalues) == 0) & (np.real(eigenvalues) > 0)
+        roots[rows, :d] = np.where(real, np.real(eigenvalues), np.nan)
+    return roots
+
+def _evaluate_rows(coefficients, s):
+    """Row i of coefficients evaluated at the points s[i] (Horner's rule)"""
+    result = np.zeros(s.shape, dtype=complex)
+    for column in coefficients.T:
+        result = result * s + column[:, None]
+    return result
+
+def margins_batch(num, den):
+    """Gain/phase margins of a batch by root finding, without a frequency grid.
+
+    The crossover frequencies are solved for directly. With
+    G(j omega) = (An + j omega Bn) / (Ad + j omega Bd) split into
+    polynomials in u = omega^2:
+
+    * the gain crossings solve An^2 + u Bn^2 - Ad^2 - u Bd^2 = 0;
+    * the phase crossings solve Bn Ad - An Bd = 0 with Re G <= 0, and
+      omega = 0 also counts when G(0) <= 0.
+
+    Following ``control.margin``, gm is the margin closest to 1 (in log
+    terms) and pm the one of smallest magnitude. A frequency where |G| only
+    touches 1 (the peak of a unity-gain band-pass) is not a crossing, as in
+    ``control.margin`` and ``margins_from_response``. Systems without a
+    crossing get inf for the margin and nan for the frequency. Returns
+    (gm, pm, wg, wp), four arrays of length n.
+    """
+    num = np.atleast_2d(np.asarray(num, dtype=float))
+    den = np.atleast_2d(np.asarray(den, dtype=float))
+    count = max(len(num), len(den))
+    num = np.broadcast_to(num, (count, num.shape[1]))
+    den = np.broadcast_to(den, (count, den.shape[1]))
+    # Solve in s' = s / scale, with scale the geometric mean of the nonzero
+    # poles' magnitudes. High-order models (reduced plants, for instance)
+    # have coefficients spanning many decades, which squaring in u would
+    # push past double precision; the margins do not depend on the scaling.
+    rows = np.arange(count)
+    nonzero = den != 0
+    leading = np.argmax(nonzero, axis=1)
+    last = den.shape[1] - 1 - np.argmax(nonzero[:, ::-1], axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scale = np.abs(den[rows, last] / den[rows, leading]) ** (1 / (last - leading))
+    scale = np.where(np.isfinite(scale) & (scale > 0), scale, 1.0)[:, None]
+    num = num * scale ** np.arange(num.shape[1] - 1, -1, -1)
+    den = den * scale ** np.arange(den.shape[1] - 1, -1, -1)
+    peak = np.max(np.abs(den), axis=1, keepdims=True)
+    num, den = num / peak, den / peak
+    An, Bn = _iw_parts(num)
+    Ad, Bd = _iw_parts(den)
+    u = np.array([[0.0, 1.0]])
+
+    def magnitude_squared(A, B):
+        return _polysub_rows(_polymul_rows(A, A), -_polymul_rows(u, _polymul_rows(B, B)))
+
+    gain = _polysub_rows(magnitude_squared(An, Bn), magnitude_squared(Ad, Bd))
+    phase = _polysub_rows(_polymul_rows(Bn, Ad), _polymul_rows(An, Bd))
+    wc2 = _positive_real_roots(gain)
+    # Keep the roots where |G| - 1 changes sign; a double root (a touch)
+    # keeps its sign on both sides
+    sides = [np.real(_evaluate_rows(gain[:, ::-1], wc2 * factor)) for factor in (1 - TOUCH_STEP, 1 + TOUCH_STEP)]
+    wc = np.sort(np.sqrt(np.where(sides[0] * sides[1] < 0, wc2, np.nan)), axis=1)
+    w180 = np.sort(np.hstack([np.zeros((count, 1)), np.sqrt(_positive_real_roots(phase))]), axis=1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        response = _evaluate_rows(num, 1j * w180) / _evaluate_rows(den, 1j * w180)
+        crossing = np.isfinite(response) & (np.real(response) <= 0) & ~np.isnan(w180)
+        gm_all = np.where(crossing, 1 / np.abs(response), np.inf)
+        distance = np.where(crossing, np.abs(np.log(gm_all)), np.inf)
+    gm_index = np.argmin(distance, axis=1)
+    found = np.isfinite(distance[rows, gm_index])
+    gm = np.where(found, gm_all[rows, gm_index], np.inf)
+    wg = np.where(found, w180[rows, gm_index] * scale[:, 0], np.nan)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        response = _evaluate_rows(num, 1j * wc) / _evaluate_rows(den, 1j * wc)
+    pm_all = np.where(np.isnan(wc), np.inf, np.remainder(np.angle(response, deg=True), 360) - 180)
+    pm_index = np.argmin(np.abs(pm_all), axis=1)
+    pm = pm_all[rows, pm_index]
+    wp = np.where(np.isfinite(pm), wc[rows, pm_index] * scale[:, 0], np.nan)
+    return gm, pm, wg, wp
+
+def plot_bode(mag, phase, omega, dB=True, labels=None, fig=None, **kwargs):
+    """Draw a Bode plot for precomputed responses on fig (default: current figure).
+
+    Produces the magnitude-over-phase layout of ``control.bode_plot``. If
+    fig already holds a Bode plot with one line per system, those lines are
+    updated in place. Returns the (magnitude, phase) axes.
+    """
+    import matplotlib.pyplot as plt
+    from matplotlib.ticker import MultipleLocator
+
+    fig = plt.gcf() if fig is None else fig
+    if len(fig.axes) == 2:
+        ax_mag, ax_phase = fig.axes
+    else:
+        fig.clear()
+        ax_mag, ax_phase = fig.subplots(2, 1, sharex=True)
+
+    mag = np.atleast_2d(mag)
+    phase = np.atleast_2d(phase)
+    labels = [None] * len(mag) if labels is None else labels
+    mag_lines, phase_lines = ax_mag.get_lines(), ax_phase.get_lines()
+    if len(mag_lines) == len(mag) and len(phase_lines) == len(phase):
+        # Redrawing into a reused figure: move the existing lines instead of adding more
+        for m, p, mag_line, phase_line in zip(mag, phase, mag_lines, phase_lines):
+            mag_line.set_data(omega, 20 * np.log10(m) if dB else m)
+            phase_line.set_data(omega, p)
+        for ax in (ax_mag, ax_phase):
+            ax.relim()
+            ax.autoscale_view()
+    else:
+        for m, p, label in zip(mag, phase, labels):
+            ax_mag.semilogx(omega, 20 * np.log10(m) if dB else m, label=label, **kwargs)
+            ax_phase.semilogx(omega, p, label=label, **kwargs)
+
+    if not dB:
+        ax_mag.set_yscale('log')
+    ax_mag.set_ylabel('Magnitude [dB]' if dB else 'Magnitude')
+    ax_phase.set_ylabel('Phase [deg]')
+    ax_phase.set_xlabel('Frequency [rad/s]')
+    # Phase ticks on multiples of 45 degrees, as control does for small ranges
+    if np.ptp(phase) <= 360:
+        ax_phase.yaxis.set_major_locator(MultipleLocator(45))
+    for ax in (ax_mag, ax_phase):
+        ax.grid(True, which='both')
+    if any(label is not None for label in labels):
+        ax_mag.legend()
+    return ax_mag, ax_phase
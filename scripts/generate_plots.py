@@ -1,7 +1,16 @@
+import argparse
 import control
 import numpy as np
 import matplotlib.pyplot as plt
 import os
+import sys
+
+from batch_response import first_order_batch, step_response_batch
+from figure_cache import default_cache, run_cached
+from image_writer import background_writes
+from instrumentation import measure, phase, print_report, write_report
+from rendering import savefig
+from result_store import record_results
 
 # Create the images directory if it doesn't exist
 os.makedirs('docs/static/images', exist_ok=True)
@@ -11,14 +20,15 @@ def generate_single_step_response():
     s = control.TransferFunction.s
     G = control.TransferFunction([1, 2], [1, 2, 1])
     
-    t, y = control.step_response(G)
+    with phase('simulate'):
+        t, y = control.step_response(G)
     plt.figure()
     plt.plot(t, y, linewidth=2)
     plt.grid(True)
     plt.title('Step Response')
     plt.xlabel('Time (s)')
     plt.ylabel('Amplitude')
-    plt.savefig('docs/static/images/step_response.png', bbox_inches='tight', dpi=300)
+    savefig('docs/static/images/step_response.png', bbox_inches='tight', dpi=300)
     plt.close()
 
 # Generate multiple step responses plot
@@ -26,9 +36,14 @@ def generate_multiple_step_responses():
     plt.figure()
     t = np.linspace(0, 5, 500)
     
-    for a in range(1, 6):
-        G = control.TransferFunction([a], [1, a])
-        t, y = control.step_response(G, t)
+    # Simulate every G(s) = a/(s + a) in one vectorized pass
+    gains = np.arange(1, 6)
+    num, den = first_order_batch(gains, gains)
+    with phase('simulate'):
+        t, Y = step_response_batch(num, den, t)
+    # Kept for replotting and analysis when RESULT_STORE is set
+    record_results('multiple_step_responses', {'gains': gains}, t=t, Y=Y, num=num, den=den)
+    for a, y in zip(gains, Y):
         plt.plot(t, y, linewidth=2, label=f'a={a}')
     
     plt.grid(True)
@@ -36,10 +51,44 @@ def generate_multiple_step_responses():
     plt.ylabel('Amplitude')
     plt.title('Step Responses for Different Systems')
     plt.legend(loc='lower right')
-    plt.savefig('docs/static/images/multiple_step_responses.png', bbox_inches='tight', dpi=300)
+    savefig('docs/static/images/multiple_step_responses.png', bbox_inches='tight', dpi=300)
     plt.close()
 
+# (name, function, images written)
+SECTIONS = [
+    ('single_step_response', generate_single_step_response, ['docs/static/images/step_response.png']),
+    ('multiple_step_responses', generate_multiple_step_responses,
+     ['docs/static/images/multiple_step_responses.png']),
+]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Regenerate the step response plots in docs/static/images.')
+    parser.add_argument('--report', metavar='FILE',
+                        help='write per-plot timings, figures and peak RSS to FILE (.json or .csv) '
+                             'and print a summary')
+    parser.add_argument('--profile-dir', metavar='DIR',
+                        help='write a cProfile dump per plot to DIR/<name>.prof')
+    args = parser.parse_args(argv)
+
+    # Figures whose inputs are unchanged are restored from the cache; the
+    # others are compressed and written in the background
+    cache = default_cache()
+    records = []
+    with background_writes() as writer:
+        for name, func, outputs in SECTIONS:
+            with measure(name, args.profile_dir) as record:
+                record['cached'] = run_cached(func, outputs, cache)
+            records.append(record)
+        errors = writer.flush()
+    for path, error in errors:
+        print(f"Failed to write {path}: {error}")
+    if args.report:
+        write_report(records, args.report)
+        print_report(records)
+    if errors:
+        return 1
+    print("Plots generated successfully!")
+    return 0
+
 if __name__ == "__main__":
-    generate_single_step_response()
-    generate_multiple_step_responses()
-    print("Plots generated successfully!") 
\ No newline at end of file
+    sys.exit(main())
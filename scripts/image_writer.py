@@ -0,0 +1,185 @@
+"""Background PNG encoding and writing for the example figures.
+
+``rendering.savefig`` normally rasterizes, compresses and writes a figure
+before it returns. Inside ``background_writes()`` it only rasterizes. The
+RGBA pixels are copied out of the Agg canvas and handed to a small thread
+pool, which compresses them to PNG and writes the file atomically
+(``rendering.write_atomic``). Meanwhile the caller goes on simulating the
+next system. Pillow releases the GIL while it compresses, so the encoding
+really overlaps the numerics.
+
+At most ``max_pending`` images can be queued or in progress. ``savefig``
+blocks while the queue is full (backpressure), so memory stays bounded by
+that many RGBA buffers, about 40 MB each for a 300 dpi 14x8 inch figure.
+Images for the same path are written in submission order.
+
+``flush`` waits for everything submitted so far and returns the failures
+as (path, exception) pairs. ``close``, which also runs when the
+``background_writes`` block ends, raises ``ImageWriteError`` for any
+failure nobody collected.
+
+The PNGs are byte-for-byte the ones ``savefig`` writes directly: the
+encoding goes through the same ``matplotlib.image.imsave`` call, with the
+same DPI and metadata. Other formats are still written synchronously.
+"""
+import contextlib
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import matplotlib
+import matplotlib.image
+import numpy as np
+
+import rendering
+
+WORKERS = 2
+MAX_PENDING = 4
+
+class ImageWriteError(Exception):
+    """One or more background image writes failed"""
+
+    def __init__(self, errors):
+        self.errors = list(errors)
+        details = '; '.join(f'{path}: {error}' for path, error in self.errors)
+        super().__init__(f"{len(self.errors)} image write(s) failed: {details}")
+
+def rasterize(fig, **savefig_kwargs):
+    """Draw fig as savefig would; returns the encoding job (pixels, dpi, metadata, pil_kwargs)"""
+    kwargs = dict(savefig_kwargs)
+    kwargs.pop('format', None)
+    metadata = kwargs.pop('metadata', None)
+    pil_kwargs = kwargs.pop('pil_kwargs', None)
+    dpi = kwargs.get('dpi', matplotlib.rcParams['savefig.dpi'])
+    if dpi == 'figure':
+        dpi = fig.dpi
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='rgba', **kwargs)
+    # savefig leaves the renderer it drew with on the canvas; its size is
+    # the output size after any bbox_inches='tight' cropping
+    renderer = fig.canvas.renderer
+    pixels = np.frombuffer(buffer.getvalue(), dtype=np.uint8).reshape(int(renderer.height), int(renderer.width), 4)
+    return pixels, dpi, metadata, pil_kwargs
+
+def encode_png(pixels, dpi, metadata=None, pil_kwargs=None):
+    """PNG bytes of an RGBA array, exactly as savefig would encode them"""
+    buffer = io.BytesIO()
+    matplotlib.image.imsave(buffer, pixels, format='png', origin='upper', dpi=dpi, metadata=metadata,
+                            pil_kwargs=pil_kwargs)
+    return buffer.getvalue()
+
+class ImageWriter:
+    """Bounded thread pool that encodes rasterized figures and writes them atomically"""
+
+    def __init__(self, workers=WORKERS, max_pending=MAX_PENDING):
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='image-writer')
+        self._slots = threading.Semaphore(max_pending)
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        # Tasks and callbacks not finished yet, the latest write per path, and the failures
+        self._outstanding = 0
+        self._pending = {}
+        self._errors = []
+
+    def submit(self, path, job):
+        """Queue a job from ``rasterize`` for path; blocks while max_pending images are in flight"""
+        self._slots.acquire()
+        key = os.path.abspath(path)
+        with self._lock:
+            previous = self._pending.get(key)
+            try:
+                future = self._pool.submit(self._write, path, job, previous)
+            except BaseException:
+                self._slots.release()
+                raise
+            self._pending[key] = future
+            self._outstanding += 1
+        future.add_done_callback(lambda future: self._finished(key, path, future))
+        return future
+
+    def _write(self, path, job, previous):
+        if previous is not None:
+            # An earlier image for the same path must land first. It was
+            # queued earlier, so it is already running or done.
+            wait([previous])
+        data = encode_png(*job)
+        rendering.write_atomic(path, data)
+        rendering.add_timings(bytes=len(data))
+
+    def _finished(self, key, path, future):
+        self._slots.release()
+        with self._idle:
+            if future.exception() is not None:
+                self._errors.append((path, future.exception()))
+            if self._pending.get(key) is future:
+                del self._pending[key]
+            self._outstanding -= 1
+            self._idle.notify_all()
+
+    def when_written(self, paths, callback):
+        """Call callback() once the queued writes of paths have succeeded.
+
+        Runs it right away if none of them is queued, and never if one
+        fails. An exception from callback is reported like a failed write.
+        """
+        with self._lock:
+            futures = [self._pending[key] for key in map(os.path.abspath, paths) if key in self._pending]
+            if futures:
+                self._outstanding += 1
+        if not futures:
+            callback()
+            return
+        remaining = [len(futures)]
+
+        def done(_):
+            with self._lock:
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+            try:
+                if not any(future.exception() for future in futures):
+                    callback()
+            except Exception as error:
+                with self._lock:
+                    self._errors.append((', '.join(paths), error))
+            finally:
+                with self._idle:
+                    self._outstanding -= 1
+                    self._idle.notify_all()
+
+        for future in futures:
+            future.add_done_callback(done)
+
+    def flush(self):
+        """Wait for every queued write and callback; returns and forgets the (path, exception) failures"""
+        with self._idle:
+            self._idle.wait_for(lambda: not self._outstanding)
+            errors, self._errors = self._errors, []
+        return errors
+
+    def close(self, raise_errors=True):
+        """Flush, stop the threads and raise ImageWriteError for any uncollected failure"""
+        errors = self.flush()
+        self._pool.shutdown()
+        if errors and raise_errors:
+            raise ImageWriteError(errors)
+
+@contextlib.contextmanager
+def background_writes(workers=WORKERS, max_pending=MAX_PENDING):
+    """Route PNG ``rendering.savefig`` calls in the block through an ImageWriter.
+
+    Only for use in one process: worker processes forked from inside the
+    block would inherit a pool without threads.
+    """
+    writer = ImageWriter(workers, max_pending)
+    previous = rendering.set_writer(writer)
+    try:
+        yield writer
+    except BaseException:
+        rendering.set_writer(previous)
+        # The original exception matters more than failed writes
+        writer.close(raise_errors=False)
+        raise
+    rendering.set_writer(previous)
+    writer.close()
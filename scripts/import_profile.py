@@ -0,0 +1,60 @@
+"""Summarize where a script's start-up time goes.
+
+``profile_script`` runs a script again under ``python -X importtime`` and
+folds the per-module report into one line per top-level package (numpy,
+scipy, matplotlib, control, ...), so the cost of each heavy dependency is
+visible at a glance instead of being spread over hundreds of submodules.
+The script's own output is passed through unchanged.
+"""
+import re
+import subprocess
+import sys
+import time
+
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$')
+
+def parse_importtime(text):
+    """(self us, cumulative us, module, depth) for every -X importtime line in text"""
+    entries = []
+    for line in text.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            own, cumulative, indent, name = match.groups()
+            entries.append((int(own), int(cumulative), name, (len(indent) - 1) // 2))
+    return entries
+
+def summarize(entries):
+    """Self time in seconds and module count per top-level package, slowest first"""
+    totals = {}
+    for own, _, name, _ in entries:
+        package = name.split('.')[0]
+        seconds, count = totals.get(package, (0.0, 0))
+        totals[package] = (seconds + own * 1e-6, count + 1)
+    return sorted(totals.items(), key=lambda item: item[1][0], reverse=True)
+
+def print_summary(summary, wall_time, top=15, stream=None):
+    stream = sys.stdout if stream is None else stream
+    total = sum(seconds for _, (seconds, _) in summary)
+    print(f"\nImport profile: {total:.3f} s in imports, {wall_time:.3f} s wall time", file=stream)
+    print(f"{'package':<24}{'seconds':>10}{'share':>8}{'modules':>9}", file=stream)
+    for package, (seconds, count) in summary[:top]:
+        share = seconds / total * 100 if total else 0.0
+        print(f"{package:<24}{seconds:>10.3f}{share:>7.1f}%{count:>9}", file=stream)
+    rest = summary[top:]
+    if rest:
+        seconds = sum(seconds for _, (seconds, _) in rest)
+        count = sum(count for _, (_, count) in rest)
+        print(f"{f'({len(rest)} more)':<24}{seconds:>10.3f}{'':>8}{count:>9}", file=stream)
+
+def profile_script(script, argv=(), top=15):
+    """Run script with argv under -X importtime, print the summary, return its exit code"""
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', script, *argv],
+                            stderr=subprocess.PIPE, text=True)
+    wall_time = time.perf_counter() - start
+    # Anything on stderr that is not an importtime line belongs to the script
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:'):
+            print(line, file=sys.stderr)
+    print_summary(summarize(parse_importtime(result.stderr)), wall_time, top)
+    return result.returncode
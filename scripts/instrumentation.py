@@ -0,0 +1,161 @@
+"""Per-section timing, memory and profiling records for the example scripts.
+
+``measure(name)`` wraps one section. When the block finishes, the dict it
+yields holds:
+
+* wall and CPU time;
+* the time ``rendering.savefig`` spent rendering and writing, plus the
+  remaining ``compute`` time (simulation and analysis). With background
+  writes (``image_writer``), write is only the time spent waiting for a
+  free writer slot, and bytes are counted when a write completes;
+* the number of figures created (pyplot figures count once saved or if
+  still open when the block ends; a pooled template that is only updated
+  creates none), the number saved and the bytes written;
+* the peak resident set size during the block.
+
+Code inside a section can break ``compute`` down further with
+``phase('simulate')`` or ``phase('analyze')`` blocks. With a profile
+directory, each section also leaves a cProfile dump, ``<name>.prof``, that
+``python -m pstats`` or snakeviz can open.
+
+``write_report`` saves the records as JSON or CSV, whichever the file
+extension says, so doc-build timings can be compared across releases.
+"""
+import contextlib
+import cProfile
+import csv
+import json
+import os
+import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows; peak RSS is then reported as None
+    resource = None
+
+FIELDS = ('section', 'ok', 'cached', 'wall', 'cpu', 'compute', 'render', 'write', 'figures', 'saved', 'bytes',
+          'peak_rss')
+
+# Record of the section being measured, for phase()
+_active = None
+# State that changes as sections run; figure_cache leaves it out of keys
+_RUNTIME_STATE = frozenset({'_active'})
+
+def _reset_peak_rss():
+    """Restart the kernel's peak-RSS counter for this process (Linux only)"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+def peak_rss():
+    """Peak resident set size of this process in bytes, or None if unknown"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def _rendering_timings():
+    """rendering.timings(), or zeros while nothing has imported rendering (and so matplotlib).
+
+    Open pyplot figures are counted first, so figures made before the block
+    are not charged to it and figures left open in it are.
+    """
+    rendering = sys.modules.get('rendering')
+    if rendering is None:
+        return dict.fromkeys(('render', 'write', 'created', 'saved', 'bytes'), 0)
+    rendering.count_open_figures()
+    return rendering.timings()
+
+@contextlib.contextmanager
+def phase(name):
+    """Add the wall time of the block to phase name of the section being measured"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if _active is not None:
+            phases = _active['phases']
+            phases[name] = phases.get(name, 0.0) + time.perf_counter() - start
+
+@contextlib.contextmanager
+def measure(name, profile_dir=None):
+    """Measure the block as section name; yields its record, complete after the block.
+
+    Outside Linux the peak RSS is the process-wide peak so far rather than
+    the section's own, because the counter cannot be reset there.
+    """
+    global _active
+    record = {'section': name, 'ok': True, 'cached': False, 'phases': {}}
+    outer, _active = _active, record
+    _reset_peak_rss()
+    before = _rendering_timings()
+    profiler = cProfile.Profile() if profile_dir else None
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        if profiler is not None:
+            profiler.enable()
+        yield record
+    except BaseException:
+        record['ok'] = False
+        raise
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        record['wall'] = time.perf_counter() - wall
+        record['cpu'] = time.process_time() - cpu
+        after = _rendering_timings()
+        for key in ('render', 'write', 'saved', 'bytes'):
+            record[key] = after[key] - before[key]
+        record['figures'] = after['created'] - before['created']
+        record['compute'] = record['wall'] - record['render'] - record['write']
+        record['peak_rss'] = peak_rss()
+        _active = outer
+        if profiler is not None:
+            os.makedirs(profile_dir, exist_ok=True)
+            record['profile'] = os.path.join(profile_dir, f'{name}.prof')
+            profiler.dump_stats(record['profile'])
+
+def write_report(records, path):
+    """Save records as JSON or CSV (chosen by the extension of path)"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    if path.endswith('.csv'):
+        phases = sorted({key for record in records for key in record.get('phases', {})})
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow([*FIELDS, *(f'phase_{key}' for key in phases)])
+            for record in records:
+                writer.writerow([record.get(key) for key in FIELDS]
+                                + [record.get('phases', {}).get(key) for key in phases])
+    else:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'created': time.time(), 'sections': records}, f, indent=2)
+
+def print_report(records):
+    """Table of the records, slowest section first, with one column per phase"""
+    phases = sorted({key for record in records for key in record.get('phases', {})})
+    names = [record['section'] + (' (cached)' if record['cached'] else '') for record in records]
+    width = max([22, *(len(name) + 2 for name in names)])
+    print(f"{'Section':<{width}}{'Wall (s)':>10}{'CPU (s)':>10}{'Compute':>10}"
+          + ''.join(f"{key.capitalize():>10}" for key in phases)
+          + f"{'Render':>10}{'Write':>10}{'Figures':>9}{'Saved':>7}{'Peak RSS':>11}")
+    for name, record in sorted(zip(names, records), key=lambda item: item[1]['wall'], reverse=True):
+        rss = record['peak_rss']
+        rss = f"{rss / 2**20:.0f} MB" if rss is not None else '-'
+        spent = record.get('phases', {})
+        print(f"{name:<{width}}{record['wall']:10.3f}{record['cpu']:10.3f}{record['compute']:10.3f}"
+              + ''.join(f"{spent[key]:10.3f}" if key in spent else f"{'-':>10}" for key in phases)
+              + f"{record['render']:10.3f}{record['write']:10.3f}{record['figures']:9d}{record['saved']:7d}{rss:>11}")
+    total = sum(record['wall'] for record in records)
+    print(f"{'Total':<{width}}{total:10.3f}")
@@ -0,0 +1,344 @@
+"""Balanced model reduction of high-order plants, with a cached result.
+
+The examples use plants of order 1 to 3. Plants of order 50 to 500 make
+every step, Bode and root-locus computation slow, and their transfer-
+function coefficients are too ill-conditioned to be trusted. ``reduce``
+replaces such a plant with a low-order state-space model:
+
+1. The poles on or right of the imaginary axis (within a small tolerance)
+   are split off with an ordered real Schur form and a Sylvester equation.
+   They are kept exactly.
+2. The stable part is balanced with the square-root method. Its Hankel
+   singular values sigma_1 >= sigma_2 >= ... measure how much each
+   balanced state contributes to the input-output behaviour.
+3. The balanced states beyond the requested order are removed. With
+   ``method='matchdc'`` (the default) they are residualized, which keeps
+   the DC gain and so the final value of the step response. With
+   'truncate' they are simply dropped, which is more accurate at high
+   frequency.
+
+Either way the reduction error obeys the bound
+
+    max over w of |G(jw) - Gr(jw)| <= 2 * (sigma_{r+1} + ... + sigma_n)
+
+so an absolute tolerance fixes the order, and the bound is reported with
+the model.
+
+Reduced models are cached in memory and, by default, on disk under
+``.cache/reduced``, keyed on a hash of the plant matrices and the options.
+Their ``tf`` is an ordinary (num, den) pair, so ``discrete_sim``,
+``freq_response.bode_batch``, ``margins_batch`` and ``step_metrics`` take
+them unchanged:
+
+    model = reduce(plant, tolerance=1e-4)
+    T, y = discrete_sim.step_response(*model.tf, T)
+
+Only SISO plants are handled, like the rest of the scripts.
+"""
+import argparse
+import functools
+import hashlib
+import io
+import os
+import sys
+import time
+
+import numpy as np
+from scipy.linalg import schur, solve_continuous_lyapunov, solve_sylvester
+from scipy.signal import lsim, ss2tf
+
+from batch_response import tf_to_ss_batch
+from figure_cache import REPO_ROOT
+
+DEFAULT_CACHE_DIR = os.path.join(REPO_ROOT, '.cache', 'reduced')
+CACHE_SIZE = 32
+CACHE_VERSION = 1
+METHODS = ('matchdc', 'truncate')
+# Poles with real part above -STABILITY_TOLERANCE * max(1, |A|) count as unstable
+STABILITY_TOLERANCE = 1e-9
+# Hankel singular values below this fraction of the largest are numerically zero
+RANK_TOLERANCE = 1e-12
+
+def as_state_space(plant):
+    """(A, B, C, D) with B and C as vectors for a SISO plant.
+
+    plant is an (A, B, C, D) tuple, a (num, den) pair, or a
+    ``control.StateSpace``/``TransferFunction``.
+    """
+    if hasattr(plant, 'A'):
+        A, B, C, D = plant.A, plant.B, plant.C, plant.D
+    elif hasattr(plant, 'num') and hasattr(plant, 'den'):
+        A, B, C, D = (value[0] for value in tf_to_ss_batch(plant.num[0][0], plant.den[0][0]))
+    elif len(plant) == 2:
+        A, B, C, D = (value[0] for value in tf_to_ss_batch(*plant))
+    elif len(plant) == 4:
+        A, B, C, D = plant
+    else:
+        raise ValueError("plant must be (A, B, C, D), (num, den) or a control system")
+    A = np.atleast_2d(np.asarray(A, dtype=float))
+    B = np.asarray(B, dtype=float).reshape(-1)
+    C = np.asarray(C, dtype=float).reshape(-1)
+    D = float(np.asarray(D, dtype=float).reshape(-1)[0]) if np.size(D) else 0.0
+    if A.shape != (len(B), len(B)) or len(C) != len(B):
+        raise ValueError(f"inconsistent shapes: A {A.shape}, B {B.shape}, C {C.shape} (SISO only)")
+    return A, B, C, D
+
+def split_unstable(A, B, C):
+    """Block-diagonalize into a stable and an unstable part.
+
+    Returns (As, Bs, Cs), (Au, Bu, Cu): two subsystems whose sum is the
+    original strictly proper system.
+    """
+    threshold = STABILITY_TOLERANCE * max(1.0, np.linalg.norm(A, 1))
+    T, Z, stable = schur(A, output='real', sort=lambda re, im: re < -threshold)
+    Bz, Cz = Z.T @ B, C @ Z
+    As, Asu, Au = T[:stable, :stable], T[:stable, stable:], T[stable:, stable:]
+    # X with As X - X Au + Asu = 0 removes the coupling block
+    X = solve_sylvester(As, -Au, -Asu) if stable and stable < len(A) else np.zeros((stable, len(A) - stable))
+    return ((As, Bz[:stable] - X @ Bz[stable:], Cz[:stable]),
+            (Au, Bz[stable:], Cz[:stable] @ X + Cz[stable:]))
+
+def _gramian_factor(A, BB):
+    """L with L L^T = W, the solution of A W + W A^T + BB = 0"""
+    W = solve_continuous_lyapunov(A, -BB)
+    values, vectors = np.linalg.eigh((W + W.T) / 2)
+    return vectors * np.sqrt(np.clip(values, 0.0, None))
+
+def balance(A, B, C):
+    """Balanced realization of a stable system, dropping numerically unobservable/uncontrollable states.
+
+    Returns (Ab, Bb, Cb, hsv), where hsv holds every Hankel singular value,
+    including the ones too small to keep.
+    """
+    Lc = _gramian_factor(A, np.outer(B, B))
+    Lo = _gramian_factor(A.T, np.outer(C, C))
+    U, hsv, Vt = np.linalg.svd(Lo.T @ Lc)
+    rank = int(np.sum(hsv > RANK_TOLERANCE * hsv[0])) if len(hsv) and hsv[0] > 0 else 0
+    scale = 1 / np.sqrt(hsv[:rank])
+    right = Lc @ Vt[:rank].T * scale
+    left = (U[:, :rank] * scale).T @ Lo.T
+    return left @ A @ right, left @ B, C @ right, hsv
+
+def error_bound(hsv, order):
+    """Twice the sum of the Hankel singular values beyond order"""
+    return 2 * float(np.sum(hsv[order:]))
+
+def choose_order(hsv, tolerance):
+    """Smallest order whose error bound is within tolerance"""
+    tails = 2 * np.cumsum(hsv[::-1])[::-1]
+    return int(np.argmax(np.append(tails, 0.0) <= tolerance))
+
+class ReducedModel:
+    """A reduced plant plus what it was reduced from.
+
+    A, B, C, D is the reduced state-space model (stable part first, then
+    the kept unstable part). hsv holds the Hankel singular values of the
+    original stable part, and error_bound the guaranteed H-infinity error.
+    """
+
+    def __init__(self, A, B, C, D, hsv, full_order, unstable_order, error_bound, method):
+        self.A, self.B, self.C, self.D = A, B, C, float(D)
+        self.hsv = hsv
+        self.full_order = int(full_order)
+        self.unstable_order = int(unstable_order)
+        self.error_bound = float(error_bound)
+        self.method = method
+        for array in (self.A, self.B, self.C, self.hsv):
+            array.setflags(write=False)
+
+    @property
+    def order(self):
+        return len(self.B)
+
+    @functools.cached_property
+    def tf(self):
+        """(num, den) of the reduced model, highest power first"""
+        if not self.order:
+            return np.array([self.D]), np.array([1.0])
+        num, den = ss2tf(self.A, self.B[:, None], self.C[None, :], np.array([[self.D]]))
+        return num[0], den
+
+    def ss(self):
+        return self.A, self.B, self.C, self.D
+
+    def to_control(self):
+        """The reduced model as a ``control.StateSpace``"""
+        import control
+
+        return control.ss(self.A, self.B[:, None], self.C[None, :], self.D)
+
+    def summary(self):
+        return (f"order {self.full_order} -> {self.order} ({self.unstable_order} unstable kept, "
+                f"{self.method}), error bound {self.error_bound:.3g}")
+
+def _reduce(A, B, C, D, order, tolerance, method):
+    (As, Bs, Cs), (Au, Bu, Cu) = split_unstable(A, B, C)
+    if order is not None and order < len(Au):
+        raise ValueError(f"order {order} is below the {len(Au)} unstable poles, which are always kept")
+    if len(As):
+        Ab, Bb, Cb, hsv = balance(As, Bs, Cs)
+    else:
+        Ab, Bb, Cb, hsv = As, Bs, Cs, np.zeros(0)
+    if order is not None:
+        kept = min(order - len(Au), len(Ab))
+    else:
+        kept = min(choose_order(hsv, tolerance), len(Ab))
+    bound = error_bound(hsv, kept)
+
+    A11, B1, C1, Dr = Ab[:kept, :kept], Bb[:kept], Cb[:kept], D
+    if method == 'matchdc' and kept < len(Ab):
+        # Residualize: set the derivatives of the dropped states to zero
+        A12, A21, A22 = Ab[:kept, kept:], Ab[kept:, :kept], Ab[kept:, kept:]
+        solved = np.linalg.solve(A22, np.column_stack([A21, Bb[kept:]]))
+        A11 = A11 - A12 @ solved[:, :kept]
+        B1 = B1 - A12 @ solved[:, kept]
+        C1 = C1 - Cb[kept:] @ solved[:, :kept]
+        Dr = D - Cb[kept:] @ solved[:, kept]
+    Ar = np.zeros((kept + len(Au), kept + len(Au)))
+    Ar[:kept, :kept], Ar[kept:, kept:] = A11, Au
+    return ReducedModel(Ar, np.concatenate([B1, Bu]), np.concatenate([C1, Cu]), Dr, hsv,
+                        len(A), len(Au), bound, method)
+
+def _key(A, B, C, D, order, tolerance, method):
+    digest = hashlib.sha256(f'{CACHE_VERSION}|{order}|{tolerance!r}|{method}|{A.shape}'.encode())
+    for array in (A, B, C, np.array([D])):
+        digest.update(np.ascontiguousarray(array, dtype=float).tobytes())
+    return digest.hexdigest()
+
+def _load(path):
+    with np.load(path) as data:
+        values = {key: data[key] for key in data.files}
+    return ReducedModel(values['A'], values['B'], values['C'], values['D'], values['hsv'],
+                        values['full_order'], values['unstable_order'], values['error_bound'],
+                        str(values['method']))
+
+def _save(model, path):
+    """Write the model to path atomically, so readers never see a partial file"""
+    # Imported here: rendering loads matplotlib, which reduction alone does not need
+    from rendering import write_atomic
+
+    buffer = io.BytesIO()
+    np.savez(buffer, A=model.A, B=model.B, C=model.C, D=model.D, hsv=model.hsv,
+             full_order=model.full_order, unstable_order=model.unstable_order,
+             error_bound=model.error_bound, method=model.method)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    write_atomic(path, buffer.getvalue())
+
+# key -> ReducedModel, oldest first
+_memory = {}
+# State that changes as models are reduced; figure_cache leaves it out of keys
+_RUNTIME_STATE = frozenset({'_memory'})
+
+def reduce(plant, tolerance=None, order=None, method='matchdc', cache_dir=DEFAULT_CACHE_DIR):
+    """Reduced model of plant with an H-infinity error of at most tolerance (or of the given order).
+
+    plant is anything ``as_state_space`` accepts. Exactly one of tolerance
+    and order must be given. Results are cached in memory and, unless
+    cache_dir is None, as ``<cache_dir>/<hash>.npz``.
+    """
+    if (tolerance is None) == (order is None):
+        raise ValueError("give exactly one of tolerance and order")
+    if method not in METHODS:
+        raise ValueError(f"unknown method {method!r} (expected one of {', '.join(METHODS)})")
+    A, B, C, D = as_state_space(plant)
+    key = _key(A, B, C, D, order, tolerance, method)
+    model = _memory.get(key)
+    if model is not None:
+        return model
+    path = os.path.join(cache_dir, f'{key}.npz') if cache_dir else None
+    if path is not None and os.path.exists(path):
+        try:
+            model = _load(path)
+        except (OSError, ValueError, KeyError):
+            model = None
+    if model is None:
+        model = _reduce(A, B, C, D, order, tolerance, method)
+        if path is not None:
+            _save(model, path)
+    if len(_memory) >= CACHE_SIZE:
+        _memory.pop(next(iter(_memory)))
+    _memory[key] = model
+    return model
+
+def reduced_tf(num, den, tolerance, method='matchdc', cache_dir=DEFAULT_CACHE_DIR):
+    """(num, den) of the reduced plant, for code that works on coefficients"""
+    return reduce((num, den), tolerance, method=method, cache_dir=cache_dir).tf
+
+def heat_rod_plant(order, sensor=0.5, diffusivity=1.0):
+    """(A, B, C, D) of a unit-length rod split into order cells.
+
+    The input is the temperature imposed at one end, the other end is
+    insulated, and the output is the temperature at the fraction sensor of
+    the length. Diffusion smooths everything, so a handful of balanced
+    states reproduces hundreds of cells.
+    """
+    rate = diffusivity * order**2
+    A = rate * (np.diag(np.full(order, -2.0)) + np.diag(np.ones(order - 1), 1) + np.diag(np.ones(order - 1), -1))
+    A[-1, -1] = -rate
+    B = np.zeros(order)
+    B[0] = rate
+    C = np.zeros(order)
+    C[int(round(sensor * (order - 1)))] = 1.0
+    return A, B, C, 0.0
+
+def frequency_response(A, B, C, D, omega):
+    """G(j omega) of a state-space model, one linear solve per frequency"""
+    identity = np.eye(len(B))
+    return np.array([C @ np.linalg.solve(1j * w * identity - A, B) + D for w in omega])
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Balanced reduction of a discretized heat-conduction plant.')
+    parser.add_argument('--order', type=int, default=200, help='number of cells of the full plant (default: 200)')
+    parser.add_argument('--tolerance', type=float, default=1e-4,
+                        help='H-infinity error allowed in the reduced model (default: 1e-4)')
+    parser.add_argument('--method', choices=METHODS, default='matchdc')
+    parser.add_argument('--no-cache', action='store_true', help='do not read or write the disk cache')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    from discrete_sim import step_response
+    from freq_response import bode_batch, margins_batch, margins_from_response
+
+    args = parse_args(argv)
+    plant = heat_rod_plant(args.order)
+    cache_dir = None if args.no_cache else DEFAULT_CACHE_DIR
+
+    start = time.perf_counter()
+    model = reduce(plant, args.tolerance, method=args.method, cache_dir=cache_dir)
+    reduce_time = time.perf_counter() - start
+    print(f"Reduced {model.summary()} in {reduce_time:.3f} s")
+    print("Largest Hankel singular values: " + ', '.join(f'{value:.3g}' for value in model.hsv[:8]))
+
+    omega = np.logspace(-2, 4, 600)
+    start = time.perf_counter()
+    full = frequency_response(*plant, omega)
+    full_time = time.perf_counter() - start
+    start = time.perf_counter()
+    mag, phase, _ = bode_batch(*model.tf, omega)
+    reduced_time = time.perf_counter() - start
+    reduced = mag[0] * np.exp(1j * np.radians(phase[0]))
+    print(f"Frequency response: full {full_time:.3f} s, reduced {reduced_time:.4f} s, "
+          f"max |G - Gr| {np.max(np.abs(full - reduced)):.3g} (bound {model.error_bound:.3g})")
+
+    # The full plant's coefficients are too ill-conditioned for a (num, den)
+    # simulation, so it runs as a state-space model; the reduced one as (num, den)
+    T = np.linspace(0, 5, 5001)
+    A, B, C, D = plant
+    start = time.perf_counter()
+    _, full_step, _ = lsim((A, B[:, None], C[None, :], D), np.ones_like(T), T)
+    full_time = time.perf_counter() - start
+    start = time.perf_counter()
+    _, reduced_step = step_response(*model.tf, T)
+    reduced_time = time.perf_counter() - start
+    print(f"Step response: full {full_time:.3f} s, reduced {reduced_time:.4f} s, "
+          f"max difference {np.max(np.abs(full_step - reduced_step)):.3g}")
+
+    # The full gain margin can only be read off the sampled response
+    full_gm, _, full_wg, _ = margins_from_response(np.abs(full), np.degrees(np.unwrap(np.angle(full))), omega)
+    gm, _, wg, _ = margins_batch(*model.tf)
+    print(f"Gain margin: full {full_gm[0]:.4g} at {full_wg[0]:.4g} rad/s, "
+          f"reduced {gm[0]:.4g} at {wg[0]:.4g} rad/s")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,310 @@
+"""Fixed-rate closed-loop simulation for software-in-the-loop timing tests.
+
+The other time-domain tools compute a whole response offline. Here a
+plant and a controller are discretized once for the control period
+(zero-order hold, through the ``discrete_sim`` cache) and stepped one
+tick at a time on a wall-clock schedule, 1 to 10 kHz typically, against
+a reference read from a local stand-in signal source.
+
+Every tick is released at start + k * period. The loop sleeps until
+shortly before the release time and then spins, because ``time.sleep``
+alone wakes up tens of microseconds late. At each tick it reads the
+plant output, runs the controller and advances the plant. The control
+input is held until the next tick, as a DAC would hold it. With a direct
+feed-through in the plant, the measurement sees the input of the
+previous tick, which avoids an algebraic loop.
+
+The step itself allocates no arrays. All states live in buffers created
+up front, and each update is one ``np.dot`` into a preallocated output;
+``allocation_check`` measures this with ``tracemalloc``. The garbage
+collector is off while the loop runs.
+
+Three histograms with 1 us bins are kept per run:
+
+* latency: release time to the start of the step (the scheduling jitter);
+* compute: the duration of the step function;
+* response: release time to the end of the step. A tick misses its
+  deadline when this exceeds the period.
+
+Late ticks are not skipped. The next ones run as soon as possible until
+the schedule catches up, so the plant sees every sample.
+
+    python scripts/realtime.py --rate 5000 --duration 2 --load 2
+"""
+import argparse
+import gc
+import json
+import multiprocessing
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from discrete_sim import discretized, forced_response
+from pid_tuning import loop_coefficients, pid_coefficients
+
+RATE = 1000
+DURATION = 2.0
+# Sleep until this long before the release time, then spin
+SPIN_NS = 200_000
+BIN_NS = 1000
+BINS = 20_000
+SIGNALS = ('step', 'square', 'sine')
+PERCENTILES = (50, 90, 99, 99.9)
+
+class ClosedLoop:
+    """Unity-feedback loop of a controller and a plant, both (num, den), sampled every dt.
+
+    ``step(reference)`` advances one tick and returns the plant output
+    measured at the start of it. No arrays are allocated after __init__.
+    """
+
+    def __init__(self, plant, controller, dt):
+        self.dt = float(dt)
+        self.plant = discretized(*plant, self.dt, 'zoh')
+        self.controller = discretized(*controller, self.dt, 'zoh')
+        # [x; u] -> [Ad Bd] [x; u] and y = [C D] [x; u], one dot product each
+        self._plant_step, self._plant_output, self._plant_xu, self._plant_x, self._plant_next = \
+            self._buffers(self.plant)
+        self._ctrl_step, self._ctrl_output, self._ctrl_xe, self._ctrl_x, self._ctrl_next = \
+            self._buffers(self.controller)
+        self.reset()
+
+    @staticmethod
+    def _buffers(system):
+        order = system.order
+        step = np.hstack([system.Ad, system.Bd[:, None]])
+        output = np.append(system.C, system.Dd)
+        xu = np.zeros(order + 1)
+        return step, output, xu, xu[:order], np.zeros(order)
+
+    def reset(self):
+        """Both systems at rest and no input applied"""
+        self._plant_xu.fill(0.0)
+        self._ctrl_xe.fill(0.0)
+
+    def step(self, reference):
+        y = np.dot(self._plant_output, self._plant_xu)
+        self._ctrl_xe[-1] = reference - y
+        u = np.dot(self._ctrl_output, self._ctrl_xe)
+        np.dot(self._ctrl_step, self._ctrl_xe, out=self._ctrl_next)
+        np.copyto(self._ctrl_x, self._ctrl_next)
+        self._plant_xu[-1] = u
+        np.dot(self._plant_step, self._plant_xu, out=self._plant_next)
+        np.copyto(self._plant_x, self._plant_next)
+        return y
+
+def pid_loop(plant, gains, dt, filter_time):
+    """ClosedLoop of plant with Kp + Ki/s + Kd s/(Tf s + 1)"""
+    num, den = pid_coefficients(np.array([gains], dtype=float), filter_time)
+    return ClosedLoop(plant, (num[0], den[0]), dt)
+
+def reference_signal(kind, ticks, rate, amplitude=1.0, period=1.0):
+    """Stand-in for an external setpoint source, sampled for every tick.
+
+    'step' holds amplitude, 'square' alternates between amplitude and 0,
+    and 'sine' oscillates around 0, both with the given period in seconds.
+    """
+    t = np.arange(ticks) / rate
+    if kind == 'step':
+        return np.full(ticks, float(amplitude))
+    if kind == 'square':
+        return amplitude * (np.floor(2 * t / period) % 2 == 0)
+    if kind == 'sine':
+        return amplitude * np.sin(2 * np.pi * t / period)
+    raise ValueError(f"unknown signal {kind!r} (expected one of {', '.join(SIGNALS)})")
+
+class Histogram:
+    """Counts of durations in BIN_NS-wide bins; the last bin also holds everything longer"""
+
+    def __init__(self, bins=BINS, bin_ns=BIN_NS):
+        self.bin_ns = bin_ns
+        self.last = bins - 1
+        self.counts = np.zeros(bins, dtype=np.int64)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def add(self, value):
+        self.counts[min(value // self.bin_ns, self.last)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q):
+        """Upper edge of the bin holding the q-th percentile, in ns"""
+        if not self.count:
+            return 0
+        index = int(np.searchsorted(np.cumsum(self.counts), q / 100 * self.count))
+        return min((index + 1) * self.bin_ns, self.max)
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def summary(self):
+        """{'mean', 'p50', ..., 'max'} in microseconds"""
+        summary = {'mean': self.mean() / 1e3}
+        summary.update((f'p{q:g}', self.percentile(q) / 1e3) for q in PERCENTILES)
+        summary['max'] = self.max / 1e3
+        return summary
+
+    def to_dict(self):
+        used = np.flatnonzero(self.counts)
+        return {'bin_us': self.bin_ns / 1e3, 'bins': {int(i): int(self.counts[i]) for i in used},
+                **self.summary()}
+
+def run_realtime(loop, reference, rate, spin_ns=SPIN_NS):
+    """Step loop once per tick of a rate-Hz schedule; returns (outputs, histograms, misses).
+
+    histograms is {'latency', 'compute', 'response'}; misses counts the
+    ticks that ended after their deadline.
+    """
+    period = round(1e9 / rate)
+    ticks = len(reference)
+    outputs = np.empty(ticks)
+    histograms = {name: Histogram() for name in ('latency', 'compute', 'response')}
+    latency, compute, response = histograms.values()
+    misses = 0
+    clock, sleep, step = time.perf_counter_ns, time.sleep, loop.step
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        release = clock() + period
+        for k in range(ticks):
+            wait = release - clock() - spin_ns
+            if wait > 0:
+                sleep(wait / 1e9)
+            while (start := clock()) < release:
+                pass
+            outputs[k] = step(reference[k])
+            end = clock()
+            latency.add(start - release)
+            compute.add(end - start)
+            response.add(end - release)
+            if end - release > period:
+                misses += 1
+            release += period
+    finally:
+        if collecting:
+            gc.enable()
+    return outputs, histograms, misses
+
+def allocation_check(loop, reference):
+    """(peak, net) bytes traced by tracemalloc while stepping loop through reference"""
+    step = loop.step
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        for value in reference:
+            step(value)
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak - before, current - before
+
+def _burn():
+    while True:
+        pass
+
+def start_load(workers):
+    """Start workers busy-looping processes to compete with the loop for the CPU"""
+    processes = [multiprocessing.Process(target=_burn, daemon=True) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    return processes
+
+def stop_load(processes):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.join()
+
+def print_histogram(name, histogram, period_ns, rows=12):
+    """Text histogram on log-spaced bins from the smallest to the largest value seen"""
+    print(f"{name} (us)")
+    used = np.flatnonzero(histogram.counts)
+    if not used.size:
+        return
+    # Bin edges from the first used bin to one past the last, so a single used bin still gets a row
+    edges = np.unique(np.geomspace(used[0] + 1, used[-1] + 2, rows + 1).astype(int)) - 1
+    edges[0], edges[-1] = used[0], used[-1] + 1
+    cumulative = np.concatenate([[0], np.cumsum(histogram.counts)])
+    counts = cumulative[edges[1:]] - cumulative[edges[:-1]]
+    width = 40 / max(counts.max(), 1)
+    for low, high, count in zip(edges[:-1] * histogram.bin_ns, edges[1:] * histogram.bin_ns, counts):
+        marker = ' !' if high > period_ns else ''
+        print(f"  {low / 1e3:8.0f} - {high / 1e3:<8.0f}{count:9d}  {'#' * int(np.ceil(count * width))}{marker}")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Fixed-rate closed-loop PID simulation with timing statistics.')
+    parser.add_argument('--rate', type=float, default=RATE, help='control rate in Hz (default: %(default)s)')
+    parser.add_argument('--duration', type=float, default=DURATION, help='seconds to run (default: %(default)s)')
+    parser.add_argument('--num', type=float, nargs='+', default=[1.0],
+                        help='plant numerator, highest power first (default: 1)')
+    parser.add_argument('--den', type=float, nargs='+', default=[1.0, 3.0, 3.0, 1.0],
+                        help='plant denominator (default: 1 3 3 1, i.e. 1/(s+1)^3)')
+    parser.add_argument('--gains', type=float, nargs=3, default=[2.0, 1.0, 1.0], metavar=('KP', 'KI', 'KD'))
+    parser.add_argument('--filter-time', type=float, default=0.01, help='derivative filter time constant Tf')
+    parser.add_argument('--signal', choices=SIGNALS, default='square', help='reference signal (default: %(default)s)')
+    parser.add_argument('--signal-period', type=float, default=1.0,
+                        help='period of the square and sine references in seconds (default: %(default)s)')
+    parser.add_argument('--load', type=int, default=0, help='busy-looping processes to run alongside (default: 0)')
+    parser.add_argument('--spin-us', type=float, default=SPIN_NS / 1e3,
+                        help='spin instead of sleeping this long before each tick (default: %(default)s)')
+    parser.add_argument('--allowed-misses', type=int, default=0,
+                        help='deadline misses tolerated before exiting with status 1 (default: 0)')
+    parser.add_argument('-o', '--output', help='write the statistics and histograms to this JSON file')
+    args = parser.parse_args(argv)
+    if args.rate <= 0:
+        parser.error('--rate must be positive')
+    # The comparison with the continuous closed loop needs at least two samples
+    if round(args.duration * args.rate) < 2:
+        parser.error(f'--duration must cover at least two ticks ({2 / args.rate:g} s at {args.rate:g} Hz)')
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    dt = 1 / args.rate
+    ticks = int(round(args.duration * args.rate))
+    loop = pid_loop((args.num, args.den), args.gains, dt, args.filter_time)
+    reference = reference_signal(args.signal, ticks, args.rate, period=args.signal_period)
+
+    peak, net = allocation_check(loop, reference[:min(ticks, 1000)])
+    loop.reset()
+    load = start_load(args.load)
+    try:
+        outputs, histograms, misses = run_realtime(loop, reference, args.rate, int(args.spin_us * 1e3))
+    finally:
+        stop_load(load)
+
+    period_ns = round(1e9 / args.rate)
+    print(f"{ticks} ticks at {args.rate:g} Hz (period {period_ns / 1e3:g} us), "
+          f"plant order {loop.plant.order}, controller order {loop.controller.order}, load {args.load}")
+    print(f"Step allocations: peak {peak} B, net {net} B over {min(ticks, 1000)} steps")
+    print(f"{'':<10}" + ''.join(f"{name:>9}" for name in ('mean', *(f'p{q:g}' for q in PERCENTILES), 'max')))
+    for name, histogram in histograms.items():
+        print(f"{name:<10}" + ''.join(f"{value:9.1f}" for value in histogram.summary().values()))
+    latency = histograms['latency']
+    print(f"Jitter (p99 - p50 latency): {(latency.percentile(99) - latency.percentile(50)) / 1e3:.1f} us")
+    print(f"Deadline misses: {misses} of {ticks} ({100 * misses / max(ticks, 1):.2f}%)")
+    # The held input adds up to one period of delay, so this shrinks with the period
+    _, (closed_num, closed_den) = loop_coefficients(np.array([args.gains]), (args.num, args.den), args.filter_time)
+    _, expected = forced_response(closed_num[0], closed_den[0], np.arange(ticks) * dt, reference, hold='zoh')
+    print(f"Max deviation from the continuous closed loop: {np.max(np.abs(outputs - expected)):.3g}")
+    print()
+    for name, histogram in histograms.items():
+        print_histogram(name, histogram, period_ns)
+
+    if args.output:
+        report = {'rate': args.rate, 'ticks': ticks, 'period_us': period_ns / 1e3, 'load': args.load,
+                  'misses': misses, 'allocations': {'peak': peak, 'net': net},
+                  'histograms': {name: histogram.to_dict() for name, histogram in histograms.items()}}
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    return 1 if misses > args.allowed_misses else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
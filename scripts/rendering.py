@@ -0,0 +1,257 @@
+"""Headless rendering helpers for bulk plot generation.
+
+Importing this module selects the non-interactive Agg backend, so the
+example scripts never need a display and never pay for GUI toolkits.
+Templates draw on bare ``Figure`` objects, so pyplot itself is only
+imported by code that asks for it.
+
+``FigureTemplate`` keeps a pre-styled figure alive for the lifetime of the
+process: its axes, labels, legends and static artists are built once and
+each render only pushes new data into the existing artists (``set_data``,
+``set_text``, ...) before saving. Templates are pooled by name with
+``get_template``, so regenerating the same kind of figure in a loop, a
+watch session or a benchmark reuses one figure instead of constructing and
+tearing down a new one each time. ``render_lines`` decimates long series to
+the pixel width of the axes first (see ``decimate``).
+
+Draft mode (``set_draft(True)`` or ``RENDER_DRAFT=1``) caps the output
+resolution at ``DRAFT_DPI`` for quick CI previews. The figure cache keys
+on ``render_settings()``, so draft images never stand in for
+full-resolution ones.
+"""
+import io
+import os
+import sys
+import tempfile
+import threading
+import time
+import weakref
+
+import matplotlib
+matplotlib.use('Agg')
+from matplotlib import rc_context
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from decimate import axes_pixels, decimate
+
+DRAFT_DPI = 72
+
+_draft = os.environ.get('RENDER_DRAFT', '').lower() not in ('', '0', 'off', 'false', 'no')
+_templates = {}
+# mkstemp creates private files; give replacements the mode open() would
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+_FILE_MODE = 0o666 & ~_UMASK
+_timings = {'render': 0.0, 'write': 0.0, 'created': 0, 'saved': 0, 'bytes': 0}
+# Background writer threads add to _timings too
+_timings_lock = threading.Lock()
+# Figures already counted in _timings['created']
+_counted = weakref.WeakSet()
+# ImageWriter that savefig hands PNGs to, see image_writer.background_writes
+_writer = None
+# State that changes as figures are made; figure_cache leaves it out of keys
+_RUNTIME_STATE = frozenset({'_templates', '_timings', '_timings_lock', '_counted', '_writer'})
+
+def set_draft(enabled=True):
+    """Turn the low-resolution draft mode on or off for this process"""
+    global _draft
+    _draft = bool(enabled)
+
+def is_draft():
+    return _draft
+
+def render_settings():
+    """Settings that change the saved images, for cache keys"""
+    return {'backend': matplotlib.get_backend(), 'draft_dpi': DRAFT_DPI if _draft else None}
+
+def write_atomic(path, data):
+    """Write bytes to path so readers see either the old file or the complete new one.
+
+    The data goes to a temporary file in the same directory, which then
+    replaces path in one rename.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temporary = tempfile.mkstemp(prefix='.tmp-', suffix=os.path.splitext(path)[1], dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.chmod(temporary, _FILE_MODE)
+        os.replace(temporary, path)
+    except BaseException:
+        try:
+            os.unlink(temporary)
+        except OSError:
+            pass
+        raise
+
+def close_all():
+    """Close every pyplot figure, without importing pyplot if nothing used it"""
+    pyplot = sys.modules.get('matplotlib.pyplot')
+    if pyplot is not None:
+        pyplot.close('all')
+
+def reset_timings():
+    """Zero the render/write counters accumulated by savefig"""
+    with _timings_lock:
+        _timings.update(render=0.0, write=0.0, created=0, saved=0, bytes=0)
+
+def timings():
+    """Seconds spent rendering and writing, figures created and saved, and bytes written since the last reset.
+
+    A figure counts as created the first time a template builds it, savefig
+    saves it or ``count_open_figures`` finds it open.
+    """
+    with _timings_lock:
+        return dict(_timings)
+
+def add_timings(**values):
+    """Add to the savefig counters (thread-safe)"""
+    with _timings_lock:
+        for key, value in values.items():
+            _timings[key] += value
+
+def _count_figure(fig):
+    with _timings_lock:
+        if fig not in _counted:
+            _counted.add(fig)
+            _timings['created'] += 1
+
+def count_open_figures():
+    """Count the open pyplot figures that timings() has not seen yet.
+
+    Templates count their figure when they build it and savefig counts the
+    figures it saves; this catches pyplot figures left open unsaved.
+    """
+    if 'matplotlib.pyplot' in sys.modules:
+        from matplotlib._pylab_helpers import Gcf
+
+        for manager in Gcf.get_all_fig_managers():
+            _count_figure(manager.canvas.figure)
+
+def set_writer(writer):
+    """Send PNG saves to writer (an ``image_writer.ImageWriter``, or None); returns the previous one"""
+    global _writer
+    previous, _writer = _writer, writer
+    return previous
+
+def when_written(paths, callback):
+    """Call callback() once paths are on disk: now, or after their background writes succeed"""
+    if _writer is None:
+        callback()
+    else:
+        _writer.when_written(paths, callback)
+
+def savefig(path, fig=None, **kwargs):
+    """Save fig (default: the current pyplot figure), honouring draft mode.
+
+    The figure is rendered and encoded into memory first and then written
+    in one go, so the two costs can be timed separately (see ``timings``).
+    The write is atomic: an interrupted run never leaves a truncated PNG.
+    Inside ``image_writer.background_writes`` a PNG is only rasterized here;
+    compression and writing happen on the writer's threads.
+    """
+    if fig is None:
+        import matplotlib.pyplot as plt
+        fig = plt.gcf()
+    _count_figure(fig)
+    if _draft:
+        dpi = kwargs.get('dpi', matplotlib.rcParams['savefig.dpi'])
+        if dpi == 'figure':
+            dpi = fig.dpi
+        kwargs['dpi'] = min(dpi, DRAFT_DPI)
+    kwargs.setdefault('format', os.path.splitext(path)[1][1:] or matplotlib.rcParams['savefig.format'])
+
+    start = time.perf_counter()
+    if _writer is not None and kwargs['format'] == 'png':
+        from image_writer import rasterize
+
+        job = rasterize(fig, **kwargs)
+        rendered = time.perf_counter()
+        _writer.submit(path, job)
+        # write is the time spent waiting for a free slot; the writer adds the bytes
+        add_timings(render=rendered - start, write=time.perf_counter() - rendered, saved=1)
+        return
+    buffer = io.BytesIO()
+    fig.savefig(buffer, **kwargs)
+    data = buffer.getvalue()
+    rendered = time.perf_counter()
+    write_atomic(path, data)
+    add_timings(render=rendered - start, write=time.perf_counter() - rendered, saved=1, bytes=len(data))
+
+class FigureTemplate:
+    """A figure whose artists are built once and then updated in place.
+
+    build(fig) creates the axes and artists on an empty figure and returns
+    whatever handles update needs (typically a dict of artists). It runs
+    lazily on the first render, under whatever rcParams are active then.
+    """
+
+    def __init__(self, build, figsize=None):
+        self.build = build
+        self.figsize = figsize
+        self.figure = None
+        self.artists = None
+
+    def _ensure_built(self):
+        if self.figure is None:
+            # A bare Figure with its own Agg canvas stays out of pyplot's
+            # figure manager, so it is never closed or garbage collected
+            self.figure = Figure(figsize=self.figsize)
+            FigureCanvasAgg(self.figure)
+            _count_figure(self.figure)
+            self.artists = self.build(self.figure)
+
+    def render(self, update, path, **savefig_kwargs):
+        """Apply update(fig, artists) and save the figure to path"""
+        self._ensure_built()
+        update(self.figure, self.artists)
+        savefig(path, fig=self.figure, **savefig_kwargs)
+        return self.figure
+
+def get_template(name, build, figsize=None):
+    """Process-wide pooled template, created on first use"""
+    template = _templates.get(name)
+    if template is None:
+        template = _templates[name] = FigureTemplate(build, figsize)
+    return template
+
+def clear_templates():
+    """Drop every pooled template (e.g. after a style change)"""
+    _templates.clear()
+
+def line_template(name, title, xlabel, ylabel, styles=('-',), labels=None, legend=False,
+                  grid=True, figsize=None):
+    """Pooled template for a single-axes plot with one line per style"""
+    labels = [None] * len(styles) if labels is None else labels
+
+    def build(fig):
+        ax = fig.subplots()
+        lines = [ax.plot([], [], style, label=label)[0] for style, label in zip(styles, labels)]
+        if grid:
+            ax.grid(True)
+        ax.set_title(title)
+        ax.set_xlabel(xlabel)
+        ax.set_ylabel(ylabel)
+        if legend:
+            ax.legend()
+        return {'ax': ax, 'lines': lines}
+    return get_template(name, build, figsize)
+
+def update_lines(fig, artists, data, dpi=None):
+    """Set (x, y) data on the template's lines and rescale the axes.
+
+    Long series are decimated to the pixel width the axes will have at dpi
+    (see ``decimate``), so render time does not grow with the sample count.
+    """
+    pixels = axes_pixels(artists['ax'], dpi)[0]
+    for line, (x, y) in zip(artists['lines'], data):
+        line.set_data(*decimate(x, y, pixels))
+    ax = artists['ax']
+    ax.relim()
+    ax.autoscale_view()
+
+def render_lines(template, data, path, **savefig_kwargs):
+    """Render a line_template with one (x, y) pair per line"""
+    dpi = savefig_kwargs.get('dpi')
+    return template.render(lambda fig, artists: update_lines(fig, artists, data, dpi), path, **savefig_kwargs)
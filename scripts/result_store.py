@@ -0,0 +1,183 @@
+"""On-disk store for simulation results that can be read back memory-mapped.
+
+Each record (one simulation or sweep) is a directory holding one ``.npy``
+file per column, for example the time grid, the outputs and the coefficient
+arrays, plus a ``manifest.json``. The manifest lists the columns with their
+shapes and dtypes, together with free-form metadata such as parameters or
+metrics. ``load`` opens columns with ``mmap_mode='r'``, so slicing one
+system out of a multi-gigabyte sweep only reads the pages it touches.
+
+Records are assembled in a staging directory and renamed into place, the
+same way ``figure_cache`` publishes entries. Readers therefore never see a
+half-written record, and parallel writers of different records do not
+share any file. Sweeps too large for memory can be filled incrementally
+through ``allocate``.
+
+Scripts call ``record_results``, which does nothing unless a store has been
+configured with ``set_default_store`` or the ``RESULT_STORE`` environment
+variable.
+"""
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+MANIFEST = 'manifest.json'
+
+_default_store = None
+
+def _json_default(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, complex):
+        return [value.real, value.imag]
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+class RecordWriter:
+    """Writable memory-mapped columns of a record that is not published yet.
+
+    Fill ``columns[name][...]`` in as many passes as needed, then call
+    ``commit``. Leaving a ``with`` block without an error commits the record.
+    """
+
+    def __init__(self, store, name, staging, columns, metadata):
+        self.store = store
+        self.name = name
+        self.staging = staging
+        self.columns = columns
+        self.metadata = metadata
+
+    def commit(self):
+        for column in self.columns.values():
+            column.flush()
+        manifest = {
+            'name': self.name,
+            'columns': {key: {'file': f'{key}.npy', 'shape': list(column.shape), 'dtype': column.dtype.str}
+                        for key, column in self.columns.items()},
+            'metadata': self.metadata,
+            'created': time.time(),
+        }
+        # Drop the write mappings before the directory moves
+        self.columns = {}
+        with open(os.path.join(self.staging, MANIFEST), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2, default=_json_default)
+        self.store._publish(self.name, self.staging)
+
+    def abort(self):
+        self.columns = {}
+        shutil.rmtree(self.staging, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+
+class ResultStore:
+    """Directory of named records with memory-mappable columns"""
+
+    def __init__(self, root):
+        self.root = root
+
+    def _record_dir(self, name):
+        if not name or name.startswith('.') or os.sep in name or (os.altsep and os.altsep in name):
+            raise ValueError(f"invalid record name {name!r}")
+        return os.path.join(self.root, name)
+
+    def _staging(self):
+        os.makedirs(self.root, exist_ok=True)
+        return tempfile.mkdtemp(prefix='.tmp-', dir=self.root)
+
+    def _publish(self, name, staging):
+        target = self._record_dir(name)
+        retired = None
+        if os.path.exists(target):
+            # A directory cannot be renamed over a non-empty one; move the
+            # old record aside first and delete it once the new one is in place
+            retired = tempfile.mkdtemp(prefix='.old-', dir=self.root)
+            os.rename(target, os.path.join(retired, name))
+        try:
+            os.rename(staging, target)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+            if retired is not None:
+                shutil.rmtree(retired, ignore_errors=True)
+
+    def allocate(self, name, columns, metadata=None):
+        """RecordWriter with zero-filled columns given as {column: (shape, dtype)}"""
+        self._record_dir(name)
+        staging = self._staging()
+        arrays = {}
+        for key, (shape, dtype) in columns.items():
+            # Plain ints: numpy integers would end up in the .npy header
+            shape = (int(shape),) if np.ndim(shape) == 0 else tuple(int(size) for size in shape)
+            arrays[key] = np.lib.format.open_memmap(os.path.join(staging, f'{key}.npy'), mode='w+',
+                                                    dtype=dtype, shape=shape)
+        return RecordWriter(self, name, staging, arrays, dict(metadata or {}))
+
+    def save(self, name, arrays, metadata=None):
+        """Store arrays ({column: array}) under name, replacing any earlier record"""
+        arrays = {key: np.asarray(value) for key, value in arrays.items()}
+        with self.allocate(name, {key: (value.shape, value.dtype) for key, value in arrays.items()},
+                           metadata) as writer:
+            for key, value in arrays.items():
+                writer.columns[key][...] = value
+
+    def manifest(self, name):
+        with open(os.path.join(self._record_dir(name), MANIFEST), encoding='utf-8') as f:
+            return json.load(f)
+
+    def metadata(self, name):
+        return self.manifest(name)['metadata']
+
+    def load(self, name, column=None, mmap=True):
+        """One column, or a dict of all columns, of a record (read-only memory maps by default)"""
+        manifest = self.manifest(name)
+        directory = self._record_dir(name)
+        mode = 'r' if mmap else None
+        if column is not None:
+            return np.load(os.path.join(directory, manifest['columns'][column]['file']), mmap_mode=mode)
+        return {key: np.load(os.path.join(directory, entry['file']), mmap_mode=mode)
+                for key, entry in manifest['columns'].items()}
+
+    def names(self):
+        """Names of all published records, sorted"""
+        try:
+            entries = os.listdir(self.root)
+        except FileNotFoundError:
+            return []
+        return sorted(name for name in entries
+                      if not name.startswith('.') and os.path.exists(os.path.join(self.root, name, MANIFEST)))
+
+    def index(self):
+        """{name: manifest} for every record, the JSON index of the store"""
+        return {name: self.manifest(name) for name in self.names()}
+
+    def delete(self, name):
+        shutil.rmtree(self._record_dir(name), ignore_errors=True)
+
+def set_default_store(root):
+    """Direct record_results to a store at root (None turns recording off)"""
+    global _default_store
+    _default_store = ResultStore(root) if root else None
+
+def default_store():
+    """The configured store, initialised from RESULT_STORE on first use"""
+    global _default_store
+    if _default_store is None and os.environ.get('RESULT_STORE'):
+        _default_store = ResultStore(os.environ['RESULT_STORE'])
+    return _default_store
+
+def record_results(name, metadata=None, **arrays):
+    """Save arrays under name in the default store, if one is configured"""
+    store = default_store()
+    if store is not None:
+        store.save(name, arrays, metadata)
@@ -0,0 +1,248 @@
+"""Root locus by continuation instead of re-solving on a fixed gain grid.
+
+The closed-loop poles of 1 + K N(s)/D(s) are the roots of
+p(s, K) = D(s) + K N(s). Starting from the open-loop poles at K = 0, each
+gain step predicts the new roots from ds/dK = -N(s) / p'(s) and corrects
+them with a few simultaneous (Aberth-Ehrlich) iterations warm-started from
+the prediction. The step grows while the roots move little and shrinks
+near breakaway points, where they move fast, so the branches stay
+continuous and ``np.roots`` is only needed as a rare fallback.
+
+Imaginary-axis crossings and breakaway points are not read off the
+sampled locus; they are solved for directly:
+
+* s = j*w is on the locus when D(jw) conj(N(jw)) is real, a polynomial
+  equation in w, and then K = -D(jw)/N(jw);
+* breakaway/break-in points are the roots of N D' - D N' for which
+  K = -D/N is real and positive.
+"""
+import numpy as np
+from numpy.polynomial import polynomial as P
+
+class RootLocus:
+    """Tracked root-locus branches plus the exactly computed special points.
+
+    gains has shape (m,) and roots shape (m, n): column i is one branch.
+    crossings holds (K, w) for every imaginary-axis crossing with K > 0,
+    breakaways holds (K, s) for every breakaway/break-in point and
+    roots_calls counts the ``np.roots`` calls made while tracking (open-loop
+    poles and zeros plus any fallbacks).
+    """
+
+    def __init__(self, num, den, gains, roots, crossings, breakaways, roots_calls):
+        self.num = num
+        self.den = den
+        self.gains = gains
+        self.roots = roots
+        self.crossings = crossings
+        self.breakaways = breakaways
+        self.roots_calls = roots_calls
+
+    @property
+    def critical_gain(self):
+        """Smallest positive gain at which a branch reaches the imaginary axis, or None"""
+        return min((k for k, _ in self.crossings), default=None)
+
+def _trim(coefficients):
+    coefficients = np.trim_zeros(np.asarray(coefficients, dtype=float), 'f')
+    if not coefficients.size:
+        raise ValueError("polynomial must have a non-zero coefficient")
+    return coefficients
+
+def _characteristic(num, den, k):
+    """Coefficients of D(s) + K N(s), highest power first"""
+    padded = np.zeros_like(den)
+    padded[len(den) - len(num):] = num
+    return den + k * padded
+
+def imaginary_axis_crossings(num, den, tolerance=1e-9):
+    """(K, w) pairs with K > 0 where the locus crosses the imaginary axis.
+
+    Solves Im(D(jw) conj(N(jw))) = 0 for real w >= 0, then K = -D(jw)/N(jw).
+    """
+    num, den = _trim(num), _trim(den)
+    # Coefficients in ascending powers of w of D(jw) and N(jw)
+    def on_axis(coefficients):
+        ascending = coefficients[::-1].astype(complex)
+        return ascending * (1j ** np.arange(len(ascending)))
+    d, n = on_axis(den), on_axis(num)
+    # For real w, conj(N(jw)) is the polynomial with conjugated coefficients
+    imag = np.imag(P.polymul(d, np.conj(n)))
+    imag = np.trim_zeros(imag, 'b')
+    candidates = [0.0] if not imag.size or abs(imag[0]) <= tolerance else []
+    if imag.size > 1:
+        roots = P.polyroots(imag)
+        candidates += [r.real for r in roots if abs(r.imag) <= tolerance * max(1.0, abs(r)) and r.real >= 0]
+
+    crossings = []
+    for w in sorted(set(np.round(candidates, 12))):
+        s = 1j * w
+        n_value = np.polyval(num, s)
+        if abs(n_value) <= tolerance:
+            continue
+        k = -np.polyval(den, s) / n_value
+        if abs(k.imag) <= 1e-6 * max(1.0, abs(k)) and k.real > tolerance:
+            crossings.append((float(k.real), float(w)))
+    return crossings
+
+def breakaway_points(num, den, tolerance=1e-6):
+    """(K, s) pairs with K > 0 where branches meet: roots of N D' - D N'"""
+    num, den = _trim(num), _trim(den)
+    condition = np.polysub(np.polymul(num, np.polyder(den)), np.polymul(den, np.polyder(num)))
+    condition = np.trim_zeros(condition, 'f')
+    points = []
+    if len(condition) < 2:
+        return points
+    for s in np.roots(condition):
+        n_value = np.polyval(num, s)
+        if abs(n_value) <= tolerance:
+            continue
+        k = -np.polyval(den, s) / n_value
+        if abs(k.imag) <= tolerance * max(1.0, abs(k)) and k.real > 0:
+            points.append((float(k.real), complex(s)))
+    return sorted(points, key=lambda point: point[0])
+
+def _aberth(coefficients, roots, iterations=16, tolerance=1e-12, residual_tolerance=1e-13):
+    """Refine all roots simultaneously; returns (roots, converged).
+
+    Converged means every correction fell below tolerance (relative to the
+    root magnitudes) or every residual is within residual_tolerance of the
+    polynomial's magnitude at that root. The residual test is what stops the
+    iteration inside clusters of nearly repeated roots, whose positions are
+    only determined to about residual_tolerance ** (1 / multiplicity) and
+    whose corrections never get small.
+    """
+    derivative = np.polyder(coefficients)
+    magnitude = np.abs(coefficients)
+    scale = max(1.0, np.max(np.abs(roots)))
+    for _ in range(iterations):
+        value = np.polyval(coefficients, roots)
+        if np.all(np.abs(value) <= residual_tolerance * np.polyval(magnitude, np.abs(roots))):
+            return roots, True
+        slope = np.polyval(derivative, roots)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = value / slope
+            difference = roots[:, None] - roots[None, :]
+            np.fill_diagonal(difference, np.inf)
+            repulsion = np.sum(1 / difference, axis=1)
+            correction = ratio / (1 - ratio * repulsion)
+        correction = np.where(np.isfinite(correction), correction, 0.0)
+        roots = roots - correction
+        if np.max(np.abs(correction)) <= tolerance * scale:
+            return roots, True
+    return roots, False
+
+def _match(previous, current):
+    """Reorder current so each root continues the nearest previous branch"""
+    order = np.empty(len(previous), dtype=int)
+    available = list(range(len(current)))
+    for i in np.argsort(-np.abs(previous)):
+        j = min(available, key=lambda index: abs(current[index] - previous[i]))
+        order[i] = j
+        available.remove(j)
+    return current[order]
+
+def track_root_locus(num, den, k_max=None, max_move=0.02, max_steps=5000):
+    """Trace the root locus of num/den for 0 <= K <= k_max by continuation.
+
+    max_move bounds the predicted displacement of any root per step as a
+    fraction of the plot radius (the largest pole, zero, crossing or
+    breakaway magnitude, with margin). Without k_max, tracking stops once
+    the branches heading to infinity have left that radius, or the others
+    have settled on their zeros. Returns a RootLocus; raises RuntimeError if
+    that takes more than max_steps steps.
+    """
+    num, den = _trim(num), _trim(den)
+    num, den = num / den[0], den / den[0]
+    order, excess = len(den) - 1, len(den) - len(num)
+    if excess < 0:
+        raise ValueError("root locus needs a proper open-loop transfer function")
+
+    crossings = imaginary_axis_crossings(num, den)
+    breakaways = breakaway_points(num, den)
+    poles, zeros = np.roots(den), np.roots(num)
+    roots_calls = 2
+    features = [1.0, *np.abs(poles), *np.abs(zeros), *(w for _, w in crossings),
+                *(abs(s) for _, s in breakaways)]
+    radius = 1.5 * max(features)
+    step_limit = max_move * radius
+
+    k = 0.0
+    roots = poles.astype(complex)
+    gains, history = [k], [roots]
+    dk = None
+    for _ in range(max_steps + 1):
+        if k_max is not None and k >= k_max:
+            break
+        if k_max is None:
+            outside = np.sum(np.abs(roots) > radius)
+            if excess and outside >= excess:
+                break
+            if not excess and zeros.size and k > 0 and np.all(
+                    np.min(np.abs(roots[:, None] - zeros[None, :]), axis=1) < 0.01 * radius):
+                break
+        if len(gains) > max_steps:
+            raise RuntimeError(f"root locus not finished after {max_steps} steps (K = {k:.6g})")
+
+        # Predictor: ds/dK = -N(s) / p'(s) at the current gain
+        coefficients = _characteristic(num, den, k)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            speed = np.abs(np.polyval(num, roots) / np.polyval(np.polyder(coefficients), roots))
+        fastest = np.max(np.where(np.isfinite(speed), speed, 0.0))
+        minimum = 1e-10 * max(1.0, k)
+        proposal = step_limit / fastest if fastest > 0 else max(1.0, k)
+        if not np.all(np.isfinite(speed)):
+            proposal = minimum
+        dk = proposal if dk is None else min(proposal, 2 * dk)
+        dk = max(dk, minimum)
+        if k_max is not None:
+            dk = min(dk, k_max - k)
+
+        while True:
+            next_k = k + dk
+            with np.errstate(divide='ignore', invalid='ignore'):
+                slope = -np.polyval(num, roots) / np.polyval(np.polyder(coefficients), roots)
+            predicted = roots + np.where(np.isfinite(slope), slope, 0.0) * dk
+            corrected, converged = _aberth(_characteristic(num, den, next_k), predicted)
+            moved = np.max(np.abs(corrected - roots))
+            if converged and moved <= 3 * step_limit:
+                break
+            if dk <= minimum:
+                # Corrector could not follow: solve directly and re-match the
+                # branches, then let the next step size start afresh from the
+                # predictor instead of growing back from the minimum
+                corrected = _match(roots, np.roots(_characteristic(num, den, next_k)))
+                roots_calls += 1
+                dk = None
+                break
+            dk = max(dk / 2, minimum)
+
+        k, roots = next_k, corrected
+        gains.append(k)
+        history.append(roots)
+
+    return RootLocus(num, den, np.array(gains), np.array(history), crossings, breakaways, roots_calls)
+
+def plot_root_locus(locus, ax=None, **kwargs):
+    """Plot tracked branches with open-loop poles (x) and zeros (o)"""
+    import matplotlib.pyplot as plt
+
+    ax = plt.gca() if ax is None else ax
+    kwargs.setdefault('color', 'C0')
+    for branch in locus.roots.T:
+        # Complex branches come in conjugate pairs; draw the mirror as well
+        ax.plot(branch.real, branch.imag, **kwargs)
+        ax.plot(branch.real, -branch.imag, **kwargs)
+    # Explicit edge widths keep the markers visible under styles that zero them
+    poles, zeros = np.roots(locus.den), np.roots(locus.num)
+    ax.plot(poles.real, poles.imag, 'x', color='k', markersize=9, markeredgewidth=2)
+    if zeros.size:
+        ax.plot(zeros.real, zeros.imag, 'o', color='k', markerfacecolor='none',
+                markersize=9, markeredgewidth=2)
+    for k, w in locus.crossings:
+        ax.plot([0, 0], [w, -w], 's', color='k', markersize=5)
+    ax.axhline(0, color='gray', linewidth=0.8)
+    ax.axvline(0, color='gray', linewidth=0.8)
+    ax.set_xlabel('Real')
+    ax.set_ylabel('Imaginary')
+    return ax
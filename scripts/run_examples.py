@@ -1,121 +1,123 @@
-import control
-import numpy as np
-import matplotlib.pyplot as plt
+import argparse
+import contextlib
+import io
 import os
-import seaborn as sns
+import sys
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 
-# Create output directory if it doesn't exist
-os.makedirs('docs/images/examples', exist_ok=True)
+# control, seaborn, pyplot and scipy are imported by the sections that use
+# them, so a run only pays for the heavy modules its sections need. Repo
+# modules imported inside a section (step_metrics, discrete_sim, ...) are
+# still part of its figure-cache key: source_fingerprint follows
+# function-local imports.
+from decimate import axes_pixels, band_crossings, decimate
+from result_store import record_results, set_default_store
+from rendering import close_all, get_template, line_template, is_draft, render_lines, rc_context, savefig, set_draft
+from figure_cache import DEFAULT_CACHE_DIR, FigureCache, run_cached
+from freq_response import adaptive_bode, bode_batch, margins_batch, plot_bode, refine_peak
+from image_writer import background_writes
+from import_profile import profile_script
+from instrumentation import measure, phase, print_report, write_report
+from root_locus_tracking import plot_root_locus, track_root_locus
+
+OUTPUT_DIR = 'docs/images/examples'
 
 def print_separator():
     print("\n" + "="*50 + "\n")
 
-# System Responses Examples
-print_separator()
-print("SYSTEM RESPONSES EXAMPLES")
-print_separator()
-
-# Step Response Example
-print("1. Step Response Example")
-G = control.TransferFunction([1], [1, 1])
-t, y = control.step_response(G)
-
-plt.figure()
-plt.plot(t, y)
-plt.grid(True)
-plt.title('Step Response')
-plt.xlabel('Time (s)')
-plt.ylabel('Amplitude')
-plt.savefig('docs/images/examples/step_response.png')
-plt.close()
-
-print("Transfer Function G(s) = 1/(s + 1)")
-print(f"Final Value: {y[-1]:.2f}")
-print(f"Rise Time: {t[np.where(y >= 0.9)[0][0]]:.2f} seconds")
-print(f"Settling Time: {t[np.where(np.abs(y - y[-1]) <= 0.02*y[-1])[0][0]]:.2f} seconds")
-
-# Impulse Response Example
-print_separator()
-print("2. Impulse Response Example")
-t, y = control.impulse_response(G)
-
-plt.figure()
-plt.plot(t, y)
-plt.grid(True)
-plt.title('Impulse Response')
-plt.xlabel('Time (s)')
-plt.ylabel('Amplitude')
-plt.savefig('docs/images/examples/impulse_response.png')
-plt.close()
-
-print("Transfer Function G(s) = 1/(s + 1)")
-print(f"Peak Value: {max(abs(y)):.2f}")
-print(f"Peak Time: {t[np.argmax(abs(y))]:.2f} seconds")
-print(f"Settling Time: {t[np.where(np.abs(y) <= 0.02*max(abs(y)))[0][0]]:.2f} seconds")
-
-# Ramp Response Example
-print_separator()
-print("3. Ramp Response Example")
-t = np.linspace(0, 10, 1000)
-u = t
-t_out, y = control.forced_response(G, T=t, U=u)
-
-plt.figure()
-plt.plot(t_out, u, '--', label='Input')
-plt.plot(t_out, y, label='Output')
-plt.grid(True)
-plt.title('Ramp Response')
-plt.xlabel('Time (s)')
-plt.ylabel('Amplitude')
-plt.legend()
-plt.savefig('docs/images/examples/ramp_response.png')
-plt.close()
-
-print("Transfer Function G(s) = 1/(s + 1)")
-print(f"Steady-State Error Rate: {abs(u[-1] - y[-1]):.2f}")
-
-# Second-Order System Example
-print_separator()
-print("4. Second-Order System Example")
-
-# Set the style to a modern, clean theme
-plt.style.use('seaborn-v0_8')
-sns.set_style("whitegrid", {'grid.linestyle': ':'})
-plt.rcParams['font.family'] = 'sans-serif'
-plt.rcParams['font.sans-serif'] = ['Arial']
-
-# Define system parameters
-NATURAL_FREQUENCY = 1.0  # Natural frequency (wn)
-DAMPING_RATIO = 0.5      # Damping ratio (zeta)
-
-# Create a second-order transfer function
-numerator = [NATURAL_FREQUENCY**2]
-denominator = [1, 2 * DAMPING_RATIO * NATURAL_FREQUENCY, NATURAL_FREQUENCY**2]
-G2 = control.TransferFunction(numerator, denominator)
+def use_modern_style():
+    """Apply the seaborn-based style used from the second-order example onwards"""
+    import matplotlib.pyplot as plt
+    import seaborn as sns
 
-# Get step response
-t, y = control.step_response(G2)
+    plt.style.use('seaborn-v0_8')
+    sns.set_style("whitegrid", {'grid.linestyle': ':'})
+    plt.rcParams['font.family'] = 'sans-serif'
+    plt.rcParams['font.sans-serif'] = ['Arial']
 
-# Get step response characteristics
-info = control.step_info(G2)
+# System Responses Examples
 
-# Extract key values
-rise_time = info['RiseTime']
-peak_time = info['PeakTime']
-peak_value = info['Peak']
-settling_time = info['SettlingTime']
-overshoot = info['Overshoot']
+# control's default grid for a pole at -1: decay to 0.1 % in 100 points
+FIRST_ORDER_TIME = np.linspace(0, np.log(1000), 100)
+
+def step_response_example():
+    from discrete_sim import step_response
+
+    print("1. Step Response Example")
+    with phase('simulate'):
+        # Shares its cached discretization with the impulse example
+        t, y = step_response([1], [1, 1], FIRST_ORDER_TIME)
+
+    template = line_template('step_response', 'Step Response', 'Time (s)', 'Amplitude')
+    render_lines(template, [(t, y)], f'{OUTPUT_DIR}/step_response.png')
+    record_results('step_response', {'num': [1], 'den': [1, 1]}, t=t, y=y)
+
+    with phase('analyze'):
+        rise_time = t[np.where(y >= 0.9)[0][0]]
+        settling_time = t[np.where(np.abs(y - y[-1]) <= 0.02*y[-1])[0][0]]
+    print("Transfer Function G(s) = 1/(s + 1)")
+    print(f"Final Value: {y[-1]:.2f}")
+    print(f"Rise Time: {rise_time:.2f} seconds")
+    print(f"Settling Time: {settling_time:.2f} seconds")
+
+def impulse_response_example():
+    from discrete_sim import impulse_response
+
+    print("2. Impulse Response Example")
+    with phase('simulate'):
+        t, y = impulse_response([1], [1, 1], FIRST_ORDER_TIME)
+
+    template = line_template('impulse_response', 'Impulse Response', 'Time (s)', 'Amplitude')
+    render_lines(template, [(t, y)], f'{OUTPUT_DIR}/impulse_response.png')
+    record_results('impulse_response', {'num': [1], 'den': [1, 1]}, t=t, y=y)
+
+    with phase('analyze'):
+        peak_value = max(abs(y))
+        peak_time = t[np.argmax(abs(y))]
+        settling_time = t[np.where(np.abs(y) <= 0.02*peak_value)[0][0]]
+    print("Transfer Function G(s) = 1/(s + 1)")
+    print(f"Peak Value: {peak_value:.2f}")
+    print(f"Peak Time: {peak_time:.2f} seconds")
+    print(f"Settling Time: {settling_time:.2f} seconds")
+
+def ramp_response_example():
+    from streaming import stream_response
+
+    print("3. Ramp Response Example")
+    num, den = [1], [1, 1]
+    t = np.linspace(0, 10, 1000)
+    u = t
+    with phase('simulate'):
+        # Feed the input through in blocks, the way a long logged signal would
+        # arrive; the simulator carries its state from one block to the next
+        blocks = (u[start:start + 100] for start in range(0, len(u), 100))
+        y = np.concatenate(list(stream_response(num, den, t[1] - t[0], blocks)))
+    t_out = t
+
+    template = line_template('ramp_response', 'Ramp Response', 'Time (s)', 'Amplitude',
+                             styles=('--', '-'), labels=('Input', 'Output'), legend=True)
+    render_lines(template, [(t_out, u), (t_out, y)], f'{OUTPUT_DIR}/ramp_response.png')
+    record_results('ramp_response', {'num': num, 'den': den}, t=t_out, u=u, y=y)
+
+    print("Transfer Function G(s) = 1/(s + 1)")
+    print(f"Steady-State Error Rate: {abs(u[-1] - y[-1]):.2f}")
 
 # Function to find the nearest index in the time array
 def find_nearest(array, value):
     idx = (np.abs(array - value)).argmin()
     return idx
 
-# Create figure with a specific background color
-plt.figure(figsize=(14, 8))
-ax = plt.gca()
-ax.set_facecolor('#ffffff')
-plt.gcf().set_facecolor('#ffffff')
+# Create fancy boxes for annotations with improved styling
+def create_annotation_box(text):
+    return dict(boxstyle='round,pad=0.5', facecolor='white', alpha=0.95,
+               edgecolor=annotation_color, linewidth=1)
+
+# Define system parameters
+NATURAL_FREQUENCY = 1.0  # Natural frequency (wn)
+DAMPING_RATIO = 0.5      # Damping ratio (zeta)
 
 # Custom color palette
 main_color = '#2E86AB'  # Blue
@@ -125,225 +127,465 @@ grid_color = '#E5E5E5'  # Light gray
 overshoot_color = '#FF6B6B'  # Coral for overshoot arrow
 settling_color = '#6C757D'  # Gray for settling bounds
 
-# Plot step response curve with gradient
-line, = plt.plot(t, y, label='Step Response', linewidth=3, color=main_color)
-
-# Plot steady-state line
-plt.axhline(y=1, color=steady_state_color, linestyle='--', label='Steady-State Value', linewidth=2, alpha=0.8)
-
-# Add ±2% settling time bounds
-plt.axhline(y=1.02, color=settling_color, linestyle=':', label='±2% Bounds', linewidth=1.5, alpha=0.6)
-plt.axhline(y=0.98, color=settling_color, linestyle=':', linewidth=1.5, alpha=0.6)
-
-# Create shaded regions for better visualization
-plt.fill_between(t, y, 1, where=(y > 1), color=main_color, alpha=0.15, interpolate=True, label='Error')
-plt.fill_between(t, y, 1, where=(y < 1), color=main_color, alpha=0.1, interpolate=True)
-
-# Plot vertical lines with gradient alpha
-for time, label in [(rise_time, 'Rise Time'), (peak_time, 'Peak Time'), (settling_time, 'Settling Time')]:
-    plt.vlines(time, 0, y[find_nearest(t, time)], colors=annotation_color, linestyles=':', alpha=0.3)
-
-# Create fancy boxes for annotations with improved styling
-def create_annotation_box(text):
-    return dict(boxstyle='round,pad=0.5', facecolor='white', alpha=0.95, 
-               edgecolor=annotation_color, linewidth=1)
-
-# Add overshoot double-headed arrow
-plt.annotate('', xy=(peak_time, peak_value), 
-            xytext=(peak_time, 1),
-            arrowprops=dict(arrowstyle='<->', color=overshoot_color, 
-                          linewidth=2, shrinkA=0, shrinkB=0))
-
-# Add overshoot label centered on the double-headed arrow
-plt.annotate(f'Overshoot\n{overshoot:.1f}%', 
-            xy=(peak_time, (peak_value + 1)/2),  # Middle point of the arrow
-            xytext=(peak_time, (peak_value + 1)/2),  # Exactly on the arrow
-            fontsize=9,
-            color=annotation_color,
-            bbox=create_annotation_box(''),
-            ha='center',  # Center horizontally
-            va='center')  # Center vertically
-
-plt.annotate(f'Rise Time\n{rise_time:.2f} s', 
-             xy=(rise_time, y[find_nearest(t, rise_time)]),
-             xytext=(rise_time + 1, y[find_nearest(t, rise_time)] - 0.2),
-             fontsize=11,
-             color=annotation_color,
-             bbox=create_annotation_box(''),
-             arrowprops=dict(arrowstyle='fancy', color=annotation_color, alpha=0.6),
-             ha='center')
-
-plt.annotate(f'Peak Time\n{peak_time:.2f} s', 
-             xy=(peak_time, peak_value),
-             xytext=(peak_time + 0.5, peak_value + 0.1),
-             fontsize=11,
-             color=annotation_color,
-             bbox=create_annotation_box(''),
-             arrowprops=dict(arrowstyle='fancy', color=annotation_color, alpha=0.6),
-             ha='center')
-
-# Add settling time annotation with bounds info
-plt.annotate(f'Settling Time\n{settling_time:.2f} s\n±2% Bounds', 
-             xy=(settling_time, 1),
-             xytext=(settling_time + 1.5, 1.1),  # Changed y position from 0.7 to 0.8
-             fontsize=11,
-             color=annotation_color,
-             bbox=create_annotation_box(''),
-             arrowprops=dict(arrowstyle='fancy', color=annotation_color, alpha=0.6),
-             ha='center')
-
-# Add system parameters annotation
-plt.text(0.02, 0.98, f'System Parameters:\nωn = {NATURAL_FREQUENCY} rad/s\nζ = {DAMPING_RATIO}',
-         transform=ax.transAxes,
-         bbox=dict(facecolor='white', alpha=0.95, edgecolor=annotation_color, 
-                  boxstyle='round,pad=0.5', linewidth=1),
-         fontsize=11,
-         color=annotation_color,
-         verticalalignment='top')
-
-# Enhance grid with custom styling
-ax.grid(True, which='major', color=grid_color, linewidth=1.2, alpha=0.8)
-ax.grid(True, which='minor', color=grid_color, linewidth=0.8, alpha=0.5)
-
-# Set axis limits with padding to ensure annotations are visible
-plt.xlim(-0.2, max(t) + 0.5)
-plt.ylim(-0.1, max(y) + 0.3)
-
-# Title and labels with enhanced styling
-plt.title('Second-Order System Step Response', fontsize=16, pad=20, 
-          color=annotation_color, fontweight='bold')
-plt.xlabel('Time (s)', fontsize=12, labelpad=10, color=annotation_color)
-plt.ylabel('Amplitude', fontsize=12, labelpad=10, color=annotation_color)
-
-# Customize ticks
-plt.xticks(fontsize=10, color=annotation_color)
-plt.yticks(fontsize=10, color=annotation_color)
-
-# Enhanced legend with new styling
-plt.legend(loc='upper right', fontsize=11, fancybox=True, 
-          framealpha=0.95, edgecolor=annotation_color)
-
-# Adjust layout and save with high DPI
-plt.tight_layout()
-plt.savefig('docs/images/examples/second_order_response.png', dpi=300, bbox_inches='tight', 
-            facecolor='white', edgecolor='none')
-plt.close()
-
-print("Transfer Function G(s) = ωn²/(s² + 2ζωn·s + ωn²)")
-print(f"Natural Frequency (ωn): {NATURAL_FREQUENCY:.2f} rad/s")
-print(f"Damping Ratio (ζ): {DAMPING_RATIO:.2f}")
-print(f"Rise Time: {info['RiseTime']:.2f} seconds")
-print(f"Peak Time: {info['PeakTime']:.2f} seconds")
-print(f"Overshoot: {info['Overshoot']:.1f}%")
-print(f"Settling Time: {info['SettlingTime']:.2f} seconds")
+def build_second_order_figure(fig):
+    """Static parts of the second-order figure; the data-dependent artists are filled in later"""
+    ax = fig.subplots()
+    ax.set_facecolor('#ffffff')
+    fig.set_facecolor('#ffffff')
+
+    # Plot step response curve with gradient
+    line, = ax.plot([], [], label='Step Response', linewidth=3, color=main_color)
+
+    # Plot steady-state line
+    ax.axhline(y=1, color=steady_state_color, linestyle='--', label='Steady-State Value', linewidth=2, alpha=0.8)
+
+    # Add ±2% settling time bounds
+    ax.axhline(y=1.02, color=settling_color, linestyle=':', label='±2% Bounds', linewidth=1.5, alpha=0.6)
+    ax.axhline(y=0.98, color=settling_color, linestyle=':', linewidth=1.5, alpha=0.6)
+
+    # Shaded error regions are rebuilt on every render; this empty one only
+    # provides the legend entry
+    legend_fill = ax.fill_between([], [], 1, color=main_color, alpha=0.15, label='Error')
+
+    # Add overshoot double-headed arrow
+    overshoot_arrow = ax.annotate('', xy=(0, 0), xytext=(0, 0),
+                                  arrowprops=dict(arrowstyle='<->', color=overshoot_color,
+                                                  linewidth=2, shrinkA=0, shrinkB=0))
+
+    # Add overshoot label centered on the double-headed arrow
+    overshoot_label = ax.annotate('', xy=(0, 0), xytext=(0, 0),
+                                  fontsize=9,
+                                  color=annotation_color,
+                                  bbox=create_annotation_box(''),
+                                  ha='center',  # Center horizontally
+                                  va='center')  # Center vertically
+
+    labels = {}
+    for name in ('rise', 'peak', 'settling'):
+        labels[name] = ax.annotate('', xy=(0, 0), xytext=(0, 0),
+                                   fontsize=11,
+                                   color=annotation_color,
+                                   bbox=create_annotation_box(''),
+                                   arrowprops=dict(arrowstyle='fancy', color=annotation_color, alpha=0.6),
+                                   ha='center')
+
+    # Add system parameters annotation
+    parameters = ax.text(0.02, 0.98, '',
+                         transform=ax.transAxes,
+                         bbox=dict(facecolor='white', alpha=0.95, edgecolor=annotation_color,
+                                   boxstyle='round,pad=0.5', linewidth=1),
+                         fontsize=11,
+                         color=annotation_color,
+                         verticalalignment='top')
+
+    # Enhance grid with custom styling
+    ax.grid(True, which='major', color=grid_color, linewidth=1.2, alpha=0.8)
+    ax.grid(True, which='minor', color=grid_color, linewidth=0.8, alpha=0.5)
+
+    # Title and labels with enhanced styling
+    ax.set_title('Second-Order System Step Response', fontsize=16, pad=20,
+                 color=annotation_color, fontweight='bold')
+    ax.set_xlabel('Time (s)', fontsize=12, labelpad=10, color=annotation_color)
+    ax.set_ylabel('Amplitude', fontsize=12, labelpad=10, color=annotation_color)
+
+    # Customize ticks
+    ax.tick_params(labelsize=10, labelcolor=annotation_color)
+
+    # Enhanced legend with new styling
+    ax.legend(loc='upper right', fontsize=11, fancybox=True,
+              framealpha=0.95, edgecolor=annotation_color)
+    legend_fill.remove()
+
+    return {'ax': ax, 'line': line, 'overshoot_arrow': overshoot_arrow,
+            'overshoot_label': overshoot_label, 'labels': labels,
+            'parameters': parameters, 'dynamic': []}
+
+def update_second_order_figure(fig, artists, t, y, info, dpi=None):
+    """Push one step response and its metrics into the second-order figure.
+
+    Long responses are decimated to the pixel width at dpi, keeping the
+    overshoot peak and the samples around every crossing of the ±2% band.
+    """
+    ax = artists['ax']
+    rise_time = info['RiseTime']
+    peak_time = info['PeakTime']
+    peak_value = info['Peak']
+    settling_time = info['SettlingTime']
+    overshoot = info['Overshoot']
+
+    keep = np.union1d(band_crossings(y, 1, 0.02), [np.argmax(y)])
+    t_plot, y_plot = decimate(t, y, axes_pixels(ax, dpi)[0], keep=keep)
+    artists['line'].set_data(t_plot, y_plot)
+
+    # Fills and vertical markers depend on the data shape, so only they are recreated
+    for artist in artists['dynamic']:
+        artist.remove()
+    artists['dynamic'] = [
+        ax.fill_between(t_plot, y_plot, 1, where=(y_plot > 1), color=main_color, alpha=0.15, interpolate=True),
+        ax.fill_between(t_plot, y_plot, 1, where=(y_plot < 1), color=main_color, alpha=0.1, interpolate=True),
+    ]
+    # Plot vertical lines with gradient alpha
+    for time in (rise_time, peak_time, settling_time):
+        artists['dynamic'].append(
+            ax.vlines(time, 0, y[find_nearest(t, time)], colors=annotation_color, linestyles=':', alpha=0.3))
+
+    artists['overshoot_arrow'].xy = (peak_time, peak_value)
+    artists['overshoot_arrow'].set_position((peak_time, 1))
+    # Middle point of the arrow, exactly on the arrow
+    overshoot_label = artists['overshoot_label']
+    overshoot_label.set_text(f'Overshoot\n{overshoot:.1f}%')
+    overshoot_label.xy = (peak_time, (peak_value + 1)/2)
+    overshoot_label.set_position((peak_time, (peak_value + 1)/2))
+
+    rise_value = y[find_nearest(t, rise_time)]
+    placements = {
+        'rise': (f'Rise Time\n{rise_time:.2f} s', (rise_time, rise_value), (rise_time + 1, rise_value - 0.2)),
+        'peak': (f'Peak Time\n{peak_time:.2f} s', (peak_time, peak_value), (peak_time + 0.5, peak_value + 0.1)),
+        # Settling time annotation with bounds info
+        'settling': (f'Settling Time\n{settling_time:.2f} s\n±2% Bounds', (settling_time, 1),
+                     (settling_time + 1.5, 1.1)),
+    }
+    for name, (text, xy, xytext) in placements.items():
+        label = artists['labels'][name]
+        label.set_text(text)
+        label.xy = xy
+        label.set_position(xytext)
+
+    artists['parameters'].set_text(
+        f'System Parameters:\nωn = {NATURAL_FREQUENCY} rad/s\nζ = {DAMPING_RATIO}')
+
+    # Set axis limits with padding to ensure annotations are visible
+    ax.set_xlim(-0.2, max(t) + 0.5)
+    ax.set_ylim(-0.1, max(y) + 0.3)
+    fig.tight_layout()
+
+def second_order_example():
+    import control
+    from step_metrics import second_order_metrics
+
+    print("4. Second-Order System Example")
+
+    # Set the style to a modern, clean theme
+    use_modern_style()
+
+    # Create a second-order transfer function
+    numerator = [NATURAL_FREQUENCY**2]
+    denominator = [1, 2 * DAMPING_RATIO * NATURAL_FREQUENCY, NATURAL_FREQUENCY**2]
+    G2 = control.TransferFunction(numerator, denominator)
+
+    # Get step response
+    with phase('simulate'):
+        t, y = control.step_response(G2)
+
+    # Get step response characteristics in closed form (no re-simulation)
+    with phase('analyze'):
+        info = {key: float(value) for key, value in
+                second_order_metrics(NATURAL_FREQUENCY, DAMPING_RATIO).items()}
+
+    # The annotated figure is built once per process and only updated here
+    template = get_template('second_order_response', build_second_order_figure, figsize=(14, 8))
+    dpi = 300
+    template.render(lambda fig, artists: update_second_order_figure(fig, artists, t, y, info, dpi),
+                    f'{OUTPUT_DIR}/second_order_response.png', dpi=dpi, bbox_inches='tight',
+                    facecolor='white', edgecolor='none')
+    record_results('second_order_response', {'num': numerator, 'den': denominator, 'metrics': info}, t=t, y=y)
+
+    print("Transfer Function G(s) = ωn²/(s² + 2ζωn·s + ωn²)")
+    print(f"Natural Frequency (ωn): {NATURAL_FREQUENCY:.2f} rad/s")
+    print(f"Damping Ratio (ζ): {DAMPING_RATIO:.2f}")
+    print(f"Rise Time: {info['RiseTime']:.2f} seconds")
+    print(f"Peak Time: {info['PeakTime']:.2f} seconds")
+    print(f"Overshoot: {info['Overshoot']:.1f}%")
+    print(f"Settling Time: {info['SettlingTime']:.2f} seconds")
 
 # Root Locus Examples
-print_separator()
-print("ROOT LOCUS EXAMPLES")
-print_separator()
-
-# Simple Second-Order System
-print("1. Simple Second-Order System")
-num = [1]
-den = [1, 2, 0]  # s^2 + 2s
-G = control.TransferFunction(num, den)
-
-plt.figure(figsize=(10, 8))
-rlist, klist = control.root_locus(G, plot=True)
-plt.title('Root Locus: G(s) = 1/s(s + 2)')
-plt.grid(True)
-plt.savefig('docs/images/examples/root_locus_simple.png')
-plt.close()
-
-print("Transfer Function G(s) = 1/s(s + 2)")
-print("Open-Loop Poles:", control.poles(G))
-k_crit = klist[np.where(np.abs(np.real(rlist)) < 0.01)[0][0]]
-print(f"Critical Gain (K) at Imaginary Axis: {k_crit:.2f}")
-
-# Multiple Poles System
-print_separator()
-print("2. Multiple Poles System")
-G = control.TransferFunction([1], [1, 6, 11, 6])
-
-plt.figure(figsize=(10, 8))
-rlist, klist = control.root_locus(G, plot=True)
-plt.title('Root Locus: G(s) = 1/((s+1)(s+2)(s+3))')
-plt.grid(True)
-plt.savefig('docs/images/examples/root_locus_multiple.png')
-plt.close()
-
-print("Transfer Function G(s) = 1/((s+1)(s+2)(s+3))")
-print("Open-Loop Poles:", control.poles(G))
+
+def print_locus_points(locus):
+    """Print the exactly computed breakaway points and imaginary-axis crossings"""
+    for k, s in locus.breakaways:
+        print(f"Breakaway Point: s = {s.real:.2f} at K = {k:.2f}")
+    if locus.critical_gain is None:
+        print("Critical Gain (K) at Imaginary Axis: none (no crossing for K > 0)")
+    for k, w in locus.crossings:
+        print(f"Critical Gain (K) at Imaginary Axis: {k:.2f} (ω = {w:.2f} rad/s)")
+
+def record_locus(name, locus):
+    """Keep the tracked branches and special points in the result store"""
+    record_results(name, {'num': locus.num, 'den': locus.den,
+                          'crossings': locus.crossings,
+                          'breakaways': [(k, s.real, s.imag) for k, s in locus.breakaways]},
+                   gains=locus.gains, roots=locus.roots)
+
+def root_locus_simple_example():
+    import control
+    import matplotlib.pyplot as plt
+
+    # Simple Second-Order System
+    print("1. Simple Second-Order System")
+    use_modern_style()
+    num = [1]
+    den = [1, 2, 0]  # s^2 + 2s
+    G = control.TransferFunction(num, den)
+
+    # Track the branches by continuation instead of solving on a gain grid
+    with phase('simulate'):
+        locus = track_root_locus(num, den)
+    plt.figure(figsize=(10, 8))
+    plot_root_locus(locus)
+    record_locus('root_locus_simple', locus)
+    plt.title('Root Locus: G(s) = 1/s(s + 2)')
+    plt.grid(True)
+    savefig(f'{OUTPUT_DIR}/root_locus_simple.png')
+    plt.close()
+
+    print("Transfer Function G(s) = 1/s(s + 2)")
+    print("Open-Loop Poles:", control.poles(G))
+    print_locus_points(locus)
+
+def root_locus_multiple_example():
+    import control
+    import matplotlib.pyplot as plt
+
+    # Multiple Poles System
+    print("2. Multiple Poles System")
+    use_modern_style()
+    num, den = [1], [1, 6, 11, 6]
+    G = control.TransferFunction(num, den)
+
+    with phase('simulate'):
+        locus = track_root_locus(num, den)
+    plt.figure(figsize=(10, 8))
+    plot_root_locus(locus)
+    record_locus('root_locus_multiple', locus)
+    plt.title('Root Locus: G(s) = 1/((s+1)(s+2)(s+3))')
+    plt.grid(True)
+    savefig(f'{OUTPUT_DIR}/root_locus_multiple.png')
+    plt.close()
+
+    print("Transfer Function G(s) = 1/((s+1)(s+2)(s+3))")
+    print("Open-Loop Poles:", control.poles(G))
+    print_locus_points(locus)
 
 # Bode Plot Examples
-print_separator()
-print("BODE PLOT EXAMPLES")
-print_separator()
-
-# First-Order System
-print("1. First-Order System")
-tau = 1.0
-G = control.TransferFunction([1], [tau, 1])
-
-mag, phase, omega = control.bode(G, plot=False)
-plt.figure(figsize=(10, 10))
-control.bode_plot(G, dB=True)
-plt.suptitle('Bode Plot: First-Order System')
-plt.savefig('docs/images/examples/bode_first_order.png')
-plt.close()
-
-print("Transfer Function G(s) = 1/(τs + 1)")
-print(f"Time Constant (τ): {tau:.2f}")
-print(f"Corner Frequency: {1/tau:.2f} rad/s")
-print(f"Phase at Corner Frequency: {phase[np.argmin(np.abs(omega - 1/tau))]:.1f} degrees")
-
-# Second-Order System
-print_separator()
-print("2. Second-Order System")
-wn = 10.0
-zeta = 0.5
-num = [wn**2]
-den = [1, 2*zeta*wn, wn**2]
-G = control.TransferFunction(num, den)
-
-mag, phase, omega = control.bode(G, plot=False)
-plt.figure(figsize=(10, 10))
-control.bode_plot(G, dB=True)
-plt.suptitle('Bode Plot: Second-Order System')
-plt.savefig('docs/images/examples/bode_second_order.png')
-plt.close()
-
-resonance_idx = np.argmax(mag)
-print("Transfer Function G(s) = ωn²/(s² + 2ζωn·s + ωn²)")
-print(f"Natural Frequency (ωn): {wn:.2f} rad/s")
-print(f"Damping Ratio (ζ): {zeta:.2f}")
-print(f"Resonance Peak: {mag[resonance_idx]:.2f} dB")
-print(f"Resonance Frequency: {omega[resonance_idx]:.2f} rad/s")
-
-# Band-Pass Filter
-print_separator()
-print("3. Band-Pass Filter")
-f0 = 100
-Q = 10
-w0 = 2 * np.pi * f0
-
-num = [w0/Q, 0]
-den = [1, w0/Q, w0**2]
-G = control.TransferFunction(num, den)
-
-plt.figure(figsize=(10, 10))
-control.bode_plot(G, dB=True)
-plt.suptitle('Bode Plot: Band-Pass Filter')
-plt.savefig('docs/images/examples/bode_bandpass.png')
-plt.close()
-
-gm, pm, wg, wp = control.margin(G)
-print("Transfer Function G(s) = (w0/Q·s)/(s² + (w0/Q)s + w0²)")
-print(f"Center Frequency (f0): {f0:.2f} Hz")
-print(f"Quality Factor (Q): {Q:.2f}")
-print(f"Gain Margin: {gm:.2f} dB at {wg:.2f} rad/s")
-print(f"Phase Margin: {pm:.2f} degrees at {wp:.2f} rad/s")
-
-print_separator()
-print("All examples completed successfully!")
-print_separator() 
\ No newline at end of file
+
+def render_bode(name, title, mag, phase, omega):
+    """Draw precomputed Bode data into a pooled figure and save it as <name>.png"""
+    def update(fig, artists):
+        plot_bode(mag, phase, omega, dB=True, fig=fig)
+        fig.suptitle(title)
+    template = get_template(name, lambda fig: fig.subplots(2, 1, sharex=True), figsize=(10, 10))
+    template.render(update, f'{OUTPUT_DIR}/{name}.png')
+
+def bode_first_order_example():
+    # First-Order System
+    print("1. First-Order System")
+    use_modern_style()
+    tau = 1.0
+    num, den = [1], [tau, 1]
+
+    # Evaluate the response once and reuse it for the plot and the printout
+    with phase('simulate'):
+        mag, phase_deg, omega = bode_batch(num, den)
+    render_bode('bode_first_order', 'Bode Plot: First-Order System', mag, phase_deg, omega)
+    record_results('bode_first_order', {'num': num, 'den': den}, omega=omega, mag=mag, phase=phase_deg)
+
+    with phase('analyze'):
+        corner_phase = phase_deg[0, np.argmin(np.abs(omega - 1/tau))]
+    print("Transfer Function G(s) = 1/(τs + 1)")
+    print(f"Time Constant (τ): {tau:.2f}")
+    print(f"Corner Frequency: {1/tau:.2f} rad/s")
+    print(f"Phase at Corner Frequency: {corner_phase:.1f} degrees")
+
+def bode_second_order_example():
+    # Second-Order System
+    print("2. Second-Order System")
+    use_modern_style()
+    wn = 10.0
+    zeta = 0.5
+    num = [wn**2]
+    den = [1, 2*zeta*wn, wn**2]
+
+    # Sample densely only around the resonance, then pin the peak down exactly
+    with phase('simulate'):
+        mag, phase_deg, omega = adaptive_bode(num, den)
+    render_bode('bode_second_order', 'Bode Plot: Second-Order System', mag, phase_deg, omega)
+    record_results('bode_second_order', {'num': num, 'den': den}, omega=omega, mag=mag, phase=phase_deg)
+
+    with phase('analyze'):
+        resonance_peak, resonance_frequency = refine_peak(num, den, mag, omega)
+    print("Transfer Function G(s) = ωn²/(s² + 2ζωn·s + ωn²)")
+    print(f"Natural Frequency (ωn): {wn:.2f} rad/s")
+    print(f"Damping Ratio (ζ): {zeta:.2f}")
+    print(f"Resonance Peak: {20*np.log10(resonance_peak[0]):.2f} dB")
+    print(f"Resonance Frequency: {resonance_frequency[0]:.2f} rad/s")
+
+def bode_bandpass_example():
+    # Band-Pass Filter
+    print("3. Band-Pass Filter")
+    use_modern_style()
+    f0 = 100
+    Q = 10
+    w0 = 2 * np.pi * f0
+
+    num = [w0/Q, 0]
+    den = [1, w0/Q, w0**2]
+
+    with phase('simulate'):
+        mag, phase_deg, omega = adaptive_bode(num, den)
+    render_bode('bode_bandpass', 'Bode Plot: Band-Pass Filter', mag, phase_deg, omega)
+    record_results('bode_bandpass', {'num': num, 'den': den}, omega=omega, mag=mag, phase=phase_deg)
+
+    # Crossover frequencies solved for exactly; |G| only touches 1 at the
+    # center frequency, which (as in control.margin) is not a crossing
+    with phase('analyze'):
+        gm, pm, wg, wp = (float(value[0]) for value in margins_batch(num, den))
+    print("Transfer Function G(s) = (w0/Q·s)/(s² + (w0/Q)s + w0²)")
+    print(f"Center Frequency (f0): {f0:.2f} Hz")
+    print(f"Quality Factor (Q): {Q:.2f}")
+    if np.isfinite(gm):
+        print(f"Gain Margin: {20*np.log10(gm):.2f} dB at {wg:.2f} rad/s")
+    else:
+        print("Gain Margin: inf (the phase never crosses -180 degrees)")
+    if np.isfinite(pm):
+        print(f"Phase Margin: {pm:.2f} degrees at {wp:.2f} rad/s")
+    else:
+        print("Phase Margin: inf (|G| never crosses 1)")
+
+# Each section is an independent job: (name, group heading, function, images written)
+SECTIONS = [
+    ('step', 'SYSTEM RESPONSES EXAMPLES', step_response_example, ['step_response.png']),
+    ('impulse', 'SYSTEM RESPONSES EXAMPLES', impulse_response_example, ['impulse_response.png']),
+    ('ramp', 'SYSTEM RESPONSES EXAMPLES', ramp_response_example, ['ramp_response.png']),
+    ('second_order', 'SYSTEM RESPONSES EXAMPLES', second_order_example, ['second_order_response.png']),
+    ('root_locus_simple', 'ROOT LOCUS EXAMPLES', root_locus_simple_example, ['root_locus_simple.png']),
+    ('root_locus_multiple', 'ROOT LOCUS EXAMPLES', root_locus_multiple_example, ['root_locus_multiple.png']),
+    ('bode_first_order', 'BODE PLOT EXAMPLES', bode_first_order_example, ['bode_first_order.png']),
+    ('bode_second_order', 'BODE PLOT EXAMPLES', bode_second_order_example, ['bode_second_order.png']),
+    ('bode_bandpass', 'BODE PLOT EXAMPLES', bode_bandpass_example, ['bode_bandpass.png']),
+]
+SECTION_FUNCTIONS = {name: func for name, _, func, _ in SECTIONS}
+SECTION_OUTPUTS = {name: [os.path.join(OUTPUT_DIR, image) for image in images]
+                   for name, _, _, images in SECTIONS}
+
+def run_section(name, cache_dir=None, draft=False, store_dir=None, profile_dir=None):
+    """Run one section in isolation and return (ok, captured output, timing record)"""
+    set_draft(draft)
+    set_default_store(store_dir)
+    buffer = io.StringIO()
+    cache = FigureCache(cache_dir) if cache_dir else None
+    # rc_context keeps a section's style changes from leaking into the next
+    # job that happens to run in the same worker process
+    with contextlib.redirect_stdout(buffer), contextlib.redirect_stderr(buffer), rc_context():
+        with measure(name, profile_dir) as record:
+            try:
+                record['cached'] = run_cached(SECTION_FUNCTIONS[name], SECTION_OUTPUTS[name], cache)
+            except Exception:
+                record['ok'] = False
+                traceback.print_exc(file=buffer)
+            finally:
+                close_all()
+    return record['ok'], buffer.getvalue(), record
+
+def run_sections(names, jobs=1, cache_dir=None, draft=False, store_dir=None, profile_dir=None):
+    """Run the named sections, in a process pool when jobs > 1"""
+    if jobs > 1 and len(names) > 1:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(names))) as pool:
+            count = len(names)
+            return list(pool.map(run_section, names, [cache_dir] * count, [draft] * count, [store_dir] * count,
+                                 [profile_dir] * count))
+    return [run_section(name, cache_dir, draft, store_dir, profile_dir) for name in names]
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Regenerate the example plots used in the docs.')
+    parser.add_argument('sections', nargs='*', metavar='SECTION',
+                        help=f"sections to run (default: all): {', '.join(SECTION_FUNCTIONS)}")
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='number of worker processes (default: 1, 0 uses every CPU)')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR,
+                        help='figure cache directory (default: %(default)s)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='always re-simulate and re-render every figure')
+    parser.add_argument('--store', metavar='DIR', default=os.environ.get('RESULT_STORE'),
+                        help='save every section\'s simulated arrays to a result store in DIR '
+                             '(implies --no-cache so that every section runs; default: $RESULT_STORE)')
+    parser.add_argument('--draft', action='store_true',
+                        help='render low-resolution previews (also enabled by RENDER_DRAFT=1)')
+    parser.add_argument('--import-profile', action='store_true',
+                        help='run under -X importtime and summarize import time per package')
+    parser.add_argument('--report', metavar='FILE',
+                        help='write per-section wall/CPU time, render/write time, figures and peak RSS '
+                             'to FILE (.json or .csv) and print a summary')
+    parser.add_argument('--profile-dir', metavar='DIR',
+                        help='write a cProfile dump per section to DIR/<section>.prof')
+    parser.add_argument('--watch', action='store_true',
+                        help='keep running and re-run only the sections affected by each saved change')
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.sections if name not in SECTION_FUNCTIONS]
+    if unknown:
+        parser.error(f"unknown section(s): {', '.join(unknown)}")
+    return args
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    args = parse_args(argv)
+    if args.import_profile:
+        return profile_script(os.path.abspath(__file__), [arg for arg in argv if arg != '--import-profile'])
+    names = [name for name, _, _, _ in SECTIONS if not args.sections or name in args.sections]
+    jobs = args.jobs or os.cpu_count() or 1
+    # Cached sections do not run, so they would leave no results behind
+    cache_dir = None if args.no_cache or args.store else args.cache_dir
+
+    # Create output directory if it doesn't exist
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+    if args.watch:
+        from watch import watch_sections
+        return watch_sections(args.sections, cache_dir, args.draft or is_draft(), args.store)
+
+    draft = args.draft or is_draft()
+    write_errors = []
+    if jobs > 1 and len(names) > 1:
+        results = run_sections(names, jobs, cache_dir, draft, args.store, args.profile_dir)
+    else:
+        # One section after another: each section's PNGs are compressed and
+        # written in the background while the next one simulates
+        with background_writes() as writer:
+            results = run_sections(names, 1, cache_dir, draft, args.store, args.profile_dir)
+            write_errors = writer.flush()
+
+    # Print collected output in section order so it does not depend on scheduling
+    groups = {name: group for name, group, _, _ in SECTIONS}
+    current_group = None
+    failed = []
+    for name, (ok, output, _) in zip(names, results):
+        print_separator()
+        if groups[name] != current_group:
+            current_group = groups[name]
+            print(current_group)
+            print_separator()
+        sys.stdout.write(output)
+        if not ok:
+            failed.append(name)
+
+    print_separator()
+    for path, error in write_errors:
+        print(f"Failed to write {path}: {error}")
+        failed += [name for name in names if path in SECTION_OUTPUTS[name] and name not in failed]
+    if write_errors:
+        print_separator()
+    if args.report:
+        records = [record for _, _, record in results]
+        write_report(records, args.report)
+        print_report(records)
+        print(f"Timing report written to {args.report}")
+        print_separator()
+    if failed:
+        print(f"Failed sections: {', '.join(failed)}")
+        print_separator()
+        return 1
+    print("All examples completed successfully!")
+    print_separator()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,279 @@
+"""Step-response metrics without simulating the response.
+
+For the standard first-order K/(tau s + 1) and second-order
+K wn^2/(s^2 + 2 zeta wn s + wn^2) forms the metrics follow from the
+analytic step response, evaluated element-wise over arrays of parameters:
+
+* peak time and overshoot have textbook closed forms;
+* the extrema of an underdamped response sit at t_k = k pi / wd with
+  deviation exp(-zeta wn t_k), which brackets the last exit from the
+  settling band between two known extrema;
+* the 10 %/90 % crossings lie before the first peak, where the response is
+  monotone.
+
+Crossings inside a bracket are found with a vectorized, bracket-safeguarded
+Newton iteration that drops converged elements as it goes. It works on the
+normalized time wn*t: every time scales with 1/wn, so only zeta matters.
+
+Any other system falls back to ``sampled_step_metrics``, a vectorized
+search over responses sampled on a time grid. The returned dictionaries use
+the same keys and definitions as ``control.step_info``: 10-90 % rise time,
+2 % settling band, overshoot in percent of the final value.
+"""
+import numpy as np
+
+from batch_response import _as_batch, step_response_batch, tf_to_ss_batch
+
+RISE_TIME_LIMITS = (0.1, 0.9)
+SETTLING_TIME_THRESHOLD = 0.02
+# Default simulation windows span this many time constants of the slowest pole
+TIME_CONSTANTS = 7
+WINDOW_EXTENSIONS = 3
+
+def _solve(f, lo, hi, tolerance=1e-12, max_iterations=60):
+    """Root of f in [lo, hi] for every element, assuming f(lo) < 0 <= f(hi).
+
+    f(tau, index) returns (value, slope) for the elements selected by index.
+    Newton steps fall back to bisection whenever they leave the current
+    bracket, and converged elements drop out of the active set, so the cost
+    follows the number of iterations each element actually needs.
+    """
+    lo, hi = np.array(lo, dtype=float), np.array(hi, dtype=float)
+    x = 0.5 * (lo + hi)
+    active = np.arange(x.size)
+    for _ in range(max_iterations):
+        if not active.size:
+            break
+        xa, la, ha = x[active], lo[active], hi[active]
+        fx, slope = f(xa, active)
+        above = fx >= 0
+        ha = np.where(above, xa, ha)
+        la = np.where(above, la, xa)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            step = xa - fx / slope
+        new = np.where((step >= la) & (step <= ha), step, 0.5 * (la + ha))
+        x[active], lo[active], hi[active] = new, la, ha
+        done = (np.abs(new - xa) <= tolerance * np.maximum(np.abs(new), 1.0)) | (fx == 0)
+        active = active[~done]
+    return x
+
+def _normalized_response(zeta):
+    """Unit step response and its slope at tau = wn*t, for one damping regime.
+
+    The returned function takes (tau, index) and evaluates the elements of
+    zeta selected by index.
+    """
+    if np.all(zeta < 1):
+        wd = np.sqrt(1 - zeta**2)
+        ratio = zeta / wd
+        def response(tau, index):
+            z, w = zeta[index], wd[index]
+            decay = np.exp(-z * tau)
+            sin = np.sin(w * tau)
+            return 1 - decay * (np.cos(w * tau) + ratio[index] * sin), decay * sin / w
+    elif np.all(zeta > 1):
+        root = np.sqrt(zeta**2 - 1)
+        p1, p2 = zeta - root, zeta + root
+        def response(tau, index):
+            a, b = p1[index], p2[index]
+            slow, fast = np.exp(-a * tau), np.exp(-b * tau)
+            return 1 - (b * slow - a * fast) / (b - a), a * b * (slow - fast) / (b - a)
+    else:
+        def response(tau, index):
+            decay = np.exp(-tau)
+            return 1 - (1 + tau) * decay, tau * decay
+    return response
+
+def _shifted(response, offset, sign=1.0):
+    """sign * (y - 1) + offset as a function for _solve"""
+    sign = np.asarray(sign, dtype=float)
+    def f(tau, index):
+        y, slope = response(tau, index)
+        s = sign[index] if sign.ndim else sign
+        return s * (y - 1) + offset, s * slope
+    return f
+
+def _normalized_times(zeta):
+    """(10 % time, 90 % time, settling time) in units of 1/wn for one damping regime"""
+    response = _normalized_response(zeta)
+    band = SETTLING_TIME_THRESHOLD
+    lower, upper = RISE_TIME_LIMITS
+    zero = np.zeros_like(zeta)
+
+    if np.all(zeta < 1):
+        # Monotone up to the first peak; the last extremum outside the band is
+        # k* = ceil(ln(1/band) wd / (zeta pi)) - 1 and the response crosses the
+        # band edge monotonically between t_k* and t_k*+1
+        first_peak = np.pi / np.sqrt(1 - zeta**2)
+        k_last = np.maximum(np.ceil(np.log(1 / band) / (zeta * first_peak)) - 1, 0)
+        # Below the final value at even extrema, above at odd ones
+        sign = np.where(k_last % 2 == 0, 1.0, -1.0)
+        settling = _solve(_shifted(response, band, sign), k_last * first_peak, (k_last + 1) * first_peak)
+        monotone_end = first_peak
+    else:
+        # No overshoot; the slow pole is at least 1/(2 zeta), so this bound is
+        # well past the settling time
+        monotone_end = (np.log(1 / band) + np.log(4 * zeta) + 2) * 2 * zeta
+        settling = _solve(_shifted(response, band), zero, monotone_end)
+
+    t_low = _solve(_shifted(response, 1 - lower), zero, monotone_end)
+    t_high = _solve(_shifted(response, 1 - upper), zero, monotone_end)
+    return t_low, t_high, settling
+
+def second_order_metrics(wn, zeta, gain=1.0):
+    """Step metrics of gain * wn^2 / (s^2 + 2 zeta wn s + wn^2).
+
+    Arguments broadcast against each other. Non-oscillating responses
+    (zeta >= 1) have no overshoot and approach their peak only as
+    t -> inf, so their PeakTime is inf. Entries with wn <= 0 or
+    zeta <= 0 (marginally stable or unstable) are NaN.
+    """
+    wn, zeta, gain = np.broadcast_arrays(*(np.asarray(x, dtype=float) for x in (wn, zeta, gain)))
+    shape = wn.shape
+    wn, zeta, gain = wn.ravel(), zeta.ravel(), gain.ravel()
+    valid = (wn > 0) & (zeta > 0)
+
+    rise_time = np.full(wn.shape, np.nan)
+    settling_time = np.full(wn.shape, np.nan)
+    for regime in (valid & (zeta < 1), valid & (zeta == 1), valid & (zeta > 1)):
+        if regime.any():
+            t_low, t_high, settling = _normalized_times(zeta[regime])
+            rise_time[regime] = (t_high - t_low) / wn[regime]
+            settling_time[regime] = settling / wn[regime]
+
+    # Peak and overshoot have closed forms
+    under = valid & (zeta < 1)
+    wd = np.sqrt(np.where(under, 1 - zeta**2, 1.0))
+    overshoot = np.where(under, np.exp(-np.pi * zeta / wd), 0.0)
+    peak_time = np.where(under, np.pi / (wd * np.where(valid, wn, 1.0)), np.inf)
+
+    nan = np.where(valid, 1.0, np.nan)
+    return {
+        'RiseTime': rise_time.reshape(shape),
+        'SettlingTime': settling_time.reshape(shape),
+        'Overshoot': (overshoot * 100 * nan).reshape(shape),
+        'Peak': (np.abs(gain) * (1 + overshoot) * nan).reshape(shape),
+        'PeakTime': (peak_time * nan).reshape(shape),
+    }
+
+def first_order_metrics(tau, gain=1.0):
+    """Step metrics of gain / (tau s + 1); PeakTime is inf (approached asymptotically)"""
+    tau, gain = np.broadcast_arrays(np.asarray(tau, dtype=float), np.asarray(gain, dtype=float))
+    tau = np.where(tau > 0, tau, np.nan)
+    lower, upper = RISE_TIME_LIMITS
+    return {
+        'RiseTime': tau * np.log((1 - lower) / (1 - upper)),
+        'SettlingTime': tau * np.log(1 / SETTLING_TIME_THRESHOLD),
+        'Overshoot': np.zeros_like(tau) * (tau / tau),
+        'Peak': np.abs(gain) * (tau / tau),
+        'PeakTime': np.full_like(tau, np.inf) * (tau / tau),
+    }
+
+def sampled_step_metrics(T, Y, final_value=None):
+    """Metrics of step responses Y (shape (n, len(T))) sampled on the grid T.
+
+    Follows the definitions of ``control.step_info``. final_value defaults
+    to the last sample of each response.
+    """
+    T = np.asarray(T, dtype=float)
+    Y = np.atleast_2d(np.asarray(Y, dtype=float))
+    final = Y[:, -1] if final_value is None else np.broadcast_to(np.asarray(final_value, dtype=float), Y.shape[:1])
+    rows = np.arange(len(Y))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        normalized = Y / final[:, None]
+
+    lower, upper = RISE_TIME_LIMITS
+    low_index = np.argmax(normalized >= lower, axis=1)
+    high_index = np.argmax(normalized >= upper, axis=1)
+    rise_time = T[high_index] - T[low_index]
+
+    outside = np.abs(normalized - 1) >= SETTLING_TIME_THRESHOLD
+    # Index after the last sample outside the band (0 if always inside)
+    last_outside = len(T) - 1 - np.argmax(outside[:, ::-1], axis=1)
+    settled = np.where(outside.any(axis=1), np.minimum(last_outside + 1, len(T) - 1), 0)
+    settling_time = T[settled]
+
+    peak_index = np.argmax(np.abs(Y), axis=1)
+    peak = np.abs(Y[rows, peak_index])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        overshoot = np.maximum((peak - np.abs(final)) / np.abs(final) * 100, 0.0)
+    return {
+        'RiseTime': rise_time,
+        'SettlingTime': settling_time,
+        'Overshoot': overshoot,
+        'Peak': peak,
+        'PeakTime': T[peak_index],
+    }
+
+def _default_time_grid(num, den, points=1000):
+    """Grid covering ~7 time constants of the slowest pole over the batch"""
+    A, _, _, _ = tf_to_ss_batch(num, den)
+    poles = np.linalg.eigvals(A)
+    decay = np.abs(np.real(poles))
+    decay = decay[decay > 0]
+    tfinal = TIME_CONSTANTS / decay.min() if decay.size else 10.0
+    return np.linspace(0, tfinal, points)
+
+def _simulated_metrics(num, den, T):
+    """``sampled_step_metrics`` of the simulated step responses, settling time
+    inf for rows still outside the settling band at T[-1]"""
+    T, Y = step_response_batch(num, den, T)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        final = num[:, -1] / den[:, -1]
+        unsettled = np.abs(Y[:, -1] / final - 1) >= SETTLING_TIME_THRESHOLD
+    metrics = sampled_step_metrics(T, Y, final)
+    metrics['SettlingTime'][unsettled] = np.inf
+    return metrics
+
+def step_metrics(num, den, T=None):
+    """Step metrics for a stack of transfer functions (one row of num/den each).
+
+    Rows of the form b/(s + a) and b/(s^2 + a1 s + a0) use the closed forms;
+    the rest are simulated together on T (default: a grid covering the
+    slowest pole, doubled up to WINDOW_EXTENSIONS times for rows that have
+    not settled) and searched with ``sampled_step_metrics``. Simulated rows
+    still outside the settling band at T[-1] get inf for SettlingTime. Rows
+    with a pole at the origin have no finite final value: their SettlingTime
+    is inf and the other metrics nan.
+    """
+    num, den = _as_batch(num, den)
+    num = num / den[:, :1]
+    den = den / den[:, :1]
+    order = den.shape[1] - 1
+    keys = ('RiseTime', 'SettlingTime', 'Overshoot', 'Peak', 'PeakTime')
+    result = {key: np.full(len(den), np.nan) for key in keys}
+
+    # All-pole systems of order 1 or 2 with stable poles have closed forms
+    all_pole = np.all(num[:, :-1] == 0, axis=1)
+    positive = np.all(den[:, 1:] > 0, axis=1) if order else np.zeros(len(den), dtype=bool)
+    analytic = all_pole & positive & (order in (1, 2))
+    if analytic.any():
+        if order == 1:
+            a = den[analytic, 1]
+            metrics = first_order_metrics(1 / a, num[analytic, -1] / a)
+        else:
+            wn = np.sqrt(den[analytic, 2])
+            metrics = second_order_metrics(wn, den[analytic, 1] / (2 * wn), num[analytic, -1] / den[analytic, 2])
+        for key in keys:
+            result[key][analytic] = metrics[key]
+
+    # A pole at the origin leaves no finite final value to measure against
+    drifting = den[:, -1] == 0
+    result['SettlingTime'][drifting] = np.inf
+
+    general = np.flatnonzero(~analytic & ~drifting)
+    extend = T is None
+    if general.size and extend:
+        T = _default_time_grid(num[general], den[general])
+    # Rows still unsettled on the default grid are rerun on windows twice as long
+    for _ in range(WINDOW_EXTENSIONS + 1):
+        if not general.size:
+            break
+        metrics = _simulated_metrics(num[general], den[general], T)
+        for key in keys:
+            result[key][general] = metrics[key]
+        if not extend:
+            break
+        general = general[np.isinf(metrics['SettlingTime'])]
+        T = np.linspace(0, 2 * T[-1], len(T))
+    return result
@@ -0,0 +1,98 @@
+"""Compile symbolic transfer functions into vectorized NumPy evaluators.
+
+A SymPy expression such as ``K / (tau*s + 1)`` is split into numerator and
+denominator polynomials in s once. Their coefficients, which are
+expressions in the parameters, and the expression itself are then turned
+into NumPy functions with ``lambdify``. The results:
+
+* ``coefficients`` returns (num, den) rows for whole parameter arrays in
+  the layout ``batch_response`` and ``freq_response`` expect;
+* ``frequency_response`` evaluates G(j*omega) for every parameter set.
+
+Compilation is memoized on the expression (SymPy expressions hash by
+structure), so a parameter sweep compiles once however often it asks for
+the same model. Laplace transforms, which can take seconds each, are
+memoized the same way by ``laplace_transfer_function``.
+"""
+import functools
+
+import numpy as np
+import sympy as sp
+
+CACHE_SIZE = 128
+
+class CompiledTransferFunction:
+    """Vectorized numeric form of a rational SymPy expression in s.
+
+    Parameters are passed by symbol name, as scalars or arrays that
+    broadcast against each other; every parameter set is one system.
+    """
+
+    def __init__(self, expr, s, params, num_coefficients, den_coefficients):
+        self.expr = expr
+        self.s = s
+        self.params = params
+        self.names = tuple(str(symbol) for symbol in params)
+        self.order = len(den_coefficients) - 1
+        self._num = sp.lambdify(params, num_coefficients, 'numpy')
+        self._den = sp.lambdify(params, den_coefficients, 'numpy')
+        self._response = sp.lambdify((s, *params), expr, 'numpy', cse=True)
+
+    def _values(self, values):
+        missing = [name for name in self.names if name not in values]
+        if missing:
+            raise TypeError(f"missing parameter(s): {', '.join(missing)}")
+        arrays = np.broadcast_arrays(*(np.asarray(values[name], dtype=float) for name in self.names))
+        shape = arrays[0].shape if arrays else ()
+        return [array.ravel() for array in arrays], int(np.prod(shape))
+
+    def coefficients(self, **values):
+        """(num, den) with one row per parameter set, highest power first.
+
+        Rows are normalized so the leading denominator coefficient is 1 and
+        the numerator is padded to the length of the denominator.
+        """
+        arrays, count = self._values(values)
+        def evaluate(function):
+            rows = [np.broadcast_to(np.asarray(value, dtype=float), (count,)) for value in function(*arrays)]
+            return np.column_stack(rows)
+        num, den = evaluate(self._num), evaluate(self._den)
+        padded = np.zeros_like(den)
+        padded[:, den.shape[1] - num.shape[1]:] = num
+        return padded / den[:, :1], den / den[:, :1]
+
+    def frequency_response(self, omega, **values):
+        """Complex G(j*omega), shape (number of parameter sets, len(omega))"""
+        arrays, count = self._values(values)
+        s = 1j * np.asarray(omega, dtype=float)[None, :]
+        response = self._response(s, *(array[:, None] for array in arrays))
+        return np.broadcast_to(response, (count, s.shape[1])).astype(complex)
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def _compile(expr, s, params):
+    numerator, denominator = sp.fraction(sp.cancel(sp.together(expr)))
+    num_coefficients = sp.Poly(numerator, s).all_coeffs()
+    den_coefficients = sp.Poly(denominator, s).all_coeffs()
+    if len(num_coefficients) > len(den_coefficients):
+        raise ValueError("transfer function must be proper")
+    return CompiledTransferFunction(expr, s, params, num_coefficients, den_coefficients)
+
+def compile_transfer_function(expr, s, params=None):
+    """Compiled, memoized evaluators for a rational expression in s.
+
+    params lists the parameter symbols in a fixed order (default: every
+    free symbol except s, sorted by name).
+    """
+    expr = sp.sympify(expr)
+    if params is None:
+        params = sorted(expr.free_symbols - {s}, key=str)
+    return _compile(expr, s, tuple(params))
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def laplace_transfer_function(expr, t, s):
+    """Memoized ``sympy.laplace_transform`` of expr, without the convergence conditions"""
+    return sp.laplace_transform(expr, t, s, noconds=True)
+
+def cache_info():
+    """Hit/miss statistics of the compilation and Laplace caches"""
+    return {'compile': _compile.cache_info(), 'laplace': laplace_transfer_function.cache_info()}
@@ -0,0 +1,234 @@
+"""Re-run only the example sections affected by an edit, in a warm worker.
+
+``run_examples.py --watch`` polls the scripts directory and
+``docs/scripts``. The watched sections are those of ``run_examples.py``,
+the plots of ``generate_plots.py`` and the image-writing sections of
+``docs/scripts/01_intro_examples.py`` (only the named run_examples
+sections when sections are given). When a file is saved, a long-lived
+worker process handles the change. The worker has numpy, scipy, control
+and matplotlib already imported. It:
+
+1. drops the repo's own modules from ``sys.modules`` and imports the
+   example scripts again, so the edited code is what runs;
+2. recomputes a digest of every section's dependencies;
+3. runs the sections whose digest changed, or whose images are missing,
+   plus any later section writing an image one of them overwrote, so
+   shared images (``step_response.png``) end up as a full run leaves them.
+
+A section's dependencies are what the figure cache keys on
+(``figure_cache.source_fingerprint``): its source and its helpers', and
+the content of every repo module it or its helpers import, such as
+``streaming`` or ``step_metrics``. Editing one section's code or one
+helper module therefore re-renders only the images that can change.
+"""
+import contextlib
+import hashlib
+import importlib
+import importlib.util
+import io
+import linecache
+import os
+import signal
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from figure_cache import source_fingerprint
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+INTRO_SCRIPT = os.path.join(os.path.dirname(SCRIPTS_DIR), 'docs', 'scripts', '01_intro_examples.py')
+WATCHED_DIRS = (SCRIPTS_DIR, os.path.dirname(INTRO_SCRIPT))
+POLL_INTERVAL = 0.2
+# Editors often save in several writes; wait this long for the files to settle
+DEBOUNCE = 0.05
+# Libraries imported once when the worker starts
+WARM_MODULES = ('numpy', 'scipy.signal', 'scipy.integrate', 'control', 'matplotlib.pyplot', 'seaborn')
+
+# Worker state: the requested sections and options, and the last digest per section key
+_config = {}
+_digests = {}
+# State that changes as the worker runs; figure_cache leaves it out of keys
+_RUNTIME_STATE = frozenset({'_config', '_digests'})
+
+def _is_repo_module(module):
+    path = getattr(module, '__file__', None)
+    return path is not None and os.path.dirname(os.path.abspath(path)) == SCRIPTS_DIR
+
+def section_digest(func):
+    """Hash of the source lines and repo modules a section depends on"""
+    return hashlib.sha256(source_fingerprint(func).encode()).hexdigest()
+
+def _purge_repo_modules():
+    """Forget the repo's modules so the next import reads the edited files"""
+    for name, module in list(sys.modules.items()):
+        if name in ('__main__', '__mp_main__', __name__):
+            continue
+        if _is_repo_module(module):
+            del sys.modules[name]
+    importlib.invalidate_caches()
+    linecache.checkcache()
+
+def _warm_up(sections, draft, store_dir):
+    """Worker initializer: import the heavy libraries and the examples once"""
+    # Ctrl+C reaches the whole process group; the parent shuts the worker down
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    for name in WARM_MODULES:
+        importlib.import_module(name)
+    importlib.import_module('run_examples')
+    _config.update(sections=sections, draft=draft, store_dir=store_dir)
+
+def _load_intro():
+    """Import the intro script afresh (it lives outside the scripts directory and sys.modules)"""
+    spec = importlib.util.spec_from_file_location('intro_examples', INTRO_SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    # The script puts the scripts directory on sys.path, which the worker
+    # already has; undo it so repeated loads do not grow the path
+    path = list(sys.path)
+    try:
+        spec.loader.exec_module(module)
+    finally:
+        sys.path[:] = path
+    return module
+
+def producers(sections=None):
+    """(key, function, images written, style setup) for every watched section, in regeneration order.
+
+    With sections, only those run_examples sections are watched.
+    """
+    run_examples = importlib.import_module('run_examples')
+    watched = [(f'run_examples:{name}', func, run_examples.SECTION_OUTPUTS[name], None)
+               for name, func in run_examples.SECTION_FUNCTIONS.items() if not sections or name in sections]
+    if sections:
+        return watched
+    generate_plots = importlib.import_module('generate_plots')
+    watched += [(f'generate_plots:{name}', func, outputs, None) for name, func, outputs in generate_plots.SECTIONS]
+    intro = _load_intro()
+    watched += [(f'intro:{name}', func, outputs, intro.use_default_style if styled else None)
+                for name, func, outputs, styled in intro.SECTIONS if outputs]
+    return watched
+
+def run_producer(func, outputs, setup=None, cache_dir=None):
+    """Run a generate_plots or intro section like ``run_examples.run_section``; returns (ok, output)"""
+    from figure_cache import FigureCache, run_cached
+    from rendering import close_all, rc_context, set_draft
+    from result_store import set_default_store
+
+    set_draft(_config['draft'])
+    set_default_store(_config['store_dir'])
+    buffer = io.StringIO()
+    ok = True
+    cache = FigureCache(cache_dir) if cache_dir else None
+    with contextlib.redirect_stdout(buffer), contextlib.redirect_stderr(buffer), rc_context():
+        try:
+            if setup is not None:
+                setup()
+            run_cached(func, outputs, cache)
+        except Exception:
+            ok = False
+            traceback.print_exc(file=buffer)
+        finally:
+            close_all()
+    return ok, buffer.getvalue()
+
+def refresh(changed=None, cache_dir=None):
+    """Run the sections affected by the changed files (all sections if changed is None).
+
+    Returns (results, seconds) with one (key, ok, output) per section run.
+    """
+    start = time.perf_counter()
+    try:
+        if changed is not None:
+            _purge_repo_modules()
+        run_examples = importlib.import_module('run_examples')
+        watched = producers(_config['sections'])
+        affected = set()
+        for key, func, outputs, setup in watched:
+            digest = section_digest(func)
+            if setup is not None:
+                digest += section_digest(setup)
+            missing = not all(os.path.exists(path) for path in outputs)
+            if changed is None or missing or digest != _digests.get(key):
+                affected.add(key)
+            _digests[key] = digest
+        # A later section that writes the same image must run again after the
+        # one that overwrote it
+        overwritten = set()
+        for key, _, outputs, _ in watched:
+            if key not in affected and overwritten & set(outputs):
+                affected.add(key)
+            if key in affected:
+                overwritten.update(outputs)
+    except Exception:
+        # Typically a syntax error in a half-finished edit; the next save retries
+        return [('(import)', False, traceback.format_exc())], time.perf_counter() - start
+
+    results = []
+    for key, func, outputs, setup in watched:
+        if key not in affected:
+            continue
+        script, name = key.split(':', 1)
+        if script == 'run_examples':
+            ok, output, _ = run_examples.run_section(name, cache_dir, _config['draft'], _config['store_dir'])
+        else:
+            ok, output = run_producer(func, outputs, setup, cache_dir)
+        results.append((key, ok, output))
+    return results, time.perf_counter() - start
+
+def _snapshot():
+    """Modification times of the Python files in the watched directories"""
+    snapshot = {}
+    for directory in WATCHED_DIRS:
+        for entry in os.scandir(directory):
+            if entry.name.endswith('.py') and entry.is_file():
+                snapshot[entry.path] = entry.stat().st_mtime_ns
+    return snapshot
+
+def _report(results, seconds, changed=None):
+    for key, ok, output in results:
+        print(f"--- {key}")
+        sys.stdout.write(output)
+        if not ok:
+            print(f"--- {key} failed")
+    if changed:
+        names = ', '.join(os.path.basename(path) for path in changed)
+        ran = ', '.join(key for key, _, _ in results) or 'nothing'
+        print(f"[watch] {names} changed: ran {ran} in {seconds:.2f} s")
+    sys.stdout.flush()
+
+def watch_sections(sections=None, cache_dir=None, draft=False, store_dir=None, interval=POLL_INTERVAL):
+    """Run the sections once, then re-run the affected ones after every save until Ctrl+C"""
+    def start_worker():
+        return ProcessPoolExecutor(max_workers=1, initializer=_warm_up,
+                                   initargs=(list(sections or []), draft, store_dir))
+
+    worker = start_worker()
+    try:
+        results, seconds = worker.submit(refresh, None, cache_dir).result()
+        _report(results, seconds)
+        print(f"[watch] watching {', '.join(WATCHED_DIRS)} (Ctrl+C to stop)")
+        sys.stdout.flush()
+        snapshot = _snapshot()
+        while True:
+            time.sleep(interval)
+            current = _snapshot()
+            if current == snapshot:
+                continue
+            time.sleep(DEBOUNCE)
+            current = _snapshot()
+            changed = sorted(path for path in snapshot.keys() | current.keys()
+                             if snapshot.get(path) != current.get(path))
+            snapshot = current
+            try:
+                results, seconds = worker.submit(refresh, changed, cache_dir).result()
+            except BrokenProcessPool:
+                # A section crashed the worker; start a fresh one and rebuild everything
+                worker = start_worker()
+                results, seconds = worker.submit(refresh, None, cache_dir).result()
+            _report(results, seconds, changed)
+    except KeyboardInterrupt:
+        print("\n[watch] stopped")
+        return 0
+    finally:
+        worker.shutdown(wait=False, cancel_futures=True)